@@ -0,0 +1,100 @@
+"""
+Benchmark of the per-call overhead of the module catalog tools: an engine created for every call (with SQL echo on,
+as ManagerAlchemyDB did before) against the shared engine registry.
+
+The database is copied to a temporary directory first, because the shared engine switches SQLite to WAL mode.
+
+Run from the project root:
+    python -m benchmarks.benchmark_catalog_tools
+"""
+import contextlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Iterator
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from utils.dao.sqlalchemy.db_manager.alchemy_manager import ManagerAlchemyDB
+from utils.dao.sqlalchemy.db_manager.engine_registry import dispose_engines
+
+SOURCE_DB_FILE = 'metasploit_data.db'
+SUB_GROUP = 'auxiliary/scanner'
+MODULE_NAME = 'auxiliary/scanner/http/http_version'
+
+
+class LegacyManagerAlchemyDB(ManagerAlchemyDB):
+    """
+    ManagerAlchemyDB as it was before the engine registry: a new engine with SQL echo for every instance.
+    """
+
+    def __init__(self, db_url: str):
+        self._engine = create_engine(db_url, echo=True, future=True)
+        self._Session = sessionmaker(self._engine)
+
+
+def run_catalog_calls(manager_class, db_url: str) -> None:
+    """
+    Run the same queries as get_msf_sub_groups_list, get_msf_exact_sub_group_modules_list and
+    get_msf_module_options, each with its own manager.
+    """
+    manager_class(db_url).get_sub_group_from_modules()
+    manager_class(db_url).get_modules_by_sub_group(SUB_GROUP)
+    manager_class(db_url).get_module_options(MODULE_NAME)
+
+
+@contextlib.contextmanager
+def discard_log_output() -> Iterator[None]:
+    """
+    Send the output of all the logging handlers (SQL echo included) to a buffer instead of the terminal.
+    """
+    buffer = io.StringIO()
+    loggers = [logging.getLogger(), logging.getLogger('sqlalchemy.engine.Engine')]
+    handlers = [handler for logger in loggers for handler in logger.handlers
+                if isinstance(handler, logging.StreamHandler)]
+    streams = [handler.setStream(buffer) for handler in handlers]
+    try:
+        with contextlib.redirect_stdout(buffer):
+            yield
+    finally:
+        for handler, stream in zip(handlers, streams):
+            handler.setStream(stream)
+
+
+def measure(call: Callable[[], None], iterations: int) -> float:
+    """
+    Return the average duration of the call in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main(iterations: int = 50):
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = os.path.join(directory, os.path.basename(SOURCE_DB_FILE))
+        shutil.copy(SOURCE_DB_FILE, db_file)
+        db_url = f'sqlite:///{db_file}'
+
+        # The echo output of the legacy engines is discarded, only its cost is measured
+        with discard_log_output():
+            legacy = measure(lambda: run_catalog_calls(LegacyManagerAlchemyDB, db_url), iterations)
+
+        # The first call creates the shared engine, it is measured separately
+        first_call = measure(lambda: run_catalog_calls(ManagerAlchemyDB, db_url), 1)
+        shared = measure(lambda: run_catalog_calls(ManagerAlchemyDB, db_url), iterations)
+        dispose_engines()
+
+    print(f'Three catalog calls, average of {iterations} runs:')
+    print(f'  engine per call (echo on): {legacy:8.2f} ms')
+    print(f'  shared engine, first run:  {first_call:8.2f} ms')
+    print(f'  shared engine:             {shared:8.2f} ms ({legacy / shared:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark of the context compaction: the prompt tokens of every Attack Coordinator turn of a saved run, with the whole
+history (as create_ordinary_node passed it before) and with the history compacted by ContextCompactor.
+
+The run is replayed from the latest snapshot of the file: the agent was invoked before each of its AI messages, with
+all the messages preceding it.
+
+The saved runs are shorter than COMPACTION_KEEP_TURNS plus a few turns, so none of their turns would be compacted.
+The tool call turns of the snapshot are repeated with new tool call ids until the run has the given number of turns
+(30 by default), which is the length of an investigation scanning a host with a few dozen modules.
+
+Run from the project root:
+    python -m benchmarks.benchmark_context_compaction [snapshot file] [turns] [keep turns]
+"""
+import sys
+import time
+from typing import List
+from uuid import uuid4
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from constants import COMPACTION_KEEP_TURNS
+from utils.langraph.context_compactor import ContextCompactor
+from utils.langraph.mapper import load_snapshot_from_json
+from utils.token_utils import count_messages_tokens
+
+SNAPSHOT_FILE = 'resources/states/Attack Coordinator_snapshots_11_09_2024_14_24'
+REPLAY_TURNS = 30
+
+
+def extend_run(messages: List[BaseMessage], turns: int) -> List[BaseMessage]:
+    """
+    Repeat the tool call turns of the run until it has the given number of AI messages, the final answer stays last.
+    The repeated calls get new ids, so the compactor does not reuse the outputs of the first ones.
+    """
+    task_message, final_message = messages[0], messages[-1]
+    tool_turns = [(message, messages[position + 1:position + 1 + len(message.tool_calls)])
+                  for position, message in enumerate(messages)
+                  if isinstance(message, AIMessage) and message.tool_calls]
+    if not tool_turns:
+        return list(messages)
+
+    extended = [task_message]
+    for turn in range(max(1, turns - 1)):
+        ai_message, tool_messages = tool_turns[turn % len(tool_turns)]
+        ids = {tool_call['id']: f'toolu_{uuid4().hex}' for tool_call in ai_message.tool_calls}
+        extended.append(ai_message.model_copy(update={
+            'id': None,
+            'tool_calls': [{**tool_call, 'id': ids[tool_call['id']]} for tool_call in ai_message.tool_calls]
+        }))
+        extended.extend(message.model_copy(update={'id': None, 'tool_call_id': ids.get(message.tool_call_id)})
+                        for message in tool_messages if isinstance(message, ToolMessage))
+    extended.append(final_message)
+    return extended
+
+
+def replay_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """
+    Return the histories the agent was invoked with, one per AI message after the task.
+    """
+    return [messages[:position] for position, message in enumerate(messages)
+            if position > 0 and isinstance(message, AIMessage)]
+
+
+def main(file_path: str = SNAPSHOT_FILE, turns: int = REPLAY_TURNS, keep_turns: int = COMPACTION_KEEP_TURNS):
+    snapshot_messages = load_snapshot_from_json(file_path, position=0).values['messages']
+    messages = extend_run(snapshot_messages, int(turns))
+    compactor = ContextCompactor(keep_turns=int(keep_turns))
+
+    print(f'{file_path}: {len(snapshot_messages)} messages replayed as {len(messages)}, '
+          f'{keep_turns} turns kept unchanged')
+    print(f'{"turn":>4} {"messages":>8} {"full tokens":>12} {"compacted":>10} {"ms":>7}')
+    total_full = total_compacted = 0
+    for turn, history in enumerate(replay_turns(messages), start=1):
+        start = time.perf_counter()
+        compacted = compactor.compact(history)
+        duration = (time.perf_counter() - start) * 1000
+        full_tokens, compacted_tokens = count_messages_tokens(history), count_messages_tokens(compacted)
+        total_full += full_tokens
+        total_compacted += compacted_tokens
+        print(f'{turn:>4} {len(history):>8} {full_tokens:>12} {compacted_tokens:>10} {duration:>7.2f}')
+
+    if total_full:
+        print(f'Prompt tokens of the run: {total_full} -> {total_compacted} '
+              f'({100 * (1 - total_compacted / total_full):.1f}% fewer)')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,145 @@
+"""
+Benchmark of DataCompressor and its check against the previous (quadratic) implementation.
+
+Run from the project root:
+    python -m benchmarks.benchmark_data_compressor
+"""
+import random
+import re
+import sqlite3
+import time
+from typing import Dict, List
+
+from utils.msf.data_compressor import DataCompressor
+
+
+class LegacyDataCompressor:
+    """
+    The previous implementation of DataCompressor, kept as the reference for the output format.
+    """
+
+    def __init__(self):
+        self.lines = None
+        self.result_dict: Dict[str, List[str]] = {}
+        self.reserve_list: List[str] = []
+
+    def start_compressing(self, text: str):
+        self.lines: List[str] = [line for line in re.split(r'\n', text) if line]
+        self._main_loop(self.lines)
+
+    def _create_patterns(self, line: str) -> List[str]:
+        return list(filter(None, re.split(r'(\s+|\W+)', line)))
+
+    def _main_loop(self, lines: List[str]):
+        while lines:
+            current_line = lines.pop(0)
+            base_pattern = self._create_patterns(current_line)
+            self._recursive_extract(base_pattern, lines, 1, False)
+            self.result_dict = {key: value for key, value in self.result_dict.items() if value}
+            for base, values in self.result_dict.items():
+                self.reserve_list.append(base + ', '.join(value.removeprefix(base) for value in values))
+            self.result_dict = {}
+
+    def _recursive_extract(self, pattern_parts: List[str], lines: List[str], i: int, added_to_reserve: bool):
+        if i > len(pattern_parts):
+            return
+        current_pattern = ''.join(pattern_parts[:i])
+        current_pattern_escaped = re.escape(current_pattern)
+        matched_lines = [line for line in lines if re.match(current_pattern_escaped, line)]
+        if matched_lines:
+            self.result_dict[current_pattern] = matched_lines
+            for line in matched_lines:
+                lines.remove(line)
+            self._recursive_extract(pattern_parts, matched_lines, i + 1, added_to_reserve)
+        else:
+            if not added_to_reserve:
+                self.reserve_list.append(''.join(pattern_parts))
+                added_to_reserve = True
+            self._recursive_extract(pattern_parts, lines, i + 1, added_to_reserve)
+
+    def get_compressed_output(self):
+        return ' ' + self.reserve_list[0] + '\n ' + '\n '.join(self.reserve_list[1:])
+
+
+def load_stored_outputs(db_file: str = 'my_sqlite.db') -> List[str]:
+    """
+    Load all the console outputs stored in the daily msf_console tables.
+    """
+    connection = sqlite3.connect(db_file)
+    try:
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'msf_console_%'"
+        )]
+        outputs = []
+        for table_name in tables:
+            outputs.extend(row[0] for row in connection.execute(f'SELECT output FROM {table_name}') if row[0])
+        return outputs
+    finally:
+        connection.close()
+
+
+def generate_scanner_output(lines_count: int, seed: int = 0) -> str:
+    """
+    Generate output that looks like dir_scanner and portscan/tcp results for the given number of lines.
+    """
+    rnd = random.Random(seed)
+    words = ['admin', 'backup', 'config', 'images', 'login', 'api', 'v1', 'static', 'uploads', 'test', 'old', 'tmp']
+    lines = []
+    for i in range(lines_count):
+        host = f'10.{rnd.randint(0, 3)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}'
+        kind = rnd.random()
+        if kind < 0.5:
+            lines.append(f'[+] {host}:{rnd.randint(1, 65535)} - TCP OPEN')
+        elif kind < 0.9:
+            path = '/'.join(rnd.choice(words) for _ in range(rnd.randint(1, 3)))
+            lines.append(f'[+] Found http://{host}:80/{path}/ {rnd.choice([200, 301, 403])} (10.0.0.1)')
+        else:
+            lines.append(f'[*] Scanned {i} of {lines_count} hosts ({100 * i // lines_count}% complete)')
+    return '\n'.join(lines)
+
+
+def compress(compressor_class, text: str) -> str:
+    compressor = compressor_class()
+    compressor.start_compressing(text)
+    return compressor.get_compressed_output()
+
+
+def check_against_legacy(outputs: List[str]) -> int:
+    """
+    Compare the output of both implementations and return the number of mismatches.
+    """
+    mismatches = 0
+    for output in outputs:
+        if not [line for line in output.split('\n') if line]:
+            continue
+        if compress(DataCompressor, output) != compress(LegacyDataCompressor, output):
+            mismatches += 1
+    return mismatches
+
+
+def measure(compressor_class, text: str) -> float:
+    start = time.perf_counter()
+    compress(compressor_class, text)
+    return time.perf_counter() - start
+
+
+def main():
+    stored_outputs = load_stored_outputs()
+    mismatches = check_against_legacy(stored_outputs)
+    print(f'Stored outputs checked: {len(stored_outputs)}, mismatches with the legacy implementation: {mismatches}')
+
+    synthetic_outputs = [generate_scanner_output(lines_count, seed) for seed, lines_count in enumerate([50, 500, 2000])]
+    mismatches = check_against_legacy(synthetic_outputs)
+    print(f'Synthetic outputs checked: {len(synthetic_outputs)}, mismatches: {mismatches}')
+
+    for lines_count in (1_000, 10_000, 100_000):
+        text = generate_scanner_output(lines_count)
+        duration = measure(DataCompressor, text)
+        line = f'{lines_count:>7} lines: DataCompressor {duration:8.3f} s'
+        if lines_count <= 10_000:
+            line += f', legacy {measure(LegacyDataCompressor, text):8.3f} s'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark of concurrent inserts into the console results store of a fresh database, as parallel tool calls do them:
+every thread has its own connection and inserts results of the same module, host and arguments.
+
+The run fails if the store is not created by the first insert or if more than one result of a key is flagged as the
+best one.
+
+Run from the project root:
+    python -m benchmarks.benchmark_results_store [threads] [inserts per thread]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from dao.sqlite.msf_sqlite import RESULTS_TABLE, check_existing_record, create_connection, insert_result
+
+MODULE_NAME = 'auxiliary/scanner/http/http_version'
+HOST = '10.0.0.1'
+MODULE_ARGS = {'RPORT': 80}
+
+
+def insert_results(db_file: str, inserts: int, failures: list) -> None:
+    """
+    Insert results of growing length on a connection of its own, recording the failed inserts.
+    """
+    db_connection = create_connection(db_file)
+    for number in range(inserts):
+        if not insert_result(db_connection, module=MODULE_NAME, host=HOST, output='x' * (number % 10 + 1),
+                             args=MODULE_ARGS):
+            failures.append(number)
+    db_connection.close()
+
+
+def main(threads: int = 8, inserts: int = 50):
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = os.path.join(directory, 'results.db')
+
+        # The first insert into a fresh database creates the store
+        db_connection = create_connection(db_file)
+        if not insert_result(db_connection, module=MODULE_NAME, host=HOST, output='x', args=MODULE_ARGS):
+            raise SystemExit('The insert into a fresh database failed')
+
+        failures = []
+        workers = [threading.Thread(target=insert_results, args=(db_file, inserts, failures)) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        duration = time.perf_counter() - start
+
+        rows, best_rows = db_connection.execute(
+            f"SELECT COUNT(*), SUM(is_best) FROM {RESULTS_TABLE} WHERE module = ? AND host = ?", (MODULE_NAME, HOST)
+        ).fetchone()
+        best = check_existing_record(db_connection, MODULE_NAME, HOST, MODULE_ARGS)
+        db_connection.close()
+
+    print(f'{threads} threads x {inserts} inserts: {duration * 1000:.1f} ms, '
+          f'{duration * 1000 / (threads * inserts):.2f} ms per insert')
+    print(f'  stored results: {rows}, failed inserts: {len(failures)}, best results: {best_rows}, '
+          f'best output length: {len(best[0])}')
+    if failures or best_rows != 1:
+        raise SystemExit('The results store is inconsistent')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -34,9 +34,28 @@ EXECUTION_COMPLETION_PHRASES = [
     '[-] Unknown command:'
 ]
 TIMEOUT = 600  # 10 minutes
+CONSOLE_POLL_MIN_INTERVAL = 0.05  # seconds between reads while the console is streaming data
+CONSOLE_POLL_MAX_INTERVAL = 1.0  # upper bound of the idle backoff
+CONSOLE_POLL_BACKOFF_FACTOR = 2
+CONSOLE_OUTPUT_MAX_CHARS = 1_000_000  # raw output kept for the database, the compressed output covers all of it
+
+# classes.py - msfconsole pool
+MSF_CONSOLE_POOL_SIZE = 5  # number of consoles kept alive and ready to be leased
+MSF_CONSOLE_BUSY_TIMEOUT = 30  # seconds a returned console may stay busy before it is replaced
+MSF_CONSOLE_DRAIN_TIMEOUT = 10  # seconds to wait for a console prompt after creation or reset
+MSF_CONSOLE_MAX_LEASES = 20  # consoles of an async pool in use at the same time, the other leases wait
+
+# async_client.py - asyncio msgpack-RPC client of msfrpcd
+MSF_RPC_URI = '/api/'
+MSF_RPC_USERNAME = 'msf'
+MSF_RPC_REQUEST_TIMEOUT = 60  # seconds of a single RPC request
+MSF_RPC_MAX_CONNECTIONS = 100  # HTTP connections to msfrpcd shared by all the consoles of an event loop
+MSF_RPC_RETRIES = 3  # attempts of a request that failed on the connection level
 
 # importing_msfinfo_database.py
 DELETE_UNTIL = '#     Name'
+IMPORT_MAX_WORKERS = 8  # RPC connections used to fetch module info concurrently
+IMPORT_BATCH_SIZE = 500  # modules written to the database in one transaction
 
 # some flag
 MOCK: bool = False
@@ -45,15 +64,94 @@ MOCK_MSF_TOOLS: bool = False
 # database
 TABLE_NAME: str | None = None
 
+# checkpointer.py - checkpoints of graph executions
+CHECKPOINT_PERSISTENT: bool = True  # SqliteCheckpointSaver instead of MemorySaver
+CHECKPOINT_DB_FILE = 'checkpoints.db'
+CHECKPOINT_CACHE_SIZE = 16  # serialized checkpoints kept in memory
+
+# snapshot_format.py - files of state snapshots
+SNAPSHOT_BINARY_FORMAT: bool = True  # indexed binary files instead of the legacy JSON text files
+SNAPSHOT_CODEC: str | None = None  # 'zstd', 'gzip', 'zlib' or 'none', None picks zstd when installed, else gzip
+
+# result_cache.py - memoization of msf_console_scan_tool_dynamic results
+MSF_RESULT_CACHE_ENABLED: bool = True
+MSF_RESULT_CACHE_SIZE = 256  # entries kept in memory, the least recently used are evicted first
+MSF_RESULT_CACHE_DEFAULT_TTL = 3600  # seconds
+MSF_RESULT_CACHE_TTLS = {  # per-module TTLs in seconds, the longest matching module prefix wins, 0 disables caching
+    'auxiliary/scanner/portscan': 1800,
+    'exploit': 0
+}
+
+# SQLAlchemy engine registry
+SQLITE_JOURNAL_MODE = 'WAL'  # readers are not blocked by a writer
+SQLITE_SYNCHRONOUS = 'NORMAL'  # safe with WAL and does not sync on every commit
+
+# Console results writer
+RESULT_WRITER_MAX_BATCH = 100  # the maximum number of rows written in one transaction
+RESULT_WRITER_TIMEOUT = 60  # seconds a tool call waits for its row to be committed
+
+# Metasploit module catalog
+MSF_DB_URL = 'sqlite:///metasploit_data.db'
+CATALOG_SEARCH_LIMIT = 20  # the default number of modules returned by the keyword search
+CATALOG_NAME_WEIGHT = 3  # a token of the module path weighs as much as 3 occurrences in the description
+MODULE_OPTIONS_BATCH_SIZE = 500  # module names per query, below the SQLite limit of bound parameters
+
+# token_utils.py - token counting
+TOKEN_ENCODING = 'cl100k_base'  # tiktoken encoding, the counts of other models' tokenizers are close enough
+TOKEN_COUNT_CACHE_SIZE = 4096  # texts whose token counts are kept in memory
+CHARS_PER_TOKEN = 4  # estimate used when the tiktoken encoding is not available
+MESSAGE_TOKEN_OVERHEAD = 4  # role and separators of every message
+
+# context_compactor.py - compaction of the message history before an agent is invoked
+COMPACTION_ENABLED: bool = True
+COMPACTION_KEEP_TURNS = 4  # the last turns passed to the agent unchanged
+COMPACTION_TOKEN_BUDGET = 60_000  # the oldest turns are dropped above it, None disables the budget
+COMPACTION_TOOL_OUTPUT_TOKENS = 300  # the maximum size of a compacted tool output
+COMPACTION_CACHE_SIZE = 256  # compacted tool outputs kept in memory
+COMPACTION_LOOKUP_TOOLS = {  # tools with side effects and the read-only tools returning their stored outputs
+    'msf_console_scan_tool_dynamic': 'get_stored_scan_result'
+}
+
+# llm_cache.py - on-disk cache of LLM responses of temperature-0 agents
+LLM_CACHE_DB_FILE = 'llm_cache.db'
+LLM_CACHE_MAX_ENTRIES = 10_000  # the least recently used responses are evicted above it
+PLANNING_LLM_CACHE: bool = True  # the module selection and extraction agents of the planning team use the cache
+
+# instrumentation.py - metrics of the graph runs
+INSTRUMENTATION_ENABLED: bool = True
+METRICS_DIR = 'resources/metrics'  # per-run JSON summaries and Prometheus text files
+METRICS_PREFIX = 'pentest'  # prefix of the Prometheus metric names
+NODE_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)  # seconds
+TOOL_DURATION_BUCKETS = (0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600)  # seconds
+
+# graph_executor.py - concurrent investigations of many targets
+LAUNCH_MAX_CONCURRENCY = 10  # investigations running at the same time, bounded by the LLM rate limits and msfrpcd
+LAUNCH_RESULTS_DIR = 'resources/results'  # per-target result files and message logs
+
+# graph_factory.py - compiled graphs reused between runs
+GRAPH_CACHE_SIZE = 32  # compiled graphs kept in memory, the least recently used are evicted first
+RENDER_GRAPH: bool = False  # render the graph to a PNG (Mermaid over the network) and open it before every run
+
 # file path
 MESSAGE_FOLDER = 'messages'
 
+# prompt_registry.py - message files and agent prompt templates
+PROMPT_TOKEN_BUDGET = 2000  # a warning is logged for a system prompt above it, None disables the check
+PROMPT_TEMPLATE_CACHE_SIZE = 256  # prompt templates kept in memory, the least recently used are dropped above it
+
 # end key
 FINAL_ANSWER = "FINAL ANSWER"
 
 # msf_tools.py
 HOST_NAMES_LIST = ['RHOSTS', 'rhosts']
 
+# nodes.py - parallel tool execution
+TOOL_NODE_MAX_WORKERS = 8  # upper bound of tool calls executed at the same time by one tool node
+TOOL_CONCURRENCY_LIMITS = {  # per-tool limits, tools that are not listed are limited by TOOL_NODE_MAX_WORKERS only
+    'msf_console_scan_tool_dynamic': 5,
+    'msf_console_scan_tool': 5
+}
+
 TESTING_NODE = "Attack Coordinator"
 PLANNER_NODE = "Operation Planner"
 QUASI_HUMAN_NODE = "Qausi Human"
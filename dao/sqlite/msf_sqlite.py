@@ -1,7 +1,16 @@
+import hashlib
+import json
 import re
 import sqlite3
 import sqlite3 as sqlite
-from typing import List, Dict
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+# The single store of console results and the table that records imported daily tables
+RESULTS_TABLE = 'console_results'
+RESULTS_MIGRATIONS_TABLE = 'console_results_migrations'
+DAILY_TABLE_PREFIX = 'msf_console_'
+DAILY_TABLE_PATTERN = re.compile(r'^msf_console_\d{4}_\d{2}_\d{2}$')
 
 
 def create_connection(db_file="my_sqlite.db"):
@@ -351,33 +360,253 @@ def chose_heavy_weight_result(results: Dict[str, List[str]]) -> str | None:
     return heaviest_result
 
 
-def check_existing_record(db_connection, module: str, rhosts: str) -> str | None:
+def compute_args_hash(args: Optional[Dict[str, Any]]) -> str:
+    """
+    Compute a stable hash of module arguments.
+
+    Keys are upper-cased (Metasploit options are case-insensitive), values are converted to strings and empty values
+    are dropped, so the same options written in a different order or case produce the same hash.
+
+    Args:
+        args (Optional[Dict[str, Any]]): The module options.
+
+    Returns:
+        str: The hex digest of the normalized arguments, or an empty string if there are no arguments.
+    """
+    if not args:
+        return ''
+    normalized = {str(key).upper(): str(value) for key, value in args.items() if value is not None and value != ''}
+    if not normalized:
+        return ''
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+def create_results_store(db_connection) -> bool:
+    """
+    Create the results store and its indexes if they do not exist.
+
+    When the store is created for the first time, all the existing daily msf_console tables are imported into it.
+
+    Args:
+        db_connection: The database connection object.
+
+    Returns:
+        bool: True if the store was created by this call, False if it already existed.
+    """
+    cursor = db_connection.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (RESULTS_TABLE,))
+    if cursor.fetchone():
+        return False
+
+    cursor.executescript(f"""
+    CREATE TABLE IF NOT EXISTS {RESULTS_TABLE} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        module TEXT NOT NULL,
+        host TEXT NOT NULL,
+        args_hash TEXT NOT NULL DEFAULT '',
+        args TEXT,
+        output TEXT,
+        compressed_output TEXT,
+        output_length INTEGER NOT NULL DEFAULT 0,
+        duration TEXT,
+        created_at REAL NOT NULL,
+        source_table TEXT,
+        is_best INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS ix_{RESULTS_TABLE}_lookup ON {RESULTS_TABLE} (module, host, args_hash, is_best);
+    CREATE TABLE IF NOT EXISTS {RESULTS_MIGRATIONS_TABLE} (
+        table_name TEXT NOT NULL PRIMARY KEY,
+        rows_count INTEGER NOT NULL,
+        migrated_at REAL NOT NULL
+    );
+    """)
+    db_connection.commit()
+    migrate_daily_tables(db_connection)
+    return True
+
+
+def insert_result(db_connection, module: str, host: str, output: str, compressed_output: Optional[str] = None,
+                  args: Optional[Dict[str, Any]] = None, duration: Optional[str] = None,
+                  source_table: Optional[str] = None, created_at: Optional[float] = None,
+                  commit: bool = True) -> bool:
     """
-    Check if there is an existing record in any table for the given module and rhosts.
+    Insert a console result into the results store and keep the 'best result' flag up to date.
+
+    The best result of a (module, host, args_hash) key is the one with the longest output; a new result of the same
+    length replaces the previous best, so the freshest one is returned. The store is created on a fresh database, and
+    the flag is read and updated under a write lock (BEGIN IMMEDIATE), so concurrent tool calls on separate
+    connections cannot both flag their result as the best one.
+
+    Args:
+        db_connection: The database connection object.
+        module (str): The full module name, e.g. 'auxiliary/scanner/http/http_version'.
+        host (str): The target host.
+        output (str): The console output.
+        compressed_output (Optional[str]): The compressed console output.
+        args (Optional[Dict[str, Any]]): The module options used for the run.
+        duration (Optional[str]): The duration of the run.
+        source_table (Optional[str]): The daily table the result was imported from.
+        created_at (Optional[float]): The unix time of the run, defaults to now.
+        commit (bool): Commit the transaction after the insert.
+
+    Returns:
+        bool: True if the insertion was successful, False otherwise.
+    """
+    args_hash = compute_args_hash(args)
+    output_length = len(output or '')
+    try:
+        create_results_store(db_connection)
+        cursor = db_connection.cursor()
+        if not db_connection.in_transaction:
+            # Take the write lock before reading the best result, it is held until the commit
+            cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            f"SELECT id, output_length FROM {RESULTS_TABLE} "
+            f"WHERE module = ? AND host = ? AND args_hash = ? AND is_best = 1",
+            (module, host, args_hash)
+        )
+        best = cursor.fetchone()
+        is_best = best is None or output_length >= best[1]
+        if best and is_best:
+            cursor.execute(f"UPDATE {RESULTS_TABLE} SET is_best = 0 WHERE id = ?", (best[0],))
+
+        cursor.execute(
+            f"INSERT INTO {RESULTS_TABLE} (module, host, args_hash, args, output, compressed_output, output_length, "
+            f"duration, created_at, source_table, is_best) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (module, host, args_hash, json.dumps(args, default=str) if args else None, output, compressed_output,
+             output_length, duration, created_at if created_at is not None else time.time(), source_table,
+             int(is_best))
+        )
+        if commit:
+            db_connection.commit()
+        return True
+    except sqlite.Error as e:
+        print(f"Error inserting a result into table {RESULTS_TABLE}: {e}")
+        db_connection.rollback()
+        return False
+
+
+def migrate_daily_tables(db_connection) -> int:
+    """
+    Import the rows of the daily msf_console_YYYY_MM_DD tables into the results store.
+
+    Every table is imported once and recorded in the migrations table. Tables written by msf_console_scan_tool use
+    the 'rhosts' column and keep rport/ports/threads as arguments, tables written by ManagerAlchemyDB use 'host'.
+
+    Args:
+        db_connection: The database connection object.
+
+    Returns:
+        int: The number of imported rows.
+    """
+    cursor = db_connection.cursor()
+    cursor.execute(f"SELECT table_name FROM {RESULTS_MIGRATIONS_TABLE}")
+    migrated = {row[0] for row in cursor.fetchall()}
+
+    imported = 0
+    for table_name in get_all_tables(db_connection):
+        if table_name in migrated or not DAILY_TABLE_PATTERN.match(table_name):
+            continue
+        # Another connection may be importing the same tables, check the table again under the write lock
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(f"SELECT 1 FROM {RESULTS_MIGRATIONS_TABLE} WHERE table_name = ?", (table_name,))
+        if cursor.fetchone():
+            db_connection.commit()
+            continue
+
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        columns = {row[1] for row in cursor.fetchall()}
+        host_column = 'rhosts' if 'rhosts' in columns else 'host' if 'host' in columns else None
+        if host_column is None or not {'module', 'output'}.issubset(columns):
+            db_connection.commit()
+            continue
+        args_columns = [column for column in ('rport', 'ports', 'threads') if column in columns]
+        optional_columns = [column for column in ('compressed_output', 'duration') if column in columns]
+
+        created_at = time.mktime(time.strptime(table_name[len(DAILY_TABLE_PREFIX):], '%Y_%m_%d'))
+        select_columns = ['module', host_column, 'output', *optional_columns, *args_columns]
+        cursor.execute(f"SELECT {', '.join(select_columns)} FROM {table_name} ORDER BY rowid")
+        rows = cursor.fetchall()
+        for row in rows:
+            record = dict(zip(select_columns, row))
+            args = {column: record[column] for column in args_columns if record[column] not in (None, '', '0', 0)}
+            insert_result(
+                db_connection,
+                module=record['module'],
+                host=record[host_column] or '',
+                output=record['output'],
+                compressed_output=record.get('compressed_output'),
+                args=args,
+                duration=record.get('duration'),
+                source_table=table_name,
+                created_at=created_at,
+                commit=False
+            )
+        cursor.execute(
+            f"INSERT INTO {RESULTS_MIGRATIONS_TABLE} (table_name, rows_count, migrated_at) VALUES (?, ?, ?)",
+            (table_name, len(rows), time.time())
+        )
+        db_connection.commit()
+        imported += len(rows)
+    return imported
+
+
+def check_existing_record(db_connection, module: str, rhosts: str,
+                          args: Optional[Dict[str, Any]] = None) -> Tuple[str, str] | None:
+    """
+    Check if there is an existing result in the results store for the given module and rhosts.
+
+    The lookup uses the (module, host, args_hash, is_best) index, so its cost does not depend on the number of daily
+    tables or stored results.
 
     Args:
         db_connection: The database connection object.
         module (str): The module to search for.
         rhosts (str): The rhosts to search for.
+        args (Optional[Dict[str, Any]]): The module options. If omitted, the best result over all options is returned.
 
     Returns:
-        str | None: The output from the first matching record, or None if no match is found.
+        Tuple[str, str] | None: The output and compressed output of the best matching record, or None if no match
+        is found.
     """
-    required_fields = ['module', 'rhosts', 'output', 'compressed_output']
-    tables = get_filtered_tables(db_connection, required_fields)
+    create_results_store(db_connection)
     cursor = db_connection.cursor()
+    if args is None:
+        cursor.execute(
+            f"SELECT output, compressed_output FROM {RESULTS_TABLE} "
+            f"WHERE module = ? AND host = ? AND is_best = 1 ORDER BY output_length DESC LIMIT 1",
+            (module, rhosts)
+        )
+    else:
+        cursor.execute(
+            f"SELECT output, compressed_output FROM {RESULTS_TABLE} "
+            f"WHERE module = ? AND host = ? AND args_hash = ? AND is_best = 1",
+            (module, rhosts, compute_args_hash(args))
+        )
+    return cursor.fetchone()
 
-    results = {}
-    for table_name in tables:
-        query = f"""
-        SELECT output, compressed_output 
-        FROM {table_name}
-        WHERE module = ? AND rhosts = ?
-        """
-        cursor.execute(query, (module, rhosts))
-        record = cursor.fetchone()
-        if record:
-            add_to_results(results, table_name, record)
 
-    return chose_heavy_weight_result(results) if results else None
+def get_latest_result(db_connection, module: str, host: str, args_hash: str,
+                      not_before: Optional[float] = None) -> Tuple[str, str, float] | None:
+    """
+    Retrieve the most recent result for exactly the same module, host and arguments.
+
+    Args:
+        db_connection: The database connection object.
+        module (str): The full module name.
+        host (str): The target host.
+        args_hash (str): The hash of the module options, see compute_args_hash().
+        not_before (Optional[float]): Ignore results created before this unix time.
 
+    Returns:
+        Tuple[str, str, float] | None: The output, compressed output and creation time (unix time) of the latest
+        result, or None if there is none.
+    """
+    create_results_store(db_connection)
+    cursor = db_connection.cursor()
+    cursor.execute(
+        f"SELECT output, compressed_output, created_at FROM {RESULTS_TABLE} "
+        f"WHERE module = ? AND host = ? AND args_hash = ? AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+        (module, host, args_hash, not_before if not_before is not None else 0)
+    )
+    return cursor.fetchone()
@@ -1,17 +1,21 @@
+import asyncio
 import datetime
 import logging
 import re
 import time
-from typing import Optional, Tuple, List, Dict, Any
+from typing import Optional, Tuple, List, Dict, Any, Callable, Union
 
-from pymetasploit3.msfrpc import MsfRpcClient
 from langchain_core.tools import tool
 
 from constants import *
-from dao.sqlite.msf_sqlite import create_table, insert_data, create_connection, check_existing_record
+from dao.sqlite.msf_sqlite import create_table, insert_data, create_connection, check_existing_record, insert_result
 from utils.dao.sqlalchemy.db_manager.alchemy_manager import ManagerAlchemyDB
+from utils.msf.async_client import AsyncMsfConsole, get_async_msf_client
 from utils.msf.classes import CustomMsfRpcClient
-from utils.msf.data_compressor import DataCompressor
+from utils.msf.console_reader import ConsoleOutputReader, TIMEOUT_MESSAGE
+from utils.msf.data_compressor import DataCompressor, StreamingDataCompressor
+from utils.msf.module_catalog import get_module_catalog
+from utils.msf.result_cache import get_scan_result_cache, normalize_module_name
 from utils.task_time_logger import TaskTimeLogger
 
 logger = logging.getLogger(__name__)
@@ -20,6 +24,12 @@ logging.basicConfig(level=logging.INFO)
 
 logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
 
+# The last line of the msfconsole banner
+CONSOLE_BANNER_LINE = 'Metasploit Documentation: https://docs.metasploit.com/'
+CONSOLE_BANNER_PATTERN = re.compile(re.escape(CONSOLE_BANNER_LINE) + '\n')
+# Full module paths mentioned in a plan or a list of modules
+MODULE_PATH_PATTERN = re.compile(r'\b(?:auxiliary|exploit)/[\w\-/]+')
+
 @tool
 def msf_console_scan_tool(module_category: str, module_name: str, rhosts: str, rport: Optional[str] = None,
                           ports: Optional[str] = None, threads: int = 50, target: Optional[int] = None,
@@ -69,14 +79,13 @@ Example:
             #     f'The data was found in database for these parameters: {module_category}/{module_name}, {rhosts}')
             return record[0]
 
-    # Create Metasploit RPC client
-    logger.log_duration('RPC Client creation started')
-    client: MsfRpcClient = CustomMsfRpcClient().get_client()
-    logger.log_duration('RPC Client creation completed')
-
-    # Create a new console
-    current_console = client.consoles.console()
+    # Lease a console from the pool of the Metasploit RPC client
+    logger.log_duration('Console leasing started')
+    console_pool = CustomMsfRpcClient().get_console_pool()
+    current_console = console_pool.acquire()
+    logger.log_duration('Console leasing completed')
 
+    reusable = False
     try:
         commands = [
             f'use {module_category}/{module_name}',
@@ -104,40 +113,16 @@ Example:
 
         logger.log_duration('the command was created and sent to msfconsole.')
 
-        # Record the start time
-        start_time = time.time()
-
-        output = ""
-        while True:
-            response = current_console.read()
-            if response['data']:
-                # print(response['data'])
-                output += response['data']
-                # print(response['data'])
-
-            if any(keyword in output for keyword in EXECUTION_COMPLETION_PHRASES):
-                break
-
-            # Check for timeout
-            if time.time() - start_time > TIMEOUT:
-                timeout_message = '[TIMEOUT] "Time limit exceeded, exiting the loop."'
-                output += timeout_message
-                logger.warning(timeout_message)
-
-                # Stop the task in Metasploit
-                current_console.write('exit\n')
-                break
-
-            time.sleep(1)
+        output = _read_console_output(current_console, TIMEOUT)
+        reusable = not output.endswith(TIMEOUT_MESSAGE)
     finally:
-        # Destroy the console
-        current_console.destroy()
+        # Return the console to the pool, a timed out or failed console is destroyed
+        console_pool.release(current_console, reusable=reusable)
 
     logger.log_duration(f'This task was executed! Next, data will be cleaned and written into the database!')
 
-    # Split the output at the documentation line and take the part after it
-    split_output = re.split(r'Metasploit Documentation: https://docs.metasploit.com/\n', output, maxsplit=1)
-    filtered_output = split_output[1] if len(split_output) > 1 else ""
+    # Drop the console banner if the output still contains it
+    filtered_output = _strip_console_banner(output)
     compressed_output: str | None = None
     if should_use_compressor(filtered_output, min_lines=15, patterns=[r'\[\*\]']):
         compressor = DataCompressor()
@@ -156,6 +141,15 @@ Example:
         'compressed_output': str(compressed_output)
     }
     insert_data(db_connection, table_name, table_values, logger)
+    insert_result(
+        db_connection,
+        module=f'{module_category}/{module_name}',
+        host=rhosts,
+        output=filtered_output,
+        compressed_output=str(compressed_output),
+        args={'rport': rport, 'ports': ports, 'threads': threads},
+        duration=str(logger.get_duration())
+    )
 
     return compressed_output if compressed_output else filtered_output
 
@@ -208,10 +202,9 @@ def get_msf_sub_groups_list() -> List[str]:
     :return: A list of unique sub_group names.
     :rtype: List[str]
     """
-    db_url: str = 'sqlite:///metasploit_data.db'
+    db_url: str = MSF_DB_URL
     try:
-        manager_db = ManagerAlchemyDB(db_url)
-        sub_groups = manager_db.get_sub_group_from_modules()
+        sub_groups = get_module_catalog(db_url).get_sub_groups()
         return sub_groups
     except Exception as e:
         print(f"Failed to retrieve sub_group list: {e}")
@@ -219,7 +212,7 @@ def get_msf_sub_groups_list() -> List[str]:
 
 
 @tool
-def get_msf_exact_sub_group_modules_list(sub_group_name: str, db_url: str = 'sqlite:///metasploit_data.db') -> List[Tuple[str, str]]:
+def get_msf_exact_sub_group_modules_list(sub_group_name: str, db_url: str = MSF_DB_URL) -> List[Tuple[str, str]]:
     """
     Retrieves a list of modules by their 'sub_group' from the 'module_auxiliary' table.
 
@@ -234,8 +227,7 @@ def get_msf_exact_sub_group_modules_list(sub_group_name: str, db_url: str = 'sql
     :rtype: List[Tuple[str, str]]
     """
     try:
-        manager_db = ManagerAlchemyDB(db_url)
-        modules = manager_db.get_modules_by_sub_group(sub_group_name)
+        modules = get_module_catalog(db_url).get_modules_by_sub_group(sub_group_name)
         return modules
     except Exception as e:
         print(f"Failed to retrieve modules for sub_group '{sub_group_name}': {e}")
@@ -244,7 +236,7 @@ def get_msf_exact_sub_group_modules_list(sub_group_name: str, db_url: str = 'sql
 
 
 @tool
-def get_msf_module_options(module_name: str, db_url: str = 'sqlite:///metasploit_data.db') -> str:
+def get_msf_module_options(module_name: str, db_url: str = MSF_DB_URL) -> str:
     """
     Retrieves all non-null options for a given Metasploit module from the 'module_options_auxiliary' table.
 
@@ -260,9 +252,8 @@ def get_msf_module_options(module_name: str, db_url: str = 'sqlite:///metasploit
         an error occurs.
     """
     try:
-        manager_db = ManagerAlchemyDB(db_url)
         # Retrieve module options and filter out null values
-        modules = [module for module in manager_db.get_module_options(module_name) if module]
+        modules = [module for module in get_module_catalog(db_url).get_options(module_name) if module]
         # Format and return the options as a string
         return f'Configuration options for this module -> {module_name}: {", ".join(modules)}'
     except Exception as e:
@@ -271,6 +262,72 @@ def get_msf_module_options(module_name: str, db_url: str = 'sqlite:///metasploit
         return ''
 
 
+@tool
+def get_msf_modules_options_batch(modules: Union[List[str], str], db_url: str = MSF_DB_URL) -> str:
+    """
+    Retrieves the options of all the Metasploit modules of a plan in a single call.
+
+    Use it at the start of the testing instead of calling get_msf_module_options for every module: pass the whole plan
+    as a string or a list of module names, every 'auxiliary/...' and 'exploit/...' path is found in it.
+
+    Args:
+        modules (Union[List[str], str]): Module names (e.g. ['auxiliary/scanner/http/http_version']) or a plan text
+            that mentions them.
+        db_url (str, optional): The database connection URL. Defaults to 'sqlite:///metasploit_data.db'.
+
+    Returns:
+        str: One line per module in the format 'module: OPTION_1, OPTION_2', or a message that no modules were found.
+    """
+    text = modules if isinstance(modules, str) else '\n'.join(str(module) for module in modules)
+    # Keep the order of the plan and drop duplicates
+    module_names = list(dict.fromkeys(path.rstrip('/') for path in MODULE_PATH_PATTERN.findall(text)))
+    if not module_names:
+        return 'No module paths (auxiliary/... or exploit/...) were found in the input.'
+
+    try:
+        # The options are read from the in-memory catalog, like the other module lookup tools
+        catalog = get_module_catalog(db_url)
+        lines = []
+        for module_name in module_names:
+            options = [option for option in catalog.get_options(module_name) if option]
+            lines.append(f'{module_name}: {", ".join(options) or "no options found"}')
+        return 'Configuration options for the modules:\n' + '\n'.join(lines)
+    except Exception as e:
+        print(f"Failed to retrieve options for modules {module_names}: {e}")
+        return ''
+
+
+@tool
+def search_msf_modules(query: str, group: Optional[str] = None, limit: int = CATALOG_SEARCH_LIMIT) -> str:
+    """
+    Finds Metasploit modules by keywords or by the beginning of a module path in a single call.
+
+    Use it instead of browsing sub-groups one by one: keywords (e.g. 'smb version', 'apache struts rce') are matched
+    against module paths and descriptions and the most relevant modules come first; a query containing '/'
+    (e.g. 'auxiliary/scanner/smb/') returns the modules whose path starts with it.
+
+    Args:
+        query (str): Keywords or the beginning of a module path.
+        group (str, optional): Return only the modules of this group: 'auxiliary' or 'exploit'.
+        limit (int, optional): The maximum number of modules to return. Defaults to 20.
+
+    Returns:
+        str: One module per line in the format 'path - description', or a message that nothing was found.
+    """
+    try:
+        catalog = get_module_catalog()
+        if '/' in query:
+            records = [catalog.get(name) for name in catalog.find_by_prefix(query.strip().lstrip('/'), limit, group)]
+        else:
+            records = catalog.search(query, limit=limit, group=group)
+        if not records:
+            return f'No modules were found for "{query}".'
+        return '\n'.join(f'{record.name} - {record.description or ""}' for record in records)
+    except Exception as e:
+        print(f"Failed to search modules for '{query}': {e}")
+        return ''
+
+
 @tool
 def msf_console_scan_tool_dynamic(input_dict: Any) -> str:
     """
@@ -296,54 +353,17 @@ def msf_console_scan_tool_dynamic(input_dict: Any) -> str:
     """
 
     try:
-        # Process and standardize the input arguments
-        args = _extract_string_parameters(input_dict)
-
-        # Check if required arguments are present
-        if 'module_category' not in args or 'module_name' not in args:
-            raise ValueError("Both 'module_category' and 'module_name' are required.")
-
-        # Extract and remove module_category and module_name from args
-        module_category = args.pop('module_category')
-        module_name = args.pop('module_name')
-
-        # Get a host for inserting in the DB
-        host: Optional[str] = None
-        for host_name in HOST_NAMES_LIST:
-            if host_name in args.keys():
-                host = args.get(host_name)
-                break
-        if not host:
-            logger.warning("Host is absent; other args will be added to the DB instead of the host.")
-            host = '; '.join([f'{key}: {value}' for key, value in args.items()])
-
-        # If mock mode is enabled, return mock execution results
-        if MOCK_MSF_TOOLS and host:
-            result = _mock_execution(module_category, module_name, host)
-            if result and isinstance(result, str):
-                return result
-
-        # Execute the actual Metasploit module
-        output = _execute_metasploit_module(module_category, module_name, args)
-
-        # Split the output at the documentation line and take the part after it
-        split_output = re.split(r'Metasploit Documentation: https://docs.metasploit.com/\n', output, maxsplit=1)
-        filtered_output = split_output[1] if len(split_output) > 1 else ""
-
-        # Compressing output data
-        compressor = DataCompressor()
-        compressor.start_compressing(filtered_output)
-        compressed_output = compressor.get_compressed_output()
+        module, module_category, module_name, host, args = _parse_scan_input(input_dict)
 
-        # Save the results in the SQLite DB
-        _save_results_db(
-            module=f'{module_category}/{module_name}',
-            host=host,
-            output=filtered_output,
-            compressed_output=compressed_output
-        )
+        # Return a mocked or a cached result of the same run if there is one
+        result = _lookup_scan_result(module, host, args)
+        if result is not None:
+            return result
 
-        return compressed_output
+        # Execute the actual Metasploit module, the output is compressed while it is being read
+        compressor = StreamingDataCompressor(skip_until=CONSOLE_BANNER_LINE)
+        output = _execute_metasploit_module(module_category, module_name, args, on_chunk=compressor.feed)
+        return _finish_scan(module, host, args, output, compressor)
 
     except ValueError as e:
         return f"ValueError: {str(e)}"
@@ -352,6 +372,151 @@ def msf_console_scan_tool_dynamic(input_dict: Any) -> str:
         raise
 
 
+async def _amsf_console_scan_tool_dynamic(input_dict: Any) -> str:
+    """
+    Async variant of msf_console_scan_tool_dynamic, awaited when the tool is called with ainvoke.
+
+    The module runs on a console of the AsyncMsfRpcClient of the running event loop, so polling the console does not
+    occupy a thread; the SQLite lookups and writes are done in worker threads.
+
+    Args:
+        input_dict: Dictionary containing the module configuration and parameters.
+
+    Returns:
+        str: The output from the console after executing the module, or an error message if execution fails.
+    """
+    try:
+        module, module_category, module_name, host, args = _parse_scan_input(input_dict)
+
+        result = await asyncio.to_thread(_lookup_scan_result, module, host, args)
+        if result is not None:
+            return result
+
+        compressor = StreamingDataCompressor(skip_until=CONSOLE_BANNER_LINE)
+        output = await _aexecute_metasploit_module(module_category, module_name, args, on_chunk=compressor.feed)
+        return await asyncio.to_thread(_finish_scan, module, host, args, output, compressor)
+
+    except ValueError as e:
+        return f"ValueError: {str(e)}"
+    except Exception as e:
+        logger.error("An unexpected error occurred during Metasploit module execution.", exc_info=True)
+        raise
+
+
+# LangGraph awaits the coroutine of a tool in ainvoke/astream instead of running the function in a worker thread
+msf_console_scan_tool_dynamic.coroutine = _amsf_console_scan_tool_dynamic
+
+
+@tool
+def get_stored_scan_result(input_dict: Any) -> str:
+    """
+    Read the stored output of an earlier msf_console_scan_tool_dynamic call without running the module again.
+
+    Use it when an earlier output was compacted: pass the same input as the call that produced it. The best result of
+    the module, host and options is read from the console_results table of the SQLite DB.
+
+    Args:
+        input_dict: The input of the earlier msf_console_scan_tool_dynamic call, with 'module_category',
+                    'module_name' and the module options.
+
+    Returns:
+        str: The output of the earlier call, or a message that no result is stored.
+    """
+    try:
+        module, _, _, host, args = _parse_scan_input(input_dict)
+        db_connection = create_connection()
+        try:
+            record = check_existing_record(db_connection, module, host, args)
+        finally:
+            db_connection.close()
+        if not record:
+            return f'No result of {module} ({host}) with these options is stored.'
+        output, compressed_output = record
+        return compressed_output or output
+    except ValueError as e:
+        return f"ValueError: {str(e)}"
+
+
+def _parse_scan_input(input_dict: Any) -> Tuple[str, str, str, str, Dict[str, Any]]:
+    """
+    Extract the module and its options from the input of msf_console_scan_tool_dynamic.
+
+    Args:
+        input_dict: Dictionary containing the module configuration and parameters.
+
+    Returns:
+        tuple: The full module path, its category, its name, the host stored in the DB and the module options.
+
+    Raises:
+        ValueError: If required arguments ('module_category' or 'module_name') are missing.
+    """
+    # Process and standardize the input arguments
+    args = _extract_string_parameters(input_dict)
+
+    # Check if required arguments are present
+    if 'module_category' not in args or 'module_name' not in args:
+        raise ValueError("Both 'module_category' and 'module_name' are required.")
+
+    # Extract and remove module_category and module_name from args
+    module = normalize_module_name(str(args.pop('module_category')), str(args.pop('module_name')))
+    module_category, module_name = module.split('/', 1)
+
+    # Get a host for inserting in the DB
+    host: Optional[str] = None
+    for host_name in HOST_NAMES_LIST:
+        if host_name in args.keys():
+            host = args.get(host_name)
+            break
+    if not host:
+        logger.warning("Host is absent; other args will be added to the DB instead of the host.")
+        host = '; '.join([f'{key}: {value}' for key, value in args.items()])
+    return module, module_category, module_name, host, args
+
+
+def _lookup_scan_result(module: str, host: str, args: Dict[str, Any]) -> Optional[str]:
+    """
+    Return the mocked result in mock mode, or the result of the same run (module, host and all the options) if it is
+    still fresh, or None if the module has to be executed.
+    """
+    # If mock mode is enabled, return mock execution results
+    if MOCK_MSF_TOOLS and host:
+        module_category, module_name = module.split('/', 1)
+        result = _mock_execution(module_category, module_name, host)
+        if result and isinstance(result, str):
+            return result
+
+    if MSF_RESULT_CACHE_ENABLED:
+        cached_result = get_scan_result_cache().get(module, host, args)
+        if cached_result is not None:
+            logger.info(f'The cached result was returned for {module} ({host}).')
+            return cached_result
+    return None
+
+
+def _finish_scan(module: str, host: str, args: Dict[str, Any], output: str,
+                 compressor: StreamingDataCompressor) -> str:
+    """
+    Finish the compression of the output of a module run, save it in the DB and the result cache and return the
+    compressed output. The compressor has already skipped the console banner, the raw output is stripped of it here.
+    """
+    # Drop the console banner if the output still contains it
+    filtered_output = _strip_console_banner(output)
+    compressed_output = compressor.finish()
+
+    # Save the results in the SQLite DB
+    _save_results_db(
+        module=module,
+        host=host,
+        output=filtered_output,
+        compressed_output=compressed_output,
+        args=args
+    )
+    if MSF_RESULT_CACHE_ENABLED:
+        get_scan_result_cache().put(module, host, args, compressed_output, output=filtered_output)
+
+    return compressed_output
+
+
 def _extract_string_parameters(data: Dict[str, Any]) -> Dict[str, str]:
     """
     Recursively extracts all key-value pairs from the input dictionary
@@ -378,13 +543,18 @@ def _extract_string_parameters(data: Dict[str, Any]) -> Dict[str, str]:
 
 
 
-def _save_results_db(host: str, module: str, output: str, compressed_output: str) -> None:
+def _save_results_db(host: str, module: str, output: str, compressed_output: str,
+                     args: Optional[Dict[str, Any]] = None) -> None:
+    # The row of the daily table and the one of the indexed results store are written by the shared writer thread,
+    # in the transaction of the other concurrent tool calls
     manager_db = ManagerAlchemyDB(db_url='sqlite:///my_sqlite.db')
     manager_db.write_to_db(
         host=host,
         module=module,
         output=output,
-        compressed_output=compressed_output
+        compressed_output=compressed_output,
+        store_result=True,
+        args=args
     )
 
 
@@ -397,46 +567,134 @@ def _mock_execution(module_category: str, module_name: str, host: str) -> str:
         print("Mock execution: No existing record found.")
 
 
-def _execute_metasploit_module(module_category: str, module_name: str, args: Dict[str, Any]) -> str:
-    client: MsfRpcClient = CustomMsfRpcClient().get_client()
-    current_console = client.consoles.console()
+def _execute_metasploit_module(module_category: str, module_name: str, args: Dict[str, Any],
+                               on_chunk: Optional[Callable[[str], None]] = None) -> str:
+    console_pool = CustomMsfRpcClient().get_console_pool()
+    current_console = console_pool.acquire()
 
+    reusable = False
     try:
-        commands = [f'use {module_category}/{module_name}']
-        commands.extend(_build_module_commands(args))
+        current_console.write(_build_run_command(module_category, module_name, args))
 
-        if module_category is 'exploit':
-            commands.append('exploit')
-        else:
-            commands.append('run')
+        output = _read_console_output(current_console, TIMEOUT, on_chunk=on_chunk)
+        reusable = not output.endswith(TIMEOUT_MESSAGE)
+        return output
 
-        command_str = '\n'.join(commands) + '\n'
-        current_console.write(command_str)
+    finally:
+        console_pool.release(current_console, reusable=reusable)
+
+
+async def _aexecute_metasploit_module(module_category: str, module_name: str, args: Dict[str, Any],
+                                      on_chunk: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Async variant of _execute_metasploit_module, the console is leased from the pool of the AsyncMsfRpcClient of the
+    running event loop.
+    """
+    console_pool = get_async_msf_client().get_console_pool()
+    current_console = await console_pool.acquire()
+
+    reusable = False
+    try:
+        await current_console.write(_build_run_command(module_category, module_name, args))
 
-        return _read_console_output(current_console, TIMEOUT)
+        output = await _aread_console_output(current_console, TIMEOUT, on_chunk=on_chunk)
+        reusable = not output.endswith(TIMEOUT_MESSAGE)
+        return output
 
     finally:
-        current_console.destroy()
+        await console_pool.release(current_console, reusable=reusable)
+
+
+def _strip_console_banner(output: str) -> str:
+    """
+    Return the part of the console output after the msfconsole banner.
+
+    A freshly created console prints the banner before the module output, while a console leased from the pool has
+    already been drained. If the banner is absent, the whole output belongs to the module run.
+
+    Args:
+        output (str): The raw console output.
+
+    Returns:
+        str: The output without the banner.
+    """
+    split_output = CONSOLE_BANNER_PATTERN.split(output, maxsplit=1)
+    return split_output[1] if len(split_output) > 1 else output
 
 
 def _build_module_commands(args: Dict[str, Any]) -> list:
     return [f"set {key} {value}" for key, value in args.items()]
 
 
-def _read_console_output(console, timeout: int = 300) -> str:
-    start_time = time.time()
-    output = ""
+def _build_run_command(module_category: str, module_name: str, args: Dict[str, Any]) -> str:
+    commands = [f'use {module_category}/{module_name}']
+    commands.extend(_build_module_commands(args))
+    commands.append('exploit' if module_category == 'exploit' else 'run')
+    return '\n'.join(commands) + '\n'
+
+
+def _read_console_output(console, timeout: int = 300, on_chunk: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Read the console output until a completion phrase appears or the timeout expires.
+
+    Polling is adaptive: the console is read again almost immediately while data is flowing, and the interval grows
+    exponentially (up to CONSOLE_POLL_MAX_INTERVAL) while the console is idle.
+
+    Args:
+        console: The Metasploit console to read from.
+        timeout (int): The maximum number of seconds to wait for the module to complete.
+        on_chunk (Optional[Callable[[str], None]]): Called with every chunk as soon as it is read, e.g. to compress
+            the output while the module is still running.
+
+    Returns:
+        str: The collected console output.
+    """
+    reader = ConsoleOutputReader(timeout, on_chunk=on_chunk)
     while True:
         response = console.read()
-        output += response['data']
-
-        if any(phrase in output for phrase in EXECUTION_COMPLETION_PHRASES):
+        if reader.feed(response['data']):
             break
 
-        if time.time() - start_time > timeout:
-            output += '[TIMEOUT] "Time limit exceeded, exiting the loop."'
+        if reader.timed_out():
+            reader.mark_timeout()
+            logger.warning(f'Console output reading exceeded the time limit of {timeout} seconds.')
             console.write('exit\n')
             break
 
-        time.sleep(1)
-    return output
+        time.sleep(reader.next_interval())
+    return reader.get_output()
+
+
+async def _aread_console_output(console: AsyncMsfConsole, timeout: int = 300,
+                                on_chunk: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Async variant of _read_console_output with the same completion and adaptive polling policy.
+
+    Args:
+        console (AsyncMsfConsole): The Metasploit console to read from.
+        timeout (int): The maximum number of seconds to wait for the module to complete.
+        on_chunk (Optional[Callable[[str], None]]): Called with every chunk as soon as it is read. It runs in a worker
+            thread, so compressing a block does not block the other consoles of the event loop.
+
+    Returns:
+        str: The collected console output.
+    """
+    reader = ConsoleOutputReader(timeout)
+    while True:
+        response = await console.read()
+        completed = reader.feed(response['data'])
+        if on_chunk and response['data']:
+            await asyncio.to_thread(on_chunk, response['data'])
+        if completed:
+            break
+
+        if reader.timed_out():
+            reader.mark_timeout()
+            if on_chunk:
+                await asyncio.to_thread(on_chunk, TIMEOUT_MESSAGE)
+            logger.warning(f'Console output reading exceeded the time limit of {timeout} seconds.')
+            await console.write('exit\n')
+            break
+
+        await asyncio.sleep(reader.next_interval())
+    return reader.get_output()
@@ -1,32 +1,46 @@
 import logging
+import threading
+import time
 
 from datetime import datetime
-from sqlalchemy import create_engine, inspect, Engine, select, and_
+from sqlalchemy import Engine, select, and_, delete, insert, inspect, update
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import sessionmaker, DeclarativeMeta
-from typing import Type, List, Optional
+from sqlalchemy.orm import sessionmaker, DeclarativeMeta, Session
+from typing import Type, List, Optional, Dict, Iterable, Union, Any, Set
 
-from utils.dao.sqlalchemy.models import ModuleAuxiliary, ModuleOptionsAuxiliary, DynamicConsoleResult, Base
+from constants import MODULE_OPTIONS_BATCH_SIZE, RESULT_WRITER_TIMEOUT
+from utils.dao.sqlalchemy.db_manager.engine_registry import get_engine, get_session_factory
+from utils.dao.sqlalchemy.db_manager.result_writer import get_result_writer
+from utils.dao.sqlalchemy.models import ModuleAuxiliary, ModuleOptionsAuxiliary, ModuleOption, ModuleImportState
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logging.getLogger('sqlalchemy.engine').setLevel(logging.ERROR)
 
+# Databases whose ModuleOption table has been created and migrated
+_module_options_ready: Set[str] = set()
+_module_options_lock = threading.Lock()
+
 
 class ManagerAlchemyDB:
     """
     Database manager class for handling SQLAlchemy operations.
     """
 
-    def __init__(self, db_url: str):
+    def __init__(self, db_url: str, echo: bool = False):
         """
         Initialize the ManagerDB with a database URL.
 
+        The engine and the session factory are shared by all the managers of the same database, so creating
+        a manager is cheap.
+
         :param db_url: SQLAlchemy database URL
+        :param echo: Log all the SQL statements
         """
-        self._engine: Engine = create_engine(db_url, echo=True, future=True)
-        self._Session = sessionmaker(self._engine)
+        self._db_url = db_url
+        self._engine: Engine = get_engine(db_url, echo)
+        self._Session: sessionmaker = get_session_factory(db_url, echo)
 
     def create_tables_by_models(self, base: Type[DeclarativeMeta]) -> None:
         """
@@ -81,60 +95,117 @@ class ManagerAlchemyDB:
             logger.error(f"Error fetching modules for group '{group_name}' and sub_group '{sub_group_name}': {e}")
             return []
 
-    def get_module_options(self, module_name: str) -> List[Optional[str]]:
+    def get_module_options(self, module_name: str) -> List[str]:
         """
-        Retrieve all non-null parameter fields for a given module.
+        Retrieve all the option names of a given module in their original order.
 
         :param module_name: The name of the module to retrieve options for
-        :return: List of non-null parameter values
+        :return: List of option names
+        """
+        return self.get_module_options_batch([module_name]).get(module_name, [])
+
+    def get_module_options_batch(self, module_names: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Retrieve the option names of many modules with one query per MODULE_OPTIONS_BATCH_SIZE modules.
+
+        :param module_names: The names of the modules to retrieve options for
+        :return: Dictionary of module names and their option names, unknown modules have an empty list
+        """
+        module_names = list(dict.fromkeys(module_names))
+        options: Dict[str, List[str]] = {module_name: [] for module_name in module_names}
+        if not module_names:
+            return options
+
+        try:
+            self._ensure_module_options()
+            with self._Session() as session:
+                for start in range(0, len(module_names), MODULE_OPTIONS_BATCH_SIZE):
+                    chunk = module_names[start:start + MODULE_OPTIONS_BATCH_SIZE]
+                    result = session.execute(
+                        select(ModuleAuxiliary.name, ModuleOption.option_name).
+                        join(ModuleOption, ModuleOption.module_id == ModuleAuxiliary.id).
+                        where(ModuleAuxiliary.name.in_(chunk)).
+                        order_by(ModuleOption.module_id, ModuleOption.position)
+                    ).all()
+                    for module_name, option_name in result:
+                        options[module_name].append(option_name)
+            return options
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching options for modules {module_names}: {e}")
+            return options
+
+    def get_all_modules(self) -> List[tuple]:
+        """
+        Retrieve all the modules from the ModuleAuxiliary table in their insertion order.
+
+        :return: List of tuples (name, group, sub_group, rank, disclosure_date, description)
         """
         try:
-            fields = [getattr(ModuleOptionsAuxiliary, f"parameter_{i}") for i in range(1, 20)]
             with self._Session() as session:
                 result = session.execute(
-                    select(*fields).where(ModuleOptionsAuxiliary.module_name == module_name)
-                ).first()
-                return [value for value in result if value is not None] if result else []
+                    select(ModuleAuxiliary.name, ModuleAuxiliary.group, ModuleAuxiliary.sub_group,
+                           ModuleAuxiliary.rank, ModuleAuxiliary.disclosure_date, ModuleAuxiliary.description).
+                    order_by(ModuleAuxiliary.id)
+                ).all()
+                return [tuple(row) for row in result]
         except SQLAlchemyError as e:
-            logger.error(f"Error fetching options for module '{module_name}': {e}")
+            logger.error(f"Error fetching modules: {e}")
             return []
 
-    def write_to_db(self, host: str, module: str, output: str, compressed_output: str) -> None:
+    def get_all_module_options(self) -> Dict[str, List[str]]:
+        """
+        Retrieve the option names of all the modules.
+
+        :return: Dictionary of module names and their option names in the original order
+        """
+        try:
+            self._ensure_module_options()
+            with self._Session() as session:
+                result = session.execute(
+                    select(ModuleAuxiliary.name, ModuleOption.option_name).
+                    join(ModuleOption, ModuleOption.module_id == ModuleAuxiliary.id).
+                    order_by(ModuleOption.module_id, ModuleOption.position)
+                ).all()
+            options: Dict[str, List[str]] = {}
+            for module_name, option_name in result:
+                options.setdefault(module_name, []).append(option_name)
+            return options
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching module options: {e}")
+            return {}
+
+    def write_to_db(self, host: str, module: str, output: str, compressed_output: str,
+                    store_result: bool = False, args: Optional[Dict[str, Any]] = None) -> None:
         """
         Write console output to a dynamically named table.
 
+        The row goes through the shared ConsoleResultWriter, so concurrent writes are committed in one transaction.
+        The call waits at most RESULT_WRITER_TIMEOUT seconds for the commit.
+
         :param host: The host information
         :param module: The module name
         :param output: The console output to be stored
         :param compressed_output: Compressed console output
+        :param store_result: Also insert the result into the console results store in the same transaction
+        :param args: The module options of the run, the key of the result in the results store
         """
+        # Generate the dynamic table name
+        table_name = get_table_name()
         try:
-            with self._Session() as session:
-                # Generate the dynamic table name
-                table_name = get_table_name()
-
-                # Dynamically create the model class with the table name
-                class ScanResult(DynamicConsoleResult):
-                    __tablename__ = table_name
-                    __table_args__ = {'extend_existing': True}
-
-                # Check if the table exists, and create it if it doesn't
-                inspector = inspect(self._engine)
-                if not inspector.has_table(ScanResult.__tablename__):
-                    Base.metadata.create_all(self._engine, tables=[ScanResult.__table__])
-
-                # Create a new record
-                new_result = ScanResult(
-                    host=host,
-                    module=module,
-                    output=output,
-                    compressed_output=compressed_output
-                )
-
-                session.add(new_result)
-                session.commit()
-                logger.info(f"Data successfully written to {ScanResult.__tablename__}")
-        except SQLAlchemyError as e:
+            future = get_result_writer(self._db_url).submit(
+                table_name,
+                host=host,
+                module=module,
+                output=output,
+                compressed_output=compressed_output,
+                store_result=store_result,
+                args=args
+            )
+            future.result(timeout=RESULT_WRITER_TIMEOUT)
+            logger.info(f"Data successfully written to {table_name}")
+        except TimeoutError:
+            logger.error(f"The console result was not written to {table_name} within {RESULT_WRITER_TIMEOUT} s")
+        except Exception as e:
             logger.error(f"Error writing to database: {e}")
 
     def insert_module_auxiliary_data(self, data: List[dict]) -> None:
@@ -185,32 +256,189 @@ class ManagerAlchemyDB:
             logger.error(f"Error fetching modules for group '{group_name}': {e}")
             return []
 
-    def insert_module_options(self, module_name: str, options: List[str]) -> None:
+    def insert_module_options(self, module_name: str, options: List[Union[str, Dict[str, Any]]]) -> None:
         """
-        Insert module options into the ModuleOptionsAuxiliary table.
+        Replace the options of a module in the ModuleOption table.
 
-        :param module_name: The name of the module
-        :param options: List of module parameters
+        :param module_name: The name of the module, it must exist in the ModuleAuxiliary table
+        :param options: List of option names, or dictionaries with 'option_name' and optionally 'required',
+                        'default' and 'description'
         """
         try:
-            # Fill in the parameter fields in order, leaving None for empty fields
-            option_fields = {f"parameter_{i + 1}": options[i] if i < len(options) else None for i in range(19)}
-
+            self._ensure_module_options()
             with self._Session() as session:
-                # Create a record for the module
-                module_options = ModuleOptionsAuxiliary(
-                    module_name=module_name,
-                    **option_fields  # Передача всех параметров
+                module_id = session.execute(
+                    select(ModuleAuxiliary.id).where(ModuleAuxiliary.name == module_name)
+                ).scalars().first()
+                if module_id is None:
+                    logger.error(f"Error inserting module options: module '{module_name}' was not found.")
+                    return
+
+                session.execute(delete(ModuleOption).where(ModuleOption.module_id == module_id))
+                session.add_all(
+                    ModuleOption(module_id=module_id, position=position, **_to_option_fields(option))
+                    for position, option in enumerate(options)
                 )
-
-                # Add a record to the session
-                session.add(module_options)
-                # Save changes
                 session.commit()
                 logger.info(f"Module options for '{module_name}' successfully inserted.")
         except SQLAlchemyError as e:
             logger.error(f"Error inserting module options for '{module_name}': {e}")
 
+    def get_module_import_hashes(self) -> Dict[str, str]:
+        """
+        Retrieve the metadata hashes of the imported modules.
+
+        :return: Dictionary of module names and their metadata hashes
+        """
+        try:
+            ModuleImportState.__table__.create(self._engine, checkfirst=True)
+            with self._Session() as session:
+                result = session.execute(select(ModuleImportState.module_name, ModuleImportState.metadata_hash)).all()
+                return {module_name: metadata_hash for module_name, metadata_hash in result}
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching module import hashes: {e}")
+            return {}
+
+    def upsert_modules(self, modules: List[dict], options: Dict[str, List[Union[str, Dict[str, Any]]]],
+                       metadata_hashes: Dict[str, str]) -> None:
+        """
+        Insert or update modules, replace their options and record their metadata hashes in one transaction.
+
+        :param modules: Dictionaries with the ModuleAuxiliary fields, 'name' identifies the module
+        :param options: Dictionary of module names and their options, in the format of insert_module_options
+        :param metadata_hashes: Dictionary of module names and their metadata hashes
+        """
+        if not modules:
+            return
+
+        fields = ('group', 'sub_group', 'name', 'disclosure_date', 'rank', 'status_check', 'description')
+        names = [module['name'] for module in modules]
+        try:
+            self._ensure_module_options()
+            ModuleImportState.__table__.create(self._engine, checkfirst=True)
+            with self._Session() as session:
+                existing_ids = self._get_module_ids(session, names)
+                new_rows = [{field: module.get(field) for field in fields}
+                            for module in modules if module['name'] not in existing_ids]
+                updated_rows = [{'id': existing_ids[module['name']], **{field: module.get(field) for field in fields}}
+                                for module in modules if module['name'] in existing_ids]
+                if new_rows:
+                    session.execute(insert(ModuleAuxiliary), new_rows)
+                if updated_rows:
+                    session.execute(update(ModuleAuxiliary), updated_rows)
+                module_ids = self._get_module_ids(session, names)
+
+                session.execute(delete(ModuleOption).where(ModuleOption.module_id.in_(module_ids.values())))
+                option_rows = [
+                    {'module_id': module_ids[name], 'position': position, **_to_option_fields(option)}
+                    for name in names
+                    for position, option in enumerate(options.get(name, []))
+                ]
+                if option_rows:
+                    session.execute(insert(ModuleOption), option_rows)
+
+                session.execute(delete(ModuleImportState).where(ModuleImportState.module_name.in_(names)))
+                updated_at = time.time()
+                session.execute(insert(ModuleImportState), [
+                    {'module_name': name, 'metadata_hash': metadata_hashes[name], 'updated_at': updated_at}
+                    for name in names if name in metadata_hashes
+                ])
+                session.commit()
+                logger.info(f"{len(modules)} modules ({len(new_rows)} new) and {len(option_rows)} options were saved")
+        except SQLAlchemyError as e:
+            logger.error(f"Error saving {len(modules)} modules: {e}")
+
+    def delete_modules(self, names: List[str]) -> int:
+        """
+        Delete modules with their options and metadata hashes, e.g. the modules that msfrpcd no longer lists.
+
+        :param names: The names of the modules to delete
+        :return: The number of deleted modules
+        """
+        if not names:
+            return 0
+
+        try:
+            self._ensure_module_options()
+            ModuleImportState.__table__.create(self._engine, checkfirst=True)
+            has_legacy_options = inspect(self._engine).has_table(ModuleOptionsAuxiliary.__tablename__)
+            with self._Session() as session:
+                for start in range(0, len(names), MODULE_OPTIONS_BATCH_SIZE):
+                    chunk = names[start:start + MODULE_OPTIONS_BATCH_SIZE]
+                    session.execute(delete(ModuleOption).where(ModuleOption.module_id.in_(
+                        select(ModuleAuxiliary.id).where(ModuleAuxiliary.name.in_(chunk))
+                    )))
+                    session.execute(delete(ModuleAuxiliary).where(ModuleAuxiliary.name.in_(chunk)))
+                    session.execute(delete(ModuleImportState).where(ModuleImportState.module_name.in_(chunk)))
+                    if has_legacy_options:
+                        session.execute(
+                            delete(ModuleOptionsAuxiliary).where(ModuleOptionsAuxiliary.module_name.in_(chunk))
+                        )
+                session.commit()
+                logger.info(f"{len(names)} modules were deleted")
+                return len(names)
+        except SQLAlchemyError as e:
+            logger.error(f"Error deleting {len(names)} modules: {e}")
+            return 0
+
+    @staticmethod
+    def _get_module_ids(session: Session, names: List[str]) -> Dict[str, int]:
+        module_ids: Dict[str, int] = {}
+        for start in range(0, len(names), MODULE_OPTIONS_BATCH_SIZE):
+            result = session.execute(
+                select(ModuleAuxiliary.name, ModuleAuxiliary.id).
+                where(ModuleAuxiliary.name.in_(names[start:start + MODULE_OPTIONS_BATCH_SIZE])).
+                order_by(ModuleAuxiliary.id)
+            ).all()
+            for name, module_id in result:
+                module_ids.setdefault(name, module_id)
+        return module_ids
+
+    def _ensure_module_options(self) -> None:
+        """
+        Create the ModuleOption table and fill it from the legacy ModuleOptionsAuxiliary table on the first use.
+        """
+        if self._db_url in _module_options_ready:
+            return
+
+        with _module_options_lock:
+            if self._db_url in _module_options_ready:
+                return
+
+            ModuleOption.__table__.create(self._engine, checkfirst=True)
+            with self._Session() as session:
+                is_empty = session.execute(select(ModuleOption.id).limit(1)).first() is None
+                if is_empty and inspect(self._engine).has_table(ModuleOptionsAuxiliary.__tablename__):
+                    fields = [getattr(ModuleOptionsAuxiliary, f"parameter_{i}") for i in range(1, 20)]
+                    result = session.execute(
+                        select(ModuleAuxiliary.id, *fields).
+                        join(ModuleOptionsAuxiliary, ModuleOptionsAuxiliary.module_name == ModuleAuxiliary.name).
+                        order_by(ModuleAuxiliary.id)
+                    ).all()
+                    rows = [
+                        {'module_id': module_id, 'position': position, 'option_name': option_name, 'required': True}
+                        for module_id, *values in result
+                        for position, option_name in enumerate(value for value in values if value is not None)
+                    ]
+                    if rows:
+                        session.execute(insert(ModuleOption), rows)
+                    session.commit()
+                    logger.info(f"{len(rows)} module options were migrated to '{ModuleOption.__tablename__}'")
+
+            _module_options_ready.add(self._db_url)
+
+
+def _to_option_fields(option: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert an option name or an option dictionary into ModuleOption fields."""
+    if isinstance(option, str):
+        return {'option_name': option, 'required': True}
+    return {
+        'option_name': option['option_name'],
+        'required': option.get('required', True),
+        'default': option.get('default'),
+        'description': option.get('description')
+    }
+
 
 def get_table_name() -> str:
     """Generate a table name based on the current date."""
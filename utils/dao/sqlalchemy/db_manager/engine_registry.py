@@ -0,0 +1,84 @@
+import logging
+import threading
+from typing import Dict, Tuple
+
+from sqlalchemy import create_engine, event, Engine
+from sqlalchemy.orm import sessionmaker
+
+from constants import SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS
+
+logger = logging.getLogger(__name__)
+
+# Engines and session factories shared by the whole process, keyed by (db_url, echo)
+_engines: Dict[Tuple[str, bool], Engine] = {}
+_session_factories: Dict[Tuple[str, bool], sessionmaker] = {}
+_lock = threading.Lock()
+
+
+def get_engine(db_url: str, echo: bool = False) -> Engine:
+    """
+    Return the process-wide engine for the database URL, creating it on the first call.
+
+    The engine keeps its connection pool between calls, so the tools do not pay for creating an engine and opening
+    a new connection every time. SQLite connections are switched to WAL mode, so reads are not blocked by writes.
+
+    :param db_url: SQLAlchemy database URL
+    :param echo: Log all the SQL statements (off by default)
+    :return: The shared engine
+    """
+    key = (db_url, echo)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(db_url, echo=echo, future=True)
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _set_sqlite_pragmas)
+            _engines[key] = engine
+            logger.info(f'The engine was created for {db_url}')
+        return engine
+
+
+def get_session_factory(db_url: str, echo: bool = False) -> sessionmaker:
+    """
+    Return the process-wide session factory bound to the shared engine of the database URL.
+
+    :param db_url: SQLAlchemy database URL
+    :param echo: Log all the SQL statements (off by default)
+    :return: The shared session factory
+    """
+    key = (db_url, echo)
+    session_factory = _session_factories.get(key)
+    if session_factory is not None:
+        return session_factory
+
+    engine = get_engine(db_url, echo)
+    with _lock:
+        session_factory = _session_factories.get(key)
+        if session_factory is None:
+            session_factory = sessionmaker(engine)
+            _session_factories[key] = session_factory
+        return session_factory
+
+
+def dispose_engines() -> None:
+    """
+    Close the connection pools of all the engines and clear the registry.
+    """
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _session_factories.clear()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')
+        cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+    finally:
+        cursor.close()
@@ -0,0 +1,235 @@
+import atexit
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Type
+
+from constants import RESULT_WRITER_MAX_BATCH
+from dao.sqlite.msf_sqlite import RESULTS_TABLE, create_results_store, insert_result
+from utils.dao.sqlalchemy.db_manager.engine_registry import get_engine, get_session_factory
+from utils.dao.sqlalchemy.models import DynamicConsoleResult
+
+logger = logging.getLogger(__name__)
+
+# Mapped classes of the daily console result tables, created once per table name
+_result_models: Dict[str, Type[DynamicConsoleResult]] = {}
+_result_models_lock = threading.Lock()
+
+# Writers shared by the whole process, keyed by db_url
+_writers: Dict[str, 'ConsoleResultWriter'] = {}
+_writers_lock = threading.Lock()
+
+
+
+class WriteRequest(NamedTuple):
+    table_name: str
+    values: Dict[str, str]  # column values of the daily table row
+    future: Future
+    result_args: Optional[Dict[str, Any]]  # module options of the results store row, None if it is not stored
+
+
+def get_result_model(table_name: str) -> Type[DynamicConsoleResult]:
+    """
+    Return the mapped class of a console result table, creating it on the first call.
+
+    :param table_name: The name of the table, e.g. 'msf_console_2024_09_16'
+    :return: The mapped class
+    """
+    model = _result_models.get(table_name)
+    if model is not None:
+        return model
+
+    with _result_models_lock:
+        model = _result_models.get(table_name)
+        if model is None:
+            model = type(f'ScanResult_{table_name}', (DynamicConsoleResult,), {
+                '__tablename__': table_name,
+                '__table_args__': {'extend_existing': True}
+            })
+            _result_models[table_name] = model
+        return model
+
+
+class ConsoleResultWriter:
+    """
+    Writes console results from concurrent tool calls through a single background thread.
+
+    Every call puts a row into a queue and gets a Future. The thread takes all the rows that are waiting in the queue
+    (up to max_batch) and inserts them in one transaction, so the rows submitted while the previous transaction was
+    committed are written together, without any artificial delay. Tables are checked and created only once.
+
+    A row can also be stored in the console results store (see dao.sqlite.msf_sqlite.insert_result); it is inserted
+    on the connection of the same transaction, so a batch of concurrent tool calls is still a single commit.
+
+    If the transaction of a batch fails, its rows are written again one by one, so a bad row fails only its own
+    Future. Any error is passed to the Futures and the thread keeps running.
+    """
+
+    def __init__(self, db_url: str, max_batch: int = RESULT_WRITER_MAX_BATCH):
+        """
+        Initialize the writer.
+
+        :param db_url: SQLAlchemy database URL
+        :param max_batch: The maximum number of rows written in one transaction
+        """
+        self._db_url = db_url
+        self._engine = get_engine(db_url)
+        self._Session = get_session_factory(db_url)
+        self._max_batch = max_batch
+        self._queue: queue.Queue[Optional[WriteRequest]] = queue.Queue()
+        self._created_tables: Set[str] = set()
+        self._results_store_ready = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, table_name: str, host: str, module: str, output: str, compressed_output: str,
+               store_result: bool = False, args: Optional[Dict[str, Any]] = None) -> Future:
+        """
+        Queue a console result for writing.
+
+        :param table_name: The name of the table to write to
+        :param host: The host information
+        :param module: The module name
+        :param output: The console output to be stored
+        :param compressed_output: Compressed console output
+        :param store_result: Also insert the result into the console results store of the database
+        :param args: The module options of the run, the key of the result in the results store
+        :return: A Future that is resolved when the row is committed, or fails with the database error
+        """
+        future = Future()
+        values = {'host': host, 'module': module, 'output': output, 'compressed_output': compressed_output}
+        self._start()
+        self._queue.put(WriteRequest(table_name, values, future, (args or {}) if store_result else None))
+        return future
+
+    def close(self) -> None:
+        """
+        Write all the queued rows and stop the background thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='console-result-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stopped = False
+        while not stopped:
+            request = self._queue.get()
+            if request is None:
+                break
+            batch = [request]
+            # Take everything that has been queued in the meantime
+            while len(batch) < self._max_batch:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopped = True
+                    break
+                batch.append(request)
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                # e.g. a Future cancelled by its caller, the thread must keep serving the other calls
+                logger.error(f'Error resolving the console results written to {self._db_url}: {e!r}')
+
+    def _write_batch(self, batch: List[WriteRequest]) -> None:
+        try:
+            self._write(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f'Error writing a console result to {self._db_url}: {e}')
+                batch[0].future.set_exception(e)
+                return
+            logger.warning(f'Error writing {len(batch)} console results to {self._db_url}, '
+                           f'writing them one by one: {e}')
+            for request in batch:
+                self._write_batch([request])
+            return
+
+        logger.debug(f'{len(batch)} console results were written to {self._db_url}')
+        for request in batch:
+            request.future.set_result(None)
+
+    def _write(self, batch: List[WriteRequest]) -> None:
+        """
+        Insert the rows of the batch in one transaction.
+        """
+        for table_name in {request.table_name for request in batch}:
+            self._ensure_table(table_name)
+        stored = [request for request in batch if request.result_args is not None]
+        if stored:
+            self._ensure_results_store()
+
+        with self._Session() as session:
+            session.add_all(get_result_model(request.table_name)(**request.values) for request in batch)
+            session.flush()
+            if stored:
+                # The flush has opened the write transaction, the results store rows are inserted in it
+                db_connection = session.connection().connection.driver_connection
+                for request in stored:
+                    if not insert_result(db_connection, module=request.values['module'],
+                                         host=request.values['host'], output=request.values['output'],
+                                         compressed_output=request.values['compressed_output'],
+                                         args=request.result_args, commit=False):
+                        raise RuntimeError(f'The result of {request.values["module"]} could not be inserted into '
+                                           f'{RESULTS_TABLE}')
+            session.commit()
+
+    def _ensure_table(self, table_name: str) -> None:
+        if table_name in self._created_tables:
+            return
+        get_result_model(table_name).__table__.create(self._engine, checkfirst=True)
+        self._created_tables.add(table_name)
+
+    def _ensure_results_store(self) -> None:
+        if self._results_store_ready:
+            return
+        # Created outside the batch transaction, the creation commits and may import the daily tables
+        connection = self._engine.raw_connection()
+        try:
+            create_results_store(connection.driver_connection)
+        finally:
+            connection.close()
+        self._results_store_ready = True
+
+
+def get_result_writer(db_url: str) -> ConsoleResultWriter:
+    """
+    Return the process-wide console result writer for the database URL.
+
+    :param db_url: SQLAlchemy database URL
+    :return: The shared writer
+    """
+    writer = _writers.get(db_url)
+    if writer is not None:
+        return writer
+
+    with _writers_lock:
+        writer = _writers.get(db_url)
+        if writer is None:
+            writer = ConsoleResultWriter(db_url)
+            _writers[db_url] = writer
+        return writer
+
+
+@atexit.register
+def close_result_writers() -> None:
+    """
+    Flush and stop all the writers.
+    """
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
@@ -1,7 +1,9 @@
 from typing import List, Dict
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import Session
+
+from utils.dao.sqlalchemy.db_manager.alchemy_manager import ManagerAlchemyDB
+from utils.dao.sqlalchemy.db_manager.engine_registry import get_engine, get_session_factory
 
 from utils.dao.sqlalchemy.models import ModuleOptionsAuxiliary
 
@@ -26,14 +28,14 @@ class DatabaseSessionManager:
         :param base: The base class of SQLAlchemy models (e.g., Base)
         """
         if not self.engine:
-            # Set up the database connection
-            self.engine = create_engine(self.db_url, echo=self.echo)
+            # Set up the database connection, the engine is shared with the other managers of the same database
+            self.engine = get_engine(self.db_url, echo=self.echo)
 
             # Create all tables if they do not already exist
             base.metadata.create_all(self.engine)
 
             # Set up the session factory for database interaction
-            self.Session = sessionmaker(bind=self.engine)
+            self.Session = get_session_factory(self.db_url, echo=self.echo)
 
     def get_session(self):
         """
@@ -81,34 +83,15 @@ class DatabaseSessionManager:
                                        module_name: str,
                                        required_options: List[str]
                                        ):
-        session = self.get_session()
-        try:
-            # Create a dictionary to hold the module name and its parameters
-            parameters_dict = {'module_name': module_name}
-
-            # Fill in the parameters from the required_options list
-            for num in range(1, len(required_options) + 1):
-                parameters_dict[f'parameter_{num}'] = required_options[num - 1]
-
-            # Fill in the remaining parameters with None (if there are fewer than 19 required options)
-            for num in range(len(required_options) + 1, 20):
-                parameters_dict[f'parameter_{num}'] = None
-
-            # Create an instance of the ModuleOptions class with the populated parameters
-            instance = db_models(**parameters_dict)
-            session.add(instance)
-
-            # Commit all changes to the database
-            session.commit()
-            print(f"The Entities were added in: {self.db_url}")
-        except Exception as e:
-            # Rollback the transaction in case of an error
-            session.rollback()
-            print(f"Error while adding data: {e}")
-        finally:
-            # Close the session
-            session.close()
+        """
+        Replaces the required options of a module. They are written to the normalized ModuleOption table through
+        ManagerAlchemyDB, the fixed parameter_N columns of ModuleOptionsAuxiliary are no longer written.
 
+        :param db_models: The legacy options model, kept for the existing callers
+        :param module_name: The name of the module, it must exist in the ModuleAuxiliary table
+        :param required_options: The names of the required options
+        """
+        ManagerAlchemyDB(self.db_url, echo=self.echo).insert_module_options(module_name, required_options)
 
     def get_all_sub_group_module(self) -> List:
         session = self.get_session()
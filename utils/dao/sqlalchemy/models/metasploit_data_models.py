@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, String, Integer, LargeBinary
+from sqlalchemy import Column, String, Integer, LargeBinary, Boolean, ForeignKey, Float
 from sqlalchemy.orm import declarative_base, declared_attr
 
 # Create a base class for defining models
@@ -49,6 +49,28 @@ class ModuleOptionsAuxiliary(Base):
 
 
 
+class ModuleOption(Base):
+    """One option of a module, replaces the fixed parameter_N columns of ModuleOptionsAuxiliary."""
+    __tablename__ = 'module_options'
+
+    id = Column(Integer, primary_key=True)
+    module_id = Column(Integer, ForeignKey('modules.id'), nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)  # Order of the option in the module
+    option_name = Column(String, nullable=False)
+    required = Column(Boolean, default=True)
+    default = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+
+
+class ModuleImportState(Base):
+    """Metadata hash of every imported module, only the modules whose hash changed are fetched again."""
+    __tablename__ = 'module_import_state'
+
+    module_name = Column(String, primary_key=True)
+    metadata_hash = Column(String, nullable=False)
+    updated_at = Column(Float, nullable=False)  # Unix time of the last import
+
+
 class DynamicConsoleResult(Base):
     """Base class for dynamically named console result tables."""
     __abstract__ = True
@@ -0,0 +1,350 @@
+import bisect
+import datetime
+import functools
+import inspect
+import json
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage
+
+from constants import INSTRUMENTATION_ENABLED, MESSAGES_FIELD, METRICS_DIR, METRICS_PREFIX, NODE_LATENCY_BUCKETS, \
+    TOOL_DURATION_BUCKETS
+
+# Prefix of the node functions dropped from the node names
+NODE_FUNCTION_PREFIX = re.compile(r'^a?create_')
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets, in the form of a Prometheus histogram.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        """
+        :param buckets: Upper bounds of the buckets in ascending order, +Inf is added implicitly
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def cumulative_counts(self) -> List[int]:
+        """
+        Return the number of values less than or equal to every bucket bound, the last one is the total count.
+        """
+        result, total = [], 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'buckets': dict(zip(bounds, self.cumulative_counts()))
+        }
+
+
+class NodeStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency = Histogram(NODE_LATENCY_BUCKETS)
+        self.last_failed = False
+
+
+class ToolStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.duration = Histogram(TOOL_DURATION_BUCKETS)
+
+
+class RunMetrics:
+    """
+    Metrics of one graph run: node latencies, tokens reported in the usage_metadata of the AI messages, tool
+    durations, errors and retries. All the methods are thread-safe, tools are executed in parallel.
+
+    A call of a node that follows a failed call of the same node, e.g. by a RetryPolicy, is counted as a retry.
+    """
+
+    def __init__(self, run_id: str = 'run'):
+        """
+        :param run_id: The name of the run used in the exported files, e.g. the thread id
+        """
+        self.run_id = str(run_id)
+        self.started_at = datetime.datetime.now()
+        self._start = time.perf_counter()
+        self._nodes: Dict[str, NodeStats] = {}
+        self._tools: Dict[str, ToolStats] = {}
+        self._lock = threading.Lock()
+
+    def record_node(self, node: str, duration: float, input_tokens: int = 0, output_tokens: int = 0,
+                    failed: bool = False) -> None:
+        """
+        Record a call of a node.
+
+        :param node: The name of the node
+        :param duration: The duration of the call in seconds
+        :param input_tokens: The prompt tokens of the LLM calls of the node
+        :param output_tokens: The completion tokens of the LLM calls of the node
+        :param failed: Whether the call raised an exception
+        """
+        with self._lock:
+            stats = self._nodes.setdefault(node, NodeStats())
+            stats.calls += 1
+            stats.retries += stats.last_failed
+            stats.errors += failed
+            stats.last_failed = failed
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.latency.observe(duration)
+
+    def record_tool(self, tool: str, duration: float, failed: bool = False) -> None:
+        """
+        Record a tool call.
+
+        :param tool: The name of the tool
+        :param duration: The duration of the call in seconds
+        :param failed: Whether the call raised an exception
+        """
+        with self._lock:
+            stats = self._tools.setdefault(tool, ToolStats())
+            stats.calls += 1
+            stats.errors += failed
+            stats.duration.observe(duration)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Return the JSON summary of the run.
+        """
+        with self._lock:
+            nodes = {name: {
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'retries': stats.retries,
+                'input_tokens': stats.input_tokens,
+                'output_tokens': stats.output_tokens,
+                'latency_seconds': stats.latency.to_dict()
+            } for name, stats in self._nodes.items()}
+            tools = {name: {
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'duration_seconds': stats.duration.to_dict()
+            } for name, stats in self._tools.items()}
+
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at.isoformat(),
+            'duration_seconds': round(time.perf_counter() - self._start, 3),
+            'totals': {
+                'node_calls': sum(node['calls'] for node in nodes.values()),
+                'tool_calls': sum(tool['calls'] for tool in tools.values()),
+                'input_tokens': sum(node['input_tokens'] for node in nodes.values()),
+                'output_tokens': sum(node['output_tokens'] for node in nodes.values())
+            },
+            'nodes': nodes,
+            'tools': tools
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Return the metrics of the run in the Prometheus text exposition format.
+        """
+        run = f'run_id="{_escape_label(self.run_id)}"'
+        lines: List[str] = []
+
+        def add_metric(name: str, metric_type: str, description: str, samples: List[str]) -> None:
+            lines.append(f'# HELP {METRICS_PREFIX}_{name} {description}')
+            lines.append(f'# TYPE {METRICS_PREFIX}_{name} {metric_type}')
+            lines.extend(samples)
+
+        def histogram_samples(name: str, labels: str, histogram: Histogram) -> List[str]:
+            bounds = [str(bound) for bound in histogram.buckets] + ['+Inf']
+            samples = [f'{METRICS_PREFIX}_{name}_bucket{{{labels},le="{bound}"}} {count}'
+                       for bound, count in zip(bounds, histogram.cumulative_counts())]
+            samples.append(f'{METRICS_PREFIX}_{name}_sum{{{labels}}} {histogram.sum:.6f}')
+            samples.append(f'{METRICS_PREFIX}_{name}_count{{{labels}}} {histogram.count}')
+            return samples
+
+        with self._lock:
+            nodes = [(f'{run},node="{_escape_label(name)}"', stats) for name, stats in self._nodes.items()]
+            tools = [(f'{run},tool="{_escape_label(name)}"', stats) for name, stats in self._tools.items()]
+
+            add_metric('node_latency_seconds', 'histogram', 'Latency of the graph nodes.',
+                       [sample for labels, stats in nodes
+                        for sample in histogram_samples('node_latency_seconds', labels, stats.latency)])
+            add_metric('node_calls_total', 'counter', 'Calls of the graph nodes.',
+                       [f'{METRICS_PREFIX}_node_calls_total{{{labels}}} {stats.calls}' for labels, stats in nodes])
+            add_metric('node_errors_total', 'counter', 'Calls of the graph nodes that raised an exception.',
+                       [f'{METRICS_PREFIX}_node_errors_total{{{labels}}} {stats.errors}' for labels, stats in nodes])
+            add_metric('node_retries_total', 'counter', 'Calls of the graph nodes after a failed call.',
+                       [f'{METRICS_PREFIX}_node_retries_total{{{labels}}} {stats.retries}' for labels, stats in nodes])
+            add_metric('node_tokens_total', 'counter', 'LLM tokens of the graph nodes.',
+                       [f'{METRICS_PREFIX}_node_tokens_total{{{labels},direction="{direction}"}} {tokens}'
+                        for labels, stats in nodes
+                        for direction, tokens in (('input', stats.input_tokens), ('output', stats.output_tokens))])
+            add_metric('tool_duration_seconds', 'histogram', 'Duration of the tool calls.',
+                       [sample for labels, stats in tools
+                        for sample in histogram_samples('tool_duration_seconds', labels, stats.duration)])
+            add_metric('tool_errors_total', 'counter', 'Tool calls that raised an exception.',
+                       [f'{METRICS_PREFIX}_tool_errors_total{{{labels}}} {stats.errors}' for labels, stats in tools])
+        return '\n'.join(lines) + '\n'
+
+    def export(self, directory: str = METRICS_DIR) -> Dict[str, str]:
+        """
+        Write the JSON summary and the Prometheus text file of the run.
+
+        :param directory: The directory of the files, created if it does not exist
+        :return: The paths of the written files keyed by 'json' and 'prometheus'
+        """
+        os.makedirs(directory, exist_ok=True)
+        base_path = os.path.join(directory, f'{self.run_id.replace(" ", "_")}_metrics')
+        paths = {'json': f'{base_path}.json', 'prometheus': f'{base_path}.prom'}
+        with open(paths['json'], 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+        with open(paths['prometheus'], 'w') as file:
+            file.write(self.to_prometheus())
+        return paths
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Metrics of the current run. The run is kept in a context variable, so concurrent runs started in their own asyncio
+# tasks record separately; the nodes and tools executed by LangGraph in worker threads inherit the context.
+_default_run_metrics = RunMetrics()
+_run_metrics: ContextVar[Optional[RunMetrics]] = ContextVar('run_metrics', default=None)
+
+
+def start_run(run_id: str) -> RunMetrics:
+    """
+    Start collecting the metrics of a new run in the current context, nodes of the subgraphs launched by it are
+    recorded in the same run.
+
+    :param run_id: The name of the run, e.g. the thread id
+    :return: The metrics of the run
+    """
+    metrics = RunMetrics(run_id)
+    _run_metrics.set(metrics)
+    return metrics
+
+
+def get_run_metrics() -> RunMetrics:
+    """
+    Return the metrics of the current run, or the process-wide metrics outside of a run.
+    """
+    return _run_metrics.get() or _default_run_metrics
+
+
+def _count_tokens(result: Any) -> tuple:
+    """
+    Sum the usage_metadata of the AI messages returned by a node.
+    """
+    messages = result.get(MESSAGES_FIELD) if isinstance(result, dict) else None
+    if not messages:
+        return 0, 0
+    input_tokens = output_tokens = 0
+    for message in messages if isinstance(messages, (list, tuple)) else [messages]:
+        usage = getattr(message, 'usage_metadata', None) if isinstance(message, AIMessage) else None
+        if usage:
+            input_tokens += usage.get('input_tokens', 0)
+            output_tokens += usage.get('output_tokens', 0)
+    return input_tokens, output_tokens
+
+
+def _node_name(func: Callable, kwargs: Dict[str, Any]) -> str:
+    return str(kwargs.get('name') or kwargs.get('node_name') or NODE_FUNCTION_PREFIX.sub('', func.__name__))
+
+
+def instrument_node(func: Callable) -> Callable:
+    """
+    Record the latency, the tokens and the failures of every call of a node function in the current run.
+
+    The node is named by the 'name' or 'node_name' keyword argument bound with functools.partial, or by the function
+    name without the 'create_' or 'acreate_' prefix. Coroutine functions are awaited by the wrapper. Nothing is
+    recorded when INSTRUMENTATION_ENABLED is off.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not INSTRUMENTATION_ENABLED:
+                return await func(*args, **kwargs)
+            node = _node_name(func, kwargs)
+            metrics = get_run_metrics()
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception:
+                metrics.record_node(node, time.perf_counter() - start, failed=True)
+                raise
+            metrics.record_node(node, time.perf_counter() - start, *_count_tokens(result))
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not INSTRUMENTATION_ENABLED:
+            return func(*args, **kwargs)
+        node = _node_name(func, kwargs)
+        metrics = get_run_metrics()
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            metrics.record_node(node, time.perf_counter() - start, failed=True)
+            raise
+        metrics.record_node(node, time.perf_counter() - start, *_count_tokens(result))
+        return result
+
+    return wrapper
+
+
+def record_tool_duration(tool: str, duration: float, failed: bool = False) -> None:
+    """
+    Record a tool call timed by the caller in the current run, e.g. by a ToolDispatcher hook.
+
+    :param tool: The name of the tool
+    :param duration: The duration of the call in seconds
+    :param failed: Whether the call failed
+    """
+    if INSTRUMENTATION_ENABLED:
+        get_run_metrics().record_tool(tool, duration, failed=failed)
+
+
+def finish_run(metrics: RunMetrics) -> Optional[Dict[str, str]]:
+    """
+    Export the metrics of a finished run to METRICS_DIR and print the paths of the files.
+
+    :param metrics: The metrics returned by start_run
+    :return: The paths of the written files, or None when INSTRUMENTATION_ENABLED is off
+    """
+    if not INSTRUMENTATION_ENABLED:
+        return None
+    paths = metrics.export()
+    print(f'Metrics of the run: {paths["json"]}, {paths["prometheus"]}')
+    return paths
@@ -0,0 +1,451 @@
+import asyncio
+import atexit
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import AbstractAsyncContextManager, AbstractContextManager
+from functools import partial
+from types import TracebackType
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    copy_checkpoint,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.types import TASKS
+
+from constants import CHECKPOINT_PERSISTENT, CHECKPOINT_DB_FILE, CHECKPOINT_CACHE_SIZE
+
+CheckpointKey = Tuple[str, str, str]  # (thread_id, checkpoint_ns, checkpoint_id)
+# (checkpoint_type, checkpoint, metadata_type, metadata, parent_checkpoint_id) as stored in the checkpoints table
+CheckpointRow = Tuple[str, bytes, str, bytes, Optional[str]]
+
+# The persistent checkpointers of the process keyed by their SQLite file, see create_checkpointer
+_checkpointers: Dict[str, 'SqliteCheckpointSaver'] = {}
+_checkpointers_lock = threading.Lock()
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver, AbstractContextManager, AbstractAsyncContextManager):
+    """
+    A checkpoint saver that stores checkpoints and pending writes in a SQLite file.
+
+    It is a drop-in replacement for MemorySaver: every checkpoint is committed as soon as the graph produces it, so an
+    interrupted run can be resumed with the same thread_id after a restart, and the process keeps only the last
+    cache_size checkpoints in memory instead of every snapshot of the run. The cached checkpoints are kept serialized
+    and deserialized on every read, so the objects returned to a graph (e.g. the messages that a node changes in
+    place) are never shared with the cache or with another read.
+    """
+
+    def __init__(
+            self,
+            db_file: str = CHECKPOINT_DB_FILE,
+            cache_size: int = CHECKPOINT_CACHE_SIZE,
+            *,
+            serde: Optional[SerializerProtocol] = None
+    ) -> None:
+        """
+        Initialize the saver and create its tables.
+
+        :param db_file: The SQLite file with the checkpoints
+        :param cache_size: The number of serialized checkpoints kept in memory
+        :param serde: The serializer of checkpoints, metadata and writes
+        """
+        super().__init__(serde=serde)
+        self._cache_size = cache_size
+        self._cache: OrderedDict[CheckpointKey, CheckpointRow] = OrderedDict()
+        self._lock = threading.RLock()
+        self.closed = False
+        self._connection = sqlite3.connect(db_file, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                checkpoint_type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                value_type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+        ''')
+        self._connection.commit()
+
+    def __enter__(self) -> 'SqliteCheckpointSaver':
+        return self
+
+    def __exit__(
+            self,
+            exc_type: Optional[type[BaseException]],
+            exc_value: Optional[BaseException],
+            traceback: Optional[TracebackType]
+    ) -> Optional[bool]:
+        self.close()
+        return
+
+    async def __aenter__(self) -> 'SqliteCheckpointSaver':
+        return self
+
+    async def __aexit__(
+            self,
+            exc_type: Optional[type[BaseException]],
+            exc_value: Optional[BaseException],
+            traceback: Optional[TracebackType]
+    ) -> Optional[bool]:
+        self.close()
+        return
+
+    def close(self) -> None:
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._connection.close()
+            self._cache.clear()
+            self.closed = True
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """
+        Get the checkpoint with the checkpoint_id of the config, or the latest checkpoint of the thread.
+
+        :param config: The config with thread_id and optionally checkpoint_ns and checkpoint_id
+        :return: The checkpoint tuple, or None if no matching checkpoint was found
+        """
+        thread_id = str(config['configurable']['thread_id'])
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            if not checkpoint_id:
+                row = self._connection.execute(
+                    'SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? '
+                    'ORDER BY checkpoint_id DESC LIMIT 1',
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+                if row is None:
+                    return None
+                checkpoint_id = row[0]
+            return self._build_tuple((thread_id, checkpoint_ns, checkpoint_id))
+
+    def list(
+            self,
+            config: Optional[RunnableConfig],
+            *,
+            filter: Optional[Dict[str, Any]] = None,
+            before: Optional[RunnableConfig] = None,
+            limit: Optional[int] = None
+    ) -> Iterator[CheckpointTuple]:
+        """
+        List the checkpoints matching the criteria, the newest first.
+
+        Only the keys and the metadata are read upfront, every checkpoint is loaded when it is yielded.
+
+        :param config: Base configuration for filtering checkpoints (thread_id, checkpoint_ns, checkpoint_id)
+        :param filter: Metadata values that the checkpoints must have
+        :param before: List checkpoints created before this configuration
+        :param limit: Maximum number of checkpoints to return
+        """
+        conditions, parameters = [], []
+        if config:
+            conditions.append('thread_id = ?')
+            parameters.append(str(config['configurable']['thread_id']))
+            if (checkpoint_ns := config['configurable'].get('checkpoint_ns')) is not None:
+                conditions.append('checkpoint_ns = ?')
+                parameters.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append('checkpoint_id = ?')
+                parameters.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            conditions.append('checkpoint_id < ?')
+            parameters.append(before_checkpoint_id)
+
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT thread_id, checkpoint_ns, checkpoint_id, metadata_type, metadata FROM checkpoints {where} '
+                f'ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC',
+                parameters
+            ).fetchall()
+
+        for thread_id, checkpoint_ns, checkpoint_id, metadata_type, metadata_blob in rows:
+            if filter:
+                metadata = self.serde.loads_typed((metadata_type, metadata_blob))
+                if not all(query_value == metadata.get(query_key) for query_key, query_value in filter.items()):
+                    continue
+
+            if limit is not None and limit <= 0:
+                break
+            elif limit is not None:
+                limit -= 1
+
+            with self._lock:
+                checkpoint_tuple = self._build_tuple((thread_id, checkpoint_ns, checkpoint_id))
+            if checkpoint_tuple is not None:
+                yield checkpoint_tuple
+
+    def put(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        """
+        Save a checkpoint and commit it immediately.
+
+        :param config: The config to associate with the checkpoint
+        :param checkpoint: The checkpoint to save
+        :param metadata: Additional metadata to save with the checkpoint
+        :param new_versions: New versions as of this write
+        :return: The config of the saved checkpoint
+        """
+        c = checkpoint.copy()
+        c.pop('pending_sends')
+        thread_id = str(config['configurable']['thread_id'])
+        checkpoint_ns = config['configurable']['checkpoint_ns']
+        parent_checkpoint_id = config['configurable'].get('checkpoint_id')
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(c)
+        metadata_type, metadata_blob = self.serde.dumps_typed(metadata)
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, '
+                'checkpoint_type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (thread_id, checkpoint_ns, checkpoint['id'], parent_checkpoint_id,
+                 checkpoint_type, checkpoint_blob, metadata_type, metadata_blob)
+            )
+            self._connection.commit()
+            self._cache.pop((thread_id, checkpoint_ns, checkpoint['id']), None)
+        return {
+            'configurable': {
+                'thread_id': thread_id,
+                'checkpoint_ns': checkpoint_ns,
+                'checkpoint_id': checkpoint['id']
+            }
+        }
+
+    def put_writes(self, config: RunnableConfig, writes: List[Tuple[str, Any]], task_id: str) -> None:
+        """
+        Save the writes of a task and commit them immediately.
+
+        :param config: The config of the checkpoint the writes belong to
+        :param writes: The writes to save, each as a (channel, value) pair
+        :param task_id: Identifier for the task creating the writes
+        """
+        thread_id = str(config['configurable']['thread_id'])
+        checkpoint_ns = config['configurable']['checkpoint_ns']
+        checkpoint_id = config['configurable']['checkpoint_id']
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel,
+             *self.serde.dumps_typed(value))
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, '
+                'value_type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self._connection.commit()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """
+        Asynchronous version of get_tuple, runs it in the default executor.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def alist(
+            self,
+            config: Optional[RunnableConfig],
+            *,
+            filter: Optional[Dict[str, Any]] = None,
+            before: Optional[RunnableConfig] = None,
+            limit: Optional[int] = None
+    ) -> AsyncIterator[CheckpointTuple]:
+        """
+        Asynchronous version of list, every item is loaded in the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        iterator = await loop.run_in_executor(
+            None,
+            partial(self.list, before=before, limit=limit, filter=filter),
+            config
+        )
+        while True:
+            # StopIteration cannot be raised into a coroutine, so next() returns None at the end
+            if item := await loop.run_in_executor(None, next, iterator, None):
+                yield item
+            else:
+                break
+
+    async def aput(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        """
+        Asynchronous version of put, runs it in the default executor.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(self, config: RunnableConfig, writes: List[Tuple[str, Any]], task_id: str) -> None:
+        """
+        Asynchronous version of put_writes, runs it in the default executor.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.put_writes, config, writes, task_id)
+
+    def _build_tuple(self, key: CheckpointKey) -> Optional[CheckpointTuple]:
+        loaded = self._load_checkpoint(key)
+        if loaded is None:
+            return None
+        checkpoint, metadata, parent_checkpoint_id = loaded
+        thread_id, checkpoint_ns, checkpoint_id = key
+
+        pending_writes = self._load_writes(key)
+        if parent_checkpoint_id:
+            sends = [
+                value
+                for _, channel, value in self._load_writes((thread_id, checkpoint_ns, parent_checkpoint_id))
+                if channel == TASKS
+            ]
+        else:
+            sends = []
+
+        return CheckpointTuple(
+            config={
+                'configurable': {
+                    'thread_id': thread_id,
+                    'checkpoint_ns': checkpoint_ns,
+                    'checkpoint_id': checkpoint_id
+                }
+            },
+            checkpoint={**copy_checkpoint(checkpoint), 'pending_sends': sends},
+            metadata=metadata.copy(),
+            pending_writes=pending_writes,
+            parent_config={
+                'configurable': {
+                    'thread_id': thread_id,
+                    'checkpoint_ns': checkpoint_ns,
+                    'checkpoint_id': parent_checkpoint_id
+                }
+            } if parent_checkpoint_id else None
+        )
+
+    def _load_checkpoint(self, key: CheckpointKey) -> Optional[Tuple[Checkpoint, CheckpointMetadata, Optional[str]]]:
+        row = self._cache.get(key)
+        if row is not None:
+            self._cache.move_to_end(key)
+        else:
+            row = self._connection.execute(
+                'SELECT checkpoint_type, checkpoint, metadata_type, metadata, parent_checkpoint_id FROM checkpoints '
+                'WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?',
+                key
+            ).fetchone()
+            if row is None:
+                return None
+            if self._cache_size > 0:
+                self._cache[key] = row
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+
+        # Every read deserializes new objects, the graph may change them in place
+        checkpoint_type, checkpoint_blob, metadata_type, metadata_blob, parent_checkpoint_id = row
+        return (
+            self.serde.loads_typed((checkpoint_type, checkpoint_blob)),
+            self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_checkpoint_id
+        )
+
+    def _load_writes(self, key: CheckpointKey) -> List[Tuple[str, str, Any]]:
+        rows = self._connection.execute(
+            'SELECT task_id, channel, value_type, value FROM writes '
+            'WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx',
+            key
+        ).fetchall()
+        return [
+            (task_id, channel, self.serde.loads_typed((value_type, value)))
+            for task_id, channel, value_type, value in rows
+        ]
+
+
+def create_checkpointer(
+        persistent: bool = CHECKPOINT_PERSISTENT,
+        db_file: str = CHECKPOINT_DB_FILE
+) -> BaseCheckpointSaver:
+    """
+    Create the checkpointer for a graph execution.
+
+    A persistent checkpointer is shared by all the executions of the process that use the same SQLite file, so the
+    launchers do not open a connection per run; it is closed when the process exits.
+
+    :param persistent: Store the checkpoints on disk with SqliteCheckpointSaver, otherwise keep them in a MemorySaver
+    :param db_file: The SQLite file for the persistent checkpoints
+    :return: The checkpointer
+    """
+    if not persistent:
+        return MemorySaver()
+    with _checkpointers_lock:
+        checkpointer = _checkpointers.get(db_file)
+        if checkpointer is None or checkpointer.closed:
+            checkpointer = _checkpointers[db_file] = SqliteCheckpointSaver(db_file)
+        return checkpointer
+
+
+@atexit.register
+def _close_checkpointers() -> None:
+    with _checkpointers_lock:
+        for checkpointer in _checkpointers.values():
+            if not checkpointer.closed:
+                checkpointer.close()
+        _checkpointers.clear()
+
+
+def generate_thread_id(prefix: str) -> str:
+    """
+    Generate a unique thread_id, so a new run never continues the checkpoints of a previous one.
+
+    :param prefix: A readable prefix, e.g. the team name
+    :return: The thread_id
+    """
+    return f'{prefix.replace(" ", "_")}_{uuid.uuid4().hex[:12]}'
+
+
+def derive_thread_id(config: Optional[RunnableConfig], name: str, default: Any = None) -> Any:
+    """
+    Derive the thread_id of a subgraph run from the config of the parent graph, so the subgraph runs of concurrent
+    parent runs never share a thread.
+
+    :param config: The config of the parent graph passed to the node
+    :param name: The name of the subgraph, e.g. the node that launches it
+    :param default: The thread_id used when the parent config has none, a new one is generated if None
+    :return: '<parent thread_id>/<name>', or the default
+    """
+    parent_thread_id = (config or {}).get('configurable', {}).get('thread_id')
+    if parent_thread_id is None:
+        return default if default is not None else generate_thread_id(name)
+    return f'{parent_thread_id}/{name.replace(" ", "_")}'
@@ -0,0 +1,138 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from constants import COMPACTION_KEEP_TURNS, COMPACTION_TOKEN_BUDGET, COMPACTION_TOOL_OUTPUT_TOKENS, \
+    COMPACTION_CACHE_SIZE, COMPACTION_LOOKUP_TOOLS
+from utils.msf.data_compressor import DataCompressor
+from utils.token_utils import count_message_tokens, count_tokens
+
+
+class ContextCompactor:
+    """
+    Shrinks the message history of an agent before it is invoked.
+
+    - The task message (the first one) and the last keep_turns turns are passed unchanged. A turn is a message that
+      is not a ToolMessage together with the ToolMessages following it, so tool calls always stay with their results.
+    - The ToolMessages of the older turns are replaced with their DataCompressor summaries, cut to
+      tool_output_tokens tokens, under a header naming the tool call. Repeating a call could run a module again, so
+      the header of a tool of lookup_tools names the read-only tool that returns the stored output of the call
+      instead (e.g. the console_results row of a module run).
+    - If the history still exceeds token_budget, the oldest turns are dropped; the task message and the last turn are
+      always kept.
+
+    Compacted outputs are cached by the tool call id, so every output is compressed once during the run.
+    """
+
+    def __init__(
+            self,
+            keep_turns: int = COMPACTION_KEEP_TURNS,
+            token_budget: Optional[int] = COMPACTION_TOKEN_BUDGET,
+            tool_output_tokens: int = COMPACTION_TOOL_OUTPUT_TOKENS,
+            cache_size: int = COMPACTION_CACHE_SIZE,
+            lookup_tools: Optional[Dict[str, str]] = None
+    ):
+        """
+        Initialize the compactor.
+
+        :param keep_turns: The number of the last turns passed unchanged
+        :param token_budget: The maximum number of tokens of the compacted history, None for no limit
+        :param tool_output_tokens: The maximum number of tokens of a compacted tool output
+        :param cache_size: The number of compacted tool outputs kept in memory
+        :param lookup_tools: The read-only tool returning the stored output of a tool keyed by its name, defaults to
+            COMPACTION_LOOKUP_TOOLS
+        """
+        self._keep_turns = max(1, keep_turns)
+        self._token_budget = token_budget
+        self._tool_output_tokens = tool_output_tokens
+        self._cache_size = cache_size
+        self._lookup_tools = COMPACTION_LOOKUP_TOOLS if lookup_tools is None else lookup_tools
+        self._cache: OrderedDict[Tuple[str, int], ToolMessage] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compact(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        """
+        Return the compacted history.
+
+        :param messages: The message history, the first message is the task
+        :return: The messages to invoke the agent with
+        """
+        if len(messages) <= 1:
+            return list(messages)
+        task_message, turns = messages[0], self._split_turns(messages[1:])
+
+        old_turns, recent_turns = turns[:-self._keep_turns], turns[-self._keep_turns:]
+        if old_turns:
+            tool_calls = {tool_call['id']: tool_call for turn in old_turns for message in turn
+                          if isinstance(message, AIMessage) for tool_call in message.tool_calls}
+            old_turns = [[self._compact_tool_message(message, tool_calls.get(message.tool_call_id))
+                          if isinstance(message, ToolMessage) else message for message in turn]
+                         for turn in old_turns]
+        turns = old_turns + recent_turns
+
+        if self._token_budget is not None:
+            turn_tokens = [sum(count_message_tokens(message) for message in turn) for turn in turns]
+            total = count_message_tokens(task_message) + sum(turn_tokens)
+            dropped = 0
+            while total > self._token_budget and dropped < len(turns) - 1:
+                total -= turn_tokens[dropped]
+                dropped += 1
+            turns = turns[dropped:]
+
+        return [task_message] + [message for turn in turns for message in turn]
+
+    @staticmethod
+    def _split_turns(messages: Sequence[BaseMessage]) -> List[List[BaseMessage]]:
+        turns: List[List[BaseMessage]] = []
+        for message in messages:
+            if isinstance(message, ToolMessage) and turns:
+                turns[-1].append(message)
+            else:
+                turns.append([message])
+        return turns
+
+    def _compact_tool_message(self, message: ToolMessage, tool_call: Optional[Dict[str, Any]]) -> ToolMessage:
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+        key = (message.tool_call_id, len(content))
+        with self._lock:
+            compacted = self._cache.get(key)
+            if compacted is not None:
+                self._cache.move_to_end(key)
+                return compacted
+
+        tokens = count_tokens(content)
+        if tokens <= self._tool_output_tokens:
+            return message
+
+        compressor = DataCompressor()
+        compressor.start_compressing(content)
+        summary = compressor.get_compressed_output() or content
+        summary_tokens = count_tokens(summary)
+        if summary_tokens > self._tool_output_tokens:
+            # Cut proportionally to the number of characters, exact enough for a summary
+            summary = summary[:len(summary) * self._tool_output_tokens // summary_tokens] + '\n...'
+
+        call = f'{tool_call["name"]}({json.dumps(tool_call["args"])})' if tool_call else message.name or 'the tool'
+        lookup_tool = self._lookup_tools.get(tool_call['name']) if tool_call else None
+        if lookup_tool:
+            # Repeating the call would run the module against the target again
+            header = (f'[Compacted output of {call}, {tokens} tokens. Do not repeat the call, its full output is '
+                      f'stored: call {lookup_tool}({json.dumps(tool_call["args"])}) to read it.]\n')
+        else:
+            header = f'[Compacted output of {call}, {tokens} tokens.]\n'
+        compacted = ToolMessage(
+            content=header + summary,
+            name=message.name,
+            tool_call_id=message.tool_call_id,
+            id=message.id,
+            status=message.status
+        )
+
+        with self._lock:
+            self._cache[key] = compacted
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return compacted
@@ -0,0 +1,154 @@
+import datetime
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.load import dumpd
+from langchain_core.messages import BaseMessage
+from langgraph.constants import START
+
+from constants import MESSAGES_FIELD
+
+
+class EventSink(ABC):
+    """
+    Receives the messages appended to the graph state while a graph is streamed by stream_graph.
+    """
+
+    @abstractmethod
+    def on_messages(self, node: str, messages: List[BaseMessage]) -> None:
+        """
+        Handle the messages appended by one node.
+
+        :param node: The name of the node, START for the input messages
+        :param messages: The new messages in the order they were appended
+        """
+
+    def close(self) -> None:
+        """
+        Release the resources of the sink.
+        """
+
+    def __enter__(self) -> 'EventSink':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class ConsoleSink(EventSink):
+    """
+    Pretty-prints the messages to the console.
+    """
+
+    def on_messages(self, node: str, messages: List[BaseMessage]) -> None:
+        for message in messages:
+            message.pretty_print()
+
+
+class JsonlFileSink(EventSink):
+    """
+    Appends every message to a JSONL file, one {"time", "node", "message"} object per line.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Open the file for appending.
+
+        :param file_path: The path of the JSONL file
+        """
+        self._file = open(file_path, 'a')
+
+    def on_messages(self, node: str, messages: List[BaseMessage]) -> None:
+        time = datetime.datetime.now().isoformat()
+        for message in messages:
+            self._file.write(json.dumps({'time': time, 'node': node, 'message': dumpd(message)}) + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CallbackSink(EventSink):
+    """
+    Calls a function for every message.
+    """
+
+    def __init__(self, callback: Callable[[str, BaseMessage], None]):
+        """
+        :param callback: Called with the node name and the message
+        """
+        self._callback = callback
+
+    def on_messages(self, node: str, messages: List[BaseMessage]) -> None:
+        for message in messages:
+            self._callback(node, message)
+
+
+def stream_graph(compiled_graph, inputs: Optional[Dict[str, Any]], config: Dict[str, Any],
+                 sink: Optional[EventSink] = None) -> Optional[Dict[str, Any]]:
+    """
+    Execute a compiled graph and pass only the newly appended messages to the sink.
+
+    The graph is streamed in the 'updates' mode, so every event holds just the state update of one node and
+    handling it does not depend on the length of the conversation; the 'values' mode is kept only to return the
+    final state, its events are not scanned.
+
+    Args:
+        compiled_graph: The compiled graph to execute.
+        inputs: The input of the graph, or None to resume from the checkpoint of the config.
+        config: The execution configuration with the thread id.
+        sink: Receives the input messages and the messages of every node, ConsoleSink if None.
+
+    Returns:
+        The state of the graph after the last step, or None if the graph produced no events.
+    """
+    sink = ConsoleSink() if sink is None else sink
+    if inputs and inputs.get(MESSAGES_FIELD):
+        sink.on_messages(START, list(inputs[MESSAGES_FIELD]))
+
+    values: Optional[Dict[str, Any]] = None
+    for mode, chunk in compiled_graph.stream(inputs, config, stream_mode=['updates', 'values']):
+        if mode == 'values':
+            values = chunk
+            continue
+        _pass_updates(sink, chunk)
+    return values
+
+
+async def astream_graph(compiled_graph, inputs: Optional[Dict[str, Any]], config: Dict[str, Any],
+                        sink: Optional[EventSink] = None) -> Optional[Dict[str, Any]]:
+    """
+    Async variant of stream_graph: the graph is executed with astream, so async nodes are awaited on the event loop.
+
+    Args:
+        compiled_graph: The compiled graph to execute.
+        inputs: The input of the graph, or None to resume from the checkpoint of the config.
+        config: The execution configuration with the thread id.
+        sink: Receives the input messages and the messages of every node, ConsoleSink if None.
+
+    Returns:
+        The state of the graph after the last step, or None if the graph produced no events.
+    """
+    sink = ConsoleSink() if sink is None else sink
+    if inputs and inputs.get(MESSAGES_FIELD):
+        sink.on_messages(START, list(inputs[MESSAGES_FIELD]))
+
+    values: Optional[Dict[str, Any]] = None
+    async for mode, chunk in compiled_graph.astream(inputs, config, stream_mode=['updates', 'values']):
+        if mode == 'values':
+            values = chunk
+            continue
+        _pass_updates(sink, chunk)
+    return values
+
+
+def _pass_updates(sink: EventSink, chunk: Dict[str, Any]) -> None:
+    """
+    Pass the messages of an 'updates' event to the sink, node by node.
+    """
+    for node, update in chunk.items():
+        messages = update.get(MESSAGES_FIELD) if isinstance(update, dict) else None
+        if not messages:
+            continue
+        sink.on_messages(node, list(messages) if isinstance(messages, (list, tuple)) else [messages])
@@ -0,0 +1,135 @@
+import inspect
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.tools import BaseTool
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph import StateGraph
+from langgraph.graph.state import CompiledStateGraph
+
+from constants import GRAPH_CACHE_SIZE, MESSAGE_FOLDER
+
+logger = logging.getLogger(__name__)
+
+
+class GraphFactory:
+    """
+    Builds and compiles graphs once per configuration and hands out the cached compiled graphs afterwards.
+
+    A graph is identified by its builder function and the arguments passed to it:
+    - a model by its class and its llm_string (model name, temperature and the other parameters);
+    - a tool by its name;
+    - a string naming a file of the messages folder by the path and the modification time, so an edited prompt
+      builds the graph again;
+    - dictionaries, lists and tuples by their items, other values by their identity.
+
+    Graphs are compiled without a checkpointer, with_checkpointer() attaches the checkpointer of a run to a cached
+    graph without compiling it again. The least recently used graphs are evicted above max_size.
+    """
+
+    def __init__(self, max_size: int = GRAPH_CACHE_SIZE):
+        """
+        :param max_size: The maximum number of cached graphs
+        """
+        self._max_size = max_size
+        # key -> (compiled graph, arguments of the build), the arguments keep the objects keyed by identity alive
+        self._graphs: OrderedDict[Hashable, Tuple[CompiledStateGraph, Any]] = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, builder: Callable[..., Any], *args: Any, **kwargs: Any) -> CompiledStateGraph:
+        """
+        Return the compiled graph built by the builder with the arguments, building and compiling it on a miss.
+
+        :param builder: Returns a StateGraph or a compiled graph, e.g. create_graph_testing_team
+        :param args: The positional arguments of the builder
+        :param kwargs: The keyword arguments of the builder
+        :return: The compiled graph without a checkpointer
+        """
+        key = (f'{builder.__module__}.{builder.__qualname__}', config_key(args), config_key(kwargs))
+        # The lock is reentrant, a builder may get the compiled graphs of its subgraphs from the factory
+        with self._lock:
+            entry = self._graphs.get(key)
+            if entry is not None:
+                self._graphs.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+            graph = builder(*args, **kwargs)
+            compiled_graph = graph.compile() if isinstance(graph, StateGraph) else graph
+            self._graphs[key] = (compiled_graph, (args, kwargs))
+            if len(self._graphs) > self._max_size:
+                self._graphs.popitem(last=False)
+            logger.info(f'The graph of {builder.__qualname__} was built and compiled')
+            return compiled_graph
+
+    def clear(self) -> None:
+        with self._lock:
+            self._graphs.clear()
+
+
+def config_key(value: Any) -> Hashable:
+    """
+    Return a hashable key of a builder argument, see GraphFactory.
+    """
+    if value is None or isinstance(value, (bool, int, float, bytes)):
+        return value
+    if isinstance(value, str):
+        path = os.path.join(MESSAGE_FOLDER, value)
+        if os.path.isfile(path):
+            return 'prompt', value, os.path.getmtime(path)
+        return value
+    if isinstance(value, BaseLanguageModel):
+        return 'model', type(value).__qualname__, value._get_llm_string()
+    if isinstance(value, BaseTool):
+        return 'tool', value.name
+    if isinstance(value, dict):
+        return tuple(sorted((str(name), config_key(item)) for name, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(config_key(item) for item in value)
+    if inspect.isfunction(value) or inspect.isclass(value):
+        return f'{value.__module__}.{value.__qualname__}'
+    return 'id', id(value)
+
+
+def with_checkpointer(graph: StateGraph | CompiledStateGraph,
+                      checkpointer: Optional[BaseCheckpointSaver]) -> CompiledStateGraph:
+    """
+    Return the graph compiled with the checkpointer of a run.
+
+    A StateGraph is compiled, a compiled graph (e.g. from the GraphFactory) is copied with the checkpointer, which is
+    much cheaper than compiling it again and leaves the cached graph unchanged.
+
+    :param graph: The graph of the run
+    :param checkpointer: The checkpointer of the run
+    :return: The compiled graph
+    """
+    if isinstance(graph, StateGraph):
+        return graph.compile(checkpointer=checkpointer)
+    return graph.copy({'checkpointer': checkpointer})
+
+
+# Factory shared by the whole process
+_graph_factory = GraphFactory()
+
+
+def get_compiled_graph(builder: Callable[..., Any], *args: Any, **kwargs: Any) -> CompiledStateGraph:
+    """
+    Return the compiled graph of the builder and the arguments from the process-wide GraphFactory.
+
+    :param builder: Returns a StateGraph or a compiled graph, e.g. create_graph_testing_team
+    :param args: The positional arguments of the builder
+    :param kwargs: The keyword arguments of the builder
+    :return: The compiled graph without a checkpointer
+    """
+    return _graph_factory.get(builder, *args, **kwargs)
+
+
+def get_graph_factory() -> GraphFactory:
+    return _graph_factory
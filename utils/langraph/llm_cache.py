@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage
+
+from constants import LLM_CACHE_DB_FILE, LLM_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# Caches shared by the whole process, keyed by db_file
+_caches: Dict[str, 'SqliteLLMCache'] = {}
+_caches_lock = threading.Lock()
+
+
+class SqliteLLMCache(BaseCache):
+    """
+    An on-disk exact-match cache of LLM responses with least-recently-used eviction.
+
+    LangChain looks responses up by the serialized prompt and the llm_string, which holds the model name, its
+    parameters and the tools or the schema bound to it, so an entry is reused only for the very same request.
+    Entries are stored under the sha256 of both, and the least recently used ones are deleted once the cache holds
+    more than max_entries responses. The usage_metadata of a cached response is dropped on lookup: a cache hit makes
+    no API call, so the run metrics must not count its tokens.
+    """
+
+    def __init__(self, db_file: str = LLM_CACHE_DB_FILE, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        """
+        Open the cache and create its table.
+
+        :param db_file: The SQLite file of the cache
+        :param max_entries: The maximum number of cached responses
+        """
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_file, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                llm_string TEXT NOT NULL,
+                return_val TEXT NOT NULL,
+                accessed INTEGER NOT NULL
+            )
+        ''')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)')
+        self._connection.commit()
+        self._size, last_access = self._connection.execute('SELECT COUNT(*), MAX(accessed) FROM llm_cache').fetchone()
+        self._clock = last_access or 0
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f'{llm_string}\0{prompt}'.encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """
+        Return the cached generations of the request, or None on a miss.
+        """
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._connection.execute('SELECT return_val FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._clock += 1
+            self._connection.execute('UPDATE llm_cache SET accessed = ? WHERE key = ?', (self._clock, key))
+            self._connection.commit()
+        try:
+            generations = [loads(generation) for generation in json.loads(row[0])]
+        except Exception as e:
+            logger.warning(f'A cached LLM response could not be deserialized, it is requested again: {e}')
+            return None
+        for generation in generations:
+            message = getattr(generation, 'message', None)
+            if isinstance(message, AIMessage):
+                message.usage_metadata = None
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """
+        Store the generations of the request, evicting the least recently used responses above max_entries.
+        """
+        key = self._key(prompt, llm_string)
+        value = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock:
+            self._clock += 1
+            cursor = self._connection.execute('UPDATE llm_cache SET return_val = ?, accessed = ? WHERE key = ?',
+                                              (value, self._clock, key))
+            if not cursor.rowcount:
+                self._connection.execute('INSERT INTO llm_cache (key, llm_string, return_val, accessed) '
+                                         'VALUES (?, ?, ?, ?)', (key, llm_string, value, self._clock))
+                self._size += 1
+            if self._size > self._max_entries:
+                self._connection.execute(
+                    'DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)',
+                    (self._size - self._max_entries,)
+                )
+                self._size = self._max_entries
+            self._connection.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        """
+        Delete all the cached responses.
+        """
+        with self._lock:
+            self._connection.execute('DELETE FROM llm_cache')
+            self._connection.commit()
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        """
+        The number of cached responses. The cache does not define __len__: LangChain checks the cache of a model for
+        truth, so an empty cache would be skipped and never filled.
+        """
+        return self._size
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def get_llm_cache(db_file: str = LLM_CACHE_DB_FILE) -> SqliteLLMCache:
+    """
+    Return the process-wide LLM cache stored in the file.
+
+    :param db_file: The SQLite file of the cache
+    :return: The shared cache
+    """
+    cache = _caches.get(db_file)
+    if cache is not None:
+        return cache
+
+    with _caches_lock:
+        cache = _caches.get(db_file)
+        if cache is None:
+            cache = SqliteLLMCache(db_file)
+            _caches[db_file] = cache
+        return cache
+
+
+def with_llm_cache(model_llm: BaseChatModel, enabled: bool = True, db_file: str = LLM_CACHE_DB_FILE) -> BaseChatModel:
+    """
+    Return a copy of the model that uses the LLM cache, the model itself is not changed.
+
+    Only a model with temperature 0 is cached: with any other temperature the same request is expected to give
+    different responses, so the model is returned as it is.
+
+    :param model_llm: The chat model of an agent
+    :param enabled: Whether the agent uses the cache
+    :param db_file: The SQLite file of the cache
+    :return: The model with the cache, or the given model
+    """
+    if not enabled:
+        return model_llm
+    temperature = getattr(model_llm, 'temperature', None)
+    if temperature not in (0, 0.0):
+        logger.info(f'The LLM cache is not used for a model with temperature {temperature}')
+        return model_llm
+    return model_llm.model_copy(update={'cache': get_llm_cache(db_file)})
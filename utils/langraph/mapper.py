@@ -1,47 +1,119 @@
 import datetime
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Iterable, Tuple
 
-from langchain_core.load.load import loads
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from langchain_core.load.load import load, loads
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
 from langgraph.pregel import StateSnapshot
 
+from constants import SNAPSHOT_BINARY_FORMAT, SNAPSHOT_CODEC
+from utils.langraph.message_store import MessageStore, diff_snapshot_refs
+from utils.langraph.snapshot_format import SnapshotReader, SnapshotWriter, is_binary_snapshot_file, \
+    iter_legacy_snapshots
 
-def save_snapshot_in_json(list_snapshots: List[StateSnapshot], team_name: str):
+
+def save_snapshot_in_json(list_snapshots: Iterable[StateSnapshot], team_name: str,
+                          binary: bool = SNAPSHOT_BINARY_FORMAT) -> str:
     """
-    Save a list of StateSnapshot objects in a JSON file.
+    Save StateSnapshot objects in a file.
 
     Args:
-        list_snapshots: List of StateSnapshot objects to save.
+        list_snapshots: StateSnapshot objects to save, e.g. the iterator returned by get_state_history. Every
+            snapshot is written as soon as it is converted, so the whole history is never held in memory.
+        team_name: The name of the team, used in the file name.
+        binary: Write the indexed binary format (see snapshot_format.py) instead of the legacy JSON text format.
+
+    Returns:
+        The path of the saved file.
 
     The file will be saved in the 'resources/states/' directory with a
     timestamp-based filename.
     """
-    list_json = []
-    for snapshot in list_snapshots:
-        list_json.append(_state_to_json(snapshot))
-
     # Generate a unique file name with the current date and time
-    with open(f'resources/states/{team_name.replace(" ", "_")}_snapshots_{datetime.datetime.now().strftime("%d_%m_%Y_%H_%M")}', 'x') as file_writer:
-        for snapshot_json in list_json:
-            file_writer.write(snapshot_json)
+    file_path = f'resources/states/{team_name.replace(" ", "_")}_snapshots_{datetime.datetime.now().strftime("%d_%m_%Y_%H_%M")}'
+    if binary:
+        with SnapshotWriter(file_path, codec=SNAPSHOT_CODEC) as writer:
+            for snapshot in list_snapshots:
+                # Messages are replaced with references as they are, only new messages are serialized and written
+                writer.write(_state_snapshot_to_dict(snapshot))
+        return file_path
+
+    with open(file_path, 'x') as file_writer:
+        for snapshot in list_snapshots:
+            file_writer.write(_state_to_json(snapshot))
             file_writer.write('\n\n')
+    return file_path
 
 
 def load_snapshot_from_json(file_path: str, position: int = 0) -> StateSnapshot:
     """
-    Load a StateSnapshot object from a JSON file.
+    Load a StateSnapshot object from a snapshot file, the format of the file is detected automatically.
+
+    Args:
+        file_path: Path to the file where the snapshots are stored.
+        position: The position in the file to read from (default is 0). A binary file is read directly at the
+            position, negative positions count from the end.
+
+    Returns:
+        A StateSnapshot object restored from the file.
+    """
+    if is_binary_snapshot_file(file_path):
+        with SnapshotReader(file_path) as reader:
+            return _dict_to_state_snapshot(reader.get(position))
+
+    snapshots = iter_legacy_snapshots(file_path)
+    if position < 0:
+        return _dict_to_state_snapshot(list(snapshots)[position])
+    for index, json_snapshot in enumerate(snapshots):
+        if index == position:
+            return _dict_to_state_snapshot(json_snapshot)
+    raise IndexError(f'{file_path} has no snapshot at position {position}')
+
+
+def load_snapshot_refs(file_path: str) -> Tuple[List[Dict[str, Any]], MessageStore]:
+    """
+    Load all the snapshots of a file as snapshot references without reading their messages.
+
+    Args:
+        file_path: Path to the file where the snapshots are stored.
+
+    Returns:
+        The snapshot references in the file order and the MessageStore resolving them, every distinct message is
+        read once.
+    """
+    if is_binary_snapshot_file(file_path):
+        with SnapshotReader(file_path) as reader:
+            snapshot_refs = [reader.get_ref(position) for position in range(len(reader))]
+            for key in reader.message_keys():
+                reader.messages.get_serialized(key)
+            return snapshot_refs, reader.messages
+
+    store = MessageStore()
+    return [store.to_ref(json_snapshot) for json_snapshot in iter_legacy_snapshots(file_path)], store
+
+
+def diff_snapshots(file_path: str, old_position: int, new_position: int) -> List[BaseMessage]:
+    """
+    Return the messages added between two snapshots of a file.
+
+    The snapshots are compared by message hashes, only the added messages are read and deserialized.
 
     Args:
         file_path: Path to the file where the snapshots are stored.
-        position: The position in the file to read from (default is 0).
+        old_position: The position of the earlier snapshot.
+        new_position: The position of the later snapshot.
 
     Returns:
-        A StateSnapshot object restored from the JSON data.
+        The messages of the later snapshot that follow the messages shared with the earlier one.
     """
-    with open(file_path, 'r') as f:
-        text_json = f.read().split('\n\n')
-    return _json_to_state_snapshot(text_json[position])
+    if is_binary_snapshot_file(file_path):
+        with SnapshotReader(file_path) as reader:
+            diff = diff_snapshot_refs(reader.get_ref(old_position), reader.get_ref(new_position))
+            return [reader.messages.get(key) for key in diff.added]
+
+    snapshot_refs, store = load_snapshot_refs(file_path)
+    diff = diff_snapshot_refs(snapshot_refs[old_position], snapshot_refs[new_position])
+    return [store.get(key) for key in diff.added]
 
 
 # All the following functions are now private by adding a leading underscore
@@ -135,7 +207,20 @@ def _json_to_state_snapshot(text: str) -> StateSnapshot:
     Returns:
         A StateSnapshot object reconstructed from the JSON data.
     """
-    json_snapshot = loads(text)
+    return _dict_to_state_snapshot(json.loads(text))
+
+
+def _dict_to_state_snapshot(raw_snapshot: Dict[str, Any]) -> StateSnapshot:
+    """
+    Convert a parsed JSON snapshot back into a StateSnapshot object.
+
+    Args:
+        raw_snapshot: A dictionary representing the state snapshot, messages are in the to_json() form.
+
+    Returns:
+        A StateSnapshot object reconstructed from the dictionary.
+    """
+    json_snapshot = load(raw_snapshot)
 
     # Return the StateSnapshot object
     state = StateSnapshot(
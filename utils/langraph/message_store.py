@@ -0,0 +1,163 @@
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Union
+
+from langchain_core.load.load import load
+from langchain_core.messages import BaseMessage
+
+from constants import MESSAGES_FIELD
+
+MESSAGE_REF_KEY = '$message'
+# Message classes that are stored once and referenced from the snapshots
+MESSAGE_CLASSES = {'HumanMessage', 'AIMessage', 'ToolMessage', 'SystemMessage'}
+
+
+class SnapshotDiff(NamedTuple):
+    common: int  # the number of leading messages shared by both snapshots
+    removed: List[str]  # message hashes of the old snapshot after the common part
+    added: List[str]  # message hashes of the new snapshot after the common part
+
+
+def is_message(value: Any) -> bool:
+    """
+    Check whether a value is a message serialized with to_json().
+    """
+    return (isinstance(value, dict) and value.get('type') == 'constructor'
+            and isinstance(value.get('id'), list) and value['id'][-1] in MESSAGE_CLASSES)
+
+
+def is_message_ref(value: Any) -> bool:
+    """
+    Check whether a value is a {"$message": hash} reference.
+    """
+    return isinstance(value, dict) and len(value) == 1 and MESSAGE_REF_KEY in value
+
+
+def message_hash(message: Dict[str, Any]) -> str:
+    """
+    Return the content address of a serialized message.
+    """
+    payload = json.dumps(message, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MessageStore:
+    """
+    Content-addressed storage of messages: every message is kept once, serialized with to_json(), under its sha256.
+
+    Snapshots are converted into snapshot references, the same structure with every message replaced with
+    {"$message": hash}, so a history of k snapshots holds each message body once instead of up to k times.
+    The store can be backed by a file: on_add is called for every new message, e.g. to append it to the file, and
+    loader is called for a hash that is not in memory yet, e.g. to read the message from the file.
+    """
+
+    def __init__(self, loader: Optional[Callable[[str], Dict[str, Any]]] = None,
+                 on_add: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        """
+        Initialize the store.
+
+        :param loader: Returns the serialized message of a hash that is not in memory, raises KeyError if unknown
+        :param on_add: Called with the hash and the serialized message when a new message is added
+        """
+        self._messages: Dict[str, Dict[str, Any]] = {}
+        self._loader = loader
+        self._on_add = on_add
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._messages
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._messages)
+
+    def add(self, message: Union[BaseMessage, Dict[str, Any]]) -> str:
+        """
+        Add a message unless it is already stored.
+
+        :param message: A message object or a message serialized with to_json()
+        :return: The hash of the message
+        """
+        serialized = message.to_json() if isinstance(message, BaseMessage) else message
+        key = message_hash(serialized)
+        if key not in self._messages:
+            self._messages[key] = serialized
+            if self._on_add is not None:
+                self._on_add(key, serialized)
+        return key
+
+    def get_serialized(self, key: str) -> Dict[str, Any]:
+        """
+        Return the serialized message of a hash.
+        """
+        serialized = self._messages.get(key)
+        if serialized is None:
+            if self._loader is None:
+                raise KeyError(key)
+            serialized = self._messages[key] = self._loader(key)
+        return serialized
+
+    def get(self, key: str) -> BaseMessage:
+        """
+        Return the message object of a hash.
+        """
+        return load(self.get_serialized(key))
+
+    def to_ref(self, value: Any) -> Any:
+        """
+        Replace every message in a snapshot (or any nested dicts and lists) with a reference, adding it to the store.
+
+        :param value: A snapshot dictionary with message objects or messages serialized with to_json()
+        :return: A copy of the value with {"$message": hash} references instead of the messages
+        """
+        if isinstance(value, BaseMessage) or is_message(value):
+            return {MESSAGE_REF_KEY: self.add(value)}
+        if isinstance(value, dict):
+            return {key: self.to_ref(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.to_ref(item) for item in value]
+        return value
+
+    def resolve(self, value: Any) -> Any:
+        """
+        Replace every reference in a snapshot reference with the serialized message.
+
+        :param value: A snapshot reference
+        :return: A copy of the value with the messages serialized with to_json(), as the snapshot was before to_ref
+        """
+        if is_message_ref(value):
+            return self.get_serialized(value[MESSAGE_REF_KEY])
+        if isinstance(value, dict):
+            return {key: self.resolve(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(item) for item in value]
+        return value
+
+
+def get_message_refs(snapshot_ref: Dict[str, Any]) -> List[str]:
+    """
+    Return the message hashes of the 'messages' field of a snapshot reference in order.
+    """
+    messages = (snapshot_ref.get('values') or {}).get(MESSAGES_FIELD) or []
+    return [message[MESSAGE_REF_KEY] for message in messages if is_message_ref(message)]
+
+
+def diff_snapshot_refs(old_ref: Dict[str, Any], new_ref: Dict[str, Any]) -> SnapshotDiff:
+    """
+    Compare the messages of two snapshot references by their hashes, no message is loaded.
+
+    The messages field is append-only between the checkpoints of one thread, so the diff is usually a common part
+    and the messages added after it.
+
+    :param old_ref: The reference of the earlier snapshot
+    :param new_ref: The reference of the later snapshot
+    :return: The length of the common part and the hashes removed from the old and added in the new snapshot
+    """
+    old_keys, new_keys = get_message_refs(old_ref), get_message_refs(new_ref)
+    common = 0
+    for old_key, new_key in zip(old_keys, new_keys):
+        if old_key != new_key:
+            break
+        common += 1
+    return SnapshotDiff(common, old_keys[common:], new_keys[common:])
@@ -0,0 +1,281 @@
+"""
+Binary format of the state snapshot files.
+
+    header:  MAGIC (8 bytes) + codec (1 byte)
+    records: kind (1 byte, b'M' message or b'S' snapshot) + payload length (uint32) + payload
+    index:   compressed JSON {"snapshots": [offset, ...], "messages": {hash: offset, ...}}
+    footer:  index offset (uint64) + INDEX_MAGIC (8 bytes)
+
+Every payload is JSON compressed on its own with the codec of the file, so any record can be read with a single seek.
+Snapshots are stored as snapshot references of a MessageStore (see message_store.py): every message is written once
+under its hash and referenced from all the snapshots containing it.
+
+Run from the project root to convert the files written in the legacy JSON format:
+    python -m utils.langraph.snapshot_format resources/states/<file> [<file> ...]
+"""
+import gzip
+import json
+import os
+import struct
+import sys
+import zlib
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is used without it
+    zstandard = None
+
+from constants import SNAPSHOT_CODEC
+from utils.langraph.message_store import MessageStore
+
+MAGIC = b'LGSNAP01'
+INDEX_MAGIC = b'LGSNAPIX'
+RECORD_HEADER = struct.Struct('>cI')  # kind, payload length
+FOOTER = struct.Struct('>Q8s')  # index offset, INDEX_MAGIC
+MESSAGE_RECORD = b'M'
+SNAPSHOT_RECORD = b'S'
+
+CODEC_NONE, CODEC_ZLIB, CODEC_GZIP, CODEC_ZSTD = 0, 1, 2, 3
+CODEC_NAMES = {'none': CODEC_NONE, 'zlib': CODEC_ZLIB, 'gzip': CODEC_GZIP, 'zstd': CODEC_ZSTD}
+
+
+def resolve_codec(codec: Optional[str] = SNAPSHOT_CODEC) -> int:
+    """
+    Return the codec id for the codec name, None selects zstd when it is installed and gzip otherwise.
+    """
+    if codec is None:
+        return CODEC_ZSTD if zstandard is not None else CODEC_GZIP
+    if codec not in CODEC_NAMES:
+        raise ValueError(f'Unknown snapshot codec: {codec}. Supported codecs: {", ".join(CODEC_NAMES)}')
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError("The 'zstd' codec requires the 'zstandard' package.")
+    return CODEC_NAMES[codec]
+
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor().compress(data)
+    if codec == CODEC_GZIP:
+        return gzip.compress(data, mtime=0)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data)
+    return data
+
+
+def _decompress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("The snapshot file is compressed with zstd, which requires the 'zstandard' package.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODEC_GZIP:
+        return gzip.decompress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+def is_binary_snapshot_file(file_path: str) -> bool:
+    """
+    Check whether a file is written in the binary snapshot format.
+    """
+    with open(file_path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+class SnapshotWriter:
+    """
+    Writes snapshots one by one, messages already written to the file are only referenced.
+    """
+
+    def __init__(self, file_path: str, codec: Optional[str] = SNAPSHOT_CODEC, mode: str = 'xb'):
+        """
+        Create the file and write its header.
+
+        :param file_path: The path of the new file
+        :param codec: 'zstd', 'gzip', 'zlib' or 'none', None selects zstd when it is installed and gzip otherwise
+        :param mode: The mode of open(), 'xb' does not overwrite an existing file
+        """
+        self._codec = resolve_codec(codec)
+        self._file: BinaryIO = open(file_path, mode)
+        self._file.write(MAGIC + bytes([self._codec]))
+        self._snapshot_offsets: List[int] = []
+        self._message_offsets: Dict[str, int] = {}
+        self.messages = MessageStore(on_add=self._write_message)
+
+    def __enter__(self) -> 'SnapshotWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Write a snapshot converted to JSON-serializable values, e.g. a record of the legacy format.
+
+        :param snapshot: The snapshot dictionary, its messages are written only if the file does not have them yet
+        :return: The snapshot reference that was written
+        """
+        snapshot_ref = self.messages.to_ref(snapshot)
+        self.write_ref(snapshot_ref)
+        return snapshot_ref
+
+    def write_ref(self, snapshot_ref: Dict[str, Any]) -> None:
+        """
+        Write a snapshot reference whose messages were added to self.messages.
+        """
+        self._snapshot_offsets.append(self._write_record(SNAPSHOT_RECORD, snapshot_ref))
+
+    def close(self) -> None:
+        """
+        Write the index and the footer and close the file.
+        """
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        index = {'snapshots': self._snapshot_offsets, 'messages': self._message_offsets}
+        self._file.write(_compress(self._codec, json.dumps(index).encode('utf-8')))
+        self._file.write(FOOTER.pack(index_offset, INDEX_MAGIC))
+        self._file.close()
+
+    def _write_message(self, key: str, message: Dict[str, Any]) -> None:
+        self._message_offsets[key] = self._write_record(MESSAGE_RECORD, message)
+
+    def _write_record(self, kind: bytes, value: Any) -> int:
+        offset = self._file.tell()
+        payload = _compress(self._codec, json.dumps(value).encode('utf-8'))
+        self._file.write(RECORD_HEADER.pack(kind, len(payload)))
+        self._file.write(payload)
+        return offset
+
+
+class SnapshotReader:
+    """
+    Random access to the snapshots of a binary snapshot file.
+
+    Opening the file reads only the footer and the offset index, every snapshot is read with one seek and its
+    messages with one seek each. Messages that were read once stay in self.messages, so reading the whole history
+    reads every message once.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Open the file and read its index.
+
+        :param file_path: The path of a file written by SnapshotWriter
+        """
+        self._file: BinaryIO = open(file_path, 'rb')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f'{file_path} is not a binary snapshot file.')
+        self._codec = self._file.read(1)[0]
+
+        self._file.seek(-FOOTER.size, os.SEEK_END)
+        footer_offset = self._file.tell()
+        index_offset, index_magic = FOOTER.unpack(self._file.read(FOOTER.size))
+        if index_magic != INDEX_MAGIC:
+            self._file.close()
+            raise ValueError(f'{file_path} has no index, the file was not closed properly.')
+        self._file.seek(index_offset)
+        index = json.loads(_decompress(self._codec, self._file.read(footer_offset - index_offset)))
+        self._snapshot_offsets: List[int] = index['snapshots']
+        self._message_offsets: Dict[str, int] = index['messages']
+        self.messages = MessageStore(loader=self._read_message)
+
+    def __enter__(self) -> 'SnapshotReader':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._snapshot_offsets)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for position in range(len(self)):
+            yield self.get(position)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def get(self, position: int) -> Dict[str, Any]:
+        """
+        Read the snapshot at the position with its messages restored.
+
+        :param position: The position of the snapshot in the file, negative positions count from the end
+        :return: The snapshot dictionary in the same form as it was written
+        """
+        return self.messages.resolve(self.get_ref(position))
+
+    def get_ref(self, position: int) -> Dict[str, Any]:
+        """
+        Read the snapshot reference at the position, no message is read.
+
+        :param position: The position of the snapshot in the file, negative positions count from the end
+        :return: The snapshot with {"$message": hash} references, resolved with self.messages
+        """
+        return self._read_record(self._snapshot_offsets[position], SNAPSHOT_RECORD)
+
+    def message_keys(self) -> List[str]:
+        """
+        Return the hashes of all the messages in the file in the order they were written.
+        """
+        return list(self._message_offsets)
+
+    def _read_message(self, key: str) -> Dict[str, Any]:
+        return self._read_record(self._message_offsets[key], MESSAGE_RECORD)
+
+    def _read_record(self, offset: int, expected_kind: bytes) -> Any:
+        self._file.seek(offset)
+        kind, length = RECORD_HEADER.unpack(self._file.read(RECORD_HEADER.size))
+        if kind != expected_kind:
+            raise ValueError(f'Unexpected record {kind!r} at offset {offset}.')
+        return json.loads(_decompress(self._codec, self._file.read(length)))
+
+
+def iter_legacy_snapshots(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the snapshots of a file in the legacy format, JSON documents separated with blank lines.
+
+    The documents are parsed one after another with raw_decode, so blank lines inside messages do not break them.
+
+    :param file_path: The path of the legacy file
+    """
+    with open(file_path, 'r') as file:
+        text = file.read()
+
+    decoder = json.JSONDecoder()
+    position = 0
+    while True:
+        # Skip the separator between the documents
+        while position < len(text) and text[position].isspace():
+            position += 1
+        if position >= len(text):
+            return
+        snapshot, position = decoder.raw_decode(text, position)
+        yield snapshot
+
+
+def convert_snapshot_file(file_path: str, output_path: Optional[str] = None, codec: Optional[str] = SNAPSHOT_CODEC) -> str:
+    """
+    Convert a file in the legacy JSON format into the binary format.
+
+    :param file_path: The path of the legacy file
+    :param output_path: The path of the new file, defaults to file_path with the '.lgsnap' extension
+    :param codec: The codec of the new file
+    :return: The path of the new file
+    """
+    output_path = output_path or f'{file_path}.lgsnap'
+    with SnapshotWriter(output_path, codec=codec) as writer:
+        for snapshot in iter_legacy_snapshots(file_path):
+            writer.write(snapshot)
+    return output_path
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        if is_binary_snapshot_file(path):
+            print(f'{path} is already in the binary format')
+            continue
+        converted_path = convert_snapshot_file(path)
+        print(f'{path} ({os.path.getsize(path)} bytes) -> {converted_path} ({os.path.getsize(converted_path)} bytes)')
@@ -0,0 +1,136 @@
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool, tool as create_tool
+from langgraph.errors import GraphInterrupt
+from pydantic import ValidationError
+from pydantic.v1 import ValidationError as ValidationErrorV1
+
+from utils.instrumentation import record_tool_duration
+
+logger = logging.getLogger(__name__)
+
+# Called after every tool call with the name of the tool, the duration in seconds and whether the call failed
+ToolCallHook = Callable[[str, float, bool], None]
+
+INVALID_TOOL_MESSAGE = 'Error: {name} is not a valid tool, try one of [{names}].'
+INVALID_ARGUMENTS_MESSAGE = 'Error: invalid arguments of {name}: {error}\n Please fix your mistakes.'
+TOOL_ERROR_MESSAGE = 'Error: {error!r}\n Please fix your mistakes.'
+
+
+class ToolDispatcher:
+    """
+    Executes the tool calls of an AI message, built once per graph and shared by all the executions of its tool node.
+
+    The tools are indexed by name when the dispatcher is created, so a call costs a dictionary lookup before the tool
+    validates its arguments once in invoke. Every call is timed and passed to the hooks (by default the metrics of
+    the current run). A call of an unknown tool, with invalid arguments or raising an exception returns a ToolMessage
+    with the error status instead of raising: the other calls of the same message are not affected and the agent can
+    correct the call.
+    """
+
+    def __init__(self, tools: Sequence[Union[BaseTool, Callable]], hooks: Optional[Sequence[ToolCallHook]] = None):
+        """
+        Index the tools.
+
+        :param tools: The tools, a function is converted with the @tool decorator as ToolExecutor does
+        :param hooks: Receive the name, the duration and the failure flag of every call, defaults to the run metrics
+        """
+        self._tools: Dict[str, BaseTool] = {}
+        for tool_ in tools:
+            tool_ = tool_ if isinstance(tool_, BaseTool) else create_tool(tool_)
+            self._tools[tool_.name] = tool_
+        self._hooks = (record_tool_duration,) if hooks is None else tuple(hooks)
+        self._tool_names = ', '.join(self._tools)
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return tuple(self._tools)
+
+    def invoke(self, tool_call: Dict[str, Any]) -> ToolMessage:
+        """
+        Execute a tool call.
+
+        :param tool_call: The tool call of an AIMessage with the 'name', 'args' and 'id' keys
+        :return: The result of the tool, or the error of the call
+        """
+        start = time.perf_counter()
+        tool_, error = self._resolve(tool_call)
+        if tool_ is not None:
+            try:
+                response = tool_.invoke(tool_call['args'])
+            except GraphInterrupt:
+                raise
+            except (ValidationError, ValidationErrorV1) as e:
+                error = INVALID_ARGUMENTS_MESSAGE.format(name=tool_call['name'], error=e)
+            except Exception as e:
+                error = self._tool_error(tool_call, e)
+            else:
+                return self._finish(tool_call, start, content=str(response))
+        return self._finish(tool_call, start, content=error, failed=True)
+
+    async def ainvoke(self, tool_call: Dict[str, Any]) -> ToolMessage:
+        """
+        Await a tool call, the async variant of invoke.
+
+        :param tool_call: The tool call of an AIMessage with the 'name', 'args' and 'id' keys
+        :return: The result of the tool, or the error of the call
+        """
+        start = time.perf_counter()
+        tool_, error = self._resolve(tool_call)
+        if tool_ is not None:
+            try:
+                response = await tool_.ainvoke(tool_call['args'])
+            except GraphInterrupt:
+                raise
+            except (ValidationError, ValidationErrorV1) as e:
+                error = INVALID_ARGUMENTS_MESSAGE.format(name=tool_call['name'], error=e)
+            except Exception as e:
+                error = self._tool_error(tool_call, e)
+            else:
+                return self._finish(tool_call, start, content=str(response))
+        return self._finish(tool_call, start, content=error, failed=True)
+
+    def _resolve(self, tool_call: Dict[str, Any]) -> Tuple[Optional[BaseTool], Optional[str]]:
+        """
+        Look the tool of the call up. Its arguments are validated by the tool in invoke, a validation error is
+        returned as INVALID_ARGUMENTS_MESSAGE.
+
+        :return: The tool, or None and the error message
+        """
+        name = tool_call['name']
+        tool_ = self._tools.get(name)
+        if tool_ is None:
+            return None, INVALID_TOOL_MESSAGE.format(name=name, names=self._tool_names)
+        return tool_, None
+
+    @staticmethod
+    def _tool_error(tool_call: Dict[str, Any], error: Exception) -> str:
+        logger.warning(f'The tool call {tool_call["name"]} ({tool_call["id"]}) failed: {error!r}')
+        return TOOL_ERROR_MESSAGE.format(error=error)
+
+    def _finish(self, tool_call: Dict[str, Any], start: float, content: str, failed: bool = False) -> ToolMessage:
+        duration = time.perf_counter() - start
+        for hook in self._hooks:
+            try:
+                hook(tool_call['name'], duration, failed)
+            except Exception as e:
+                logger.warning(f'A tool call hook failed: {e!r}')
+        return ToolMessage(
+            content=content,
+            name=tool_call['name'],
+            tool_call_id=tool_call['id'],
+            status='error' if failed else 'success'
+        )
+
+
+def as_tool_dispatcher(tools: Union[ToolDispatcher, Sequence[Union[BaseTool, Callable]]]) -> ToolDispatcher:
+    """
+    Return the dispatcher, or a new dispatcher of the tools.
+
+    :param tools: The dispatcher built with the graph, or the tools of a node created without one
+    :return: The dispatcher
+    """
+    return tools if isinstance(tools, ToolDispatcher) else ToolDispatcher(tools)
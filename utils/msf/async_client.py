@@ -0,0 +1,373 @@
+import asyncio
+import logging
+import time
+import uuid
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+import aiohttp
+import msgpack
+from pymetasploit3.msfrpc import MsfAuthError, MsfRpcError, MsfRpcMethod
+
+from constants import MSF_CONSOLE_POOL_SIZE, MSF_CONSOLE_BUSY_TIMEOUT, MSF_CONSOLE_DRAIN_TIMEOUT, MSF_RPC_URI, \
+    MSF_RPC_USERNAME, MSF_RPC_REQUEST_TIMEOUT, MSF_RPC_MAX_CONNECTIONS, MSF_RPC_RETRIES, MSF_CONSOLE_MAX_LEASES
+from utils.msf.classes import get_msf_connection_settings
+
+logger = logging.getLogger(__name__)
+
+RPC_HEADERS = {'Content-Type': 'binary/message-pack'}
+
+# Methods that can be sent again after a failure whose effect on msfrpcd is unknown, e.g. a timeout after the request
+# was sent: a repeated console.write or module.execute would run the command twice
+IDEMPOTENT_RPC_METHODS = frozenset({MsfRpcMethod.ConsoleRead, MsfRpcMethod.AuthLogin, MsfRpcMethod.AuthTokenAdd})
+
+# Clients shared by the coroutines of an event loop, an aiohttp session cannot be used by another loop
+_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncMsfRpcClient]' = weakref.WeakKeyDictionary()
+
+
+class AsyncMsfRpcClient:
+    """
+    An asyncio client of the msfrpcd msgpack-RPC API.
+
+    It speaks the same protocol as pymetasploit3.MsfRpcClient (a msgpack list [method, token, *args] posted to the
+    API URI), but all the requests go through one aiohttp session, so a single event loop can poll dozens of consoles
+    without a thread per module run. Like the synchronous client, it logs in lazily and replaces the temporary token
+    with a permanent one.
+    """
+
+    def __init__(self, password: str, host: str = '127.0.0.1', port: int = 55553, ssl: bool = False,
+                 username: str = MSF_RPC_USERNAME, uri: str = MSF_RPC_URI,
+                 request_timeout: float = MSF_RPC_REQUEST_TIMEOUT, max_connections: int = MSF_RPC_MAX_CONNECTIONS):
+        """
+        Initialize the client. No connection is opened until the first call.
+
+        :param password: The password of msfrpcd
+        :param host: The host of msfrpcd
+        :param port: The port of msfrpcd
+        :param ssl: Whether msfrpcd is served over HTTPS
+        :param username: The user of msfrpcd
+        :param uri: The URI of the API
+        :param request_timeout: Seconds of a single request
+        :param max_connections: The maximum number of simultaneous HTTP connections
+        """
+        self._password = password
+        self._username = username
+        self._url = f'{"https" if ssl else "http"}://{host}:{port}{uri}'
+        self._request_timeout = request_timeout
+        self._max_connections = max_connections
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._token: Optional[str] = None
+        self._login_lock = asyncio.Lock()
+        self._console_pool: Optional[AsyncMsfConsolePool] = None
+
+    @classmethod
+    def from_env(cls) -> 'AsyncMsfRpcClient':
+        """
+        Create a client with the connection settings of the environment variables, as CustomMsfRpcClient does.
+        """
+        password, host, port, ssl = get_msf_connection_settings()
+        return cls(password=password, host=host, port=port, ssl=ssl)
+
+    async def call(self, method: str, *args: Any) -> Dict[str, Any]:
+        """
+        Call an RPC method, logging in first if needed.
+
+        :param method: The method, e.g. MsfRpcMethod.ConsoleRead
+        :param args: The arguments of the method after the token
+        :return: The decoded response, an error response of msfrpcd is returned as it is
+        """
+        if self._token is None:
+            await self.login()
+        return await self._post([method, self._token, *args])
+
+    async def login(self) -> None:
+        """
+        Log in and replace the temporary token with a permanent one, which does not expire between polls.
+        """
+        async with self._login_lock:
+            if self._token is not None:
+                return
+            auth = await self._post([MsfRpcMethod.AuthLogin, self._username, self._password])
+            if auth.get('result') != 'success':
+                raise MsfAuthError('MsfRPC: Authentication failed')
+            token = str(uuid.uuid4())
+            await self._post([MsfRpcMethod.AuthTokenAdd, auth['token'], token])
+            self._token = token
+
+    async def create_console(self) -> 'AsyncMsfConsole':
+        """
+        Create a new msfconsole.
+
+        :return: The console, its banner is not read yet
+        """
+        response = await self.call(MsfRpcMethod.ConsoleCreate)
+        if 'id' not in response:
+            raise MsfRpcError('Unable to create a new console.')
+        return AsyncMsfConsole(self, response['id'])
+
+    def get_console_pool(self) -> 'AsyncMsfConsolePool':
+        """
+        Returns the pool of consoles of the client, creating it on the first call.
+        """
+        if self._console_pool is None:
+            self._console_pool = AsyncMsfConsolePool(self)
+        return self._console_pool
+
+    async def close(self) -> None:
+        """
+        Destroy the idle consoles and close the HTTP session.
+        """
+        if self._console_pool is not None:
+            await self._console_pool.close()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self) -> 'AsyncMsfRpcClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._max_connections, ssl=False),
+                timeout=aiohttp.ClientTimeout(total=self._request_timeout)
+            )
+        return self._session
+
+    async def _post(self, request: list) -> Dict[str, Any]:
+        """
+        Post a request, retrying failed attempts: any connection error or timeout of an idempotent method, and for the
+        other methods only a failure to connect, in which case the request was never sent.
+        """
+        payload = msgpack.packb(request)
+        retried_errors = (aiohttp.ClientError, asyncio.TimeoutError) if request[0] in IDEMPOTENT_RPC_METHODS \
+            else aiohttp.ClientConnectorError
+        delay = 1
+        for attempt in range(1, MSF_RPC_RETRIES + 1):
+            try:
+                # msfrpcd answers errors with HTTP 500 and a msgpack body, so the status is not checked
+                async with self._get_session().post(self._url, data=payload, headers=RPC_HEADERS) as response:
+                    body = await response.read()
+                break
+            except retried_errors as e:
+                if attempt == MSF_RPC_RETRIES:
+                    raise
+                logger.warning(f'The RPC request {request[0]} failed ({e!r}), retrying in {delay} s')
+                await asyncio.sleep(delay)
+                delay *= 2
+        return _to_str(msgpack.unpackb(body, raw=False, strict_map_key=False, unicode_errors='replace'))
+
+
+def _to_str(value: Any) -> Any:
+    """
+    Decode the byte strings that msgpack returned as binary values, as pymetasploit3 does.
+    """
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, dict):
+        return {_to_str(key): _to_str(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_str(item) for item in value]
+    return value
+
+
+class AsyncMsfConsole:
+    """
+    An msfconsole driven by AsyncMsfRpcClient, the asyncio counterpart of pymetasploit3.MsfConsole.
+    """
+
+    def __init__(self, client: AsyncMsfRpcClient, cid: str):
+        self.client = client
+        self.cid = cid
+
+    async def read(self) -> Dict[str, Any]:
+        """
+        Read the pending data of the console.
+
+        :return: The response with the 'data', 'prompt' and 'busy' keys, or an error response
+        """
+        return await self.client.call(MsfRpcMethod.ConsoleRead, self.cid)
+
+    async def write(self, command: str) -> None:
+        if not command.endswith('\n'):
+            command += '\n'
+        await self.client.call(MsfRpcMethod.ConsoleWrite, self.cid, command)
+
+    async def destroy(self) -> None:
+        await self.client.call(MsfRpcMethod.ConsoleDestroy, self.cid)
+
+
+class AsyncMsfConsolePool:
+    """
+    A pool of msfconsole sessions that are kept alive between module runs, the asyncio counterpart of MsfConsolePool.
+
+    Consoles are handed out with acquire()/lease() and returned with release(), which resets the module context with
+    'back' and drains the console. A console that is still busy longer than busy_timeout after its return, or that
+    does not answer a read, is destroyed. At most max_leases consoles are handed out at the same time, acquire() waits
+    for a release above it, so a burst of module runs does not create a console per waiting coroutine. Only the event
+    loop of the client may use the pool.
+    """
+
+    def __init__(self, client: AsyncMsfRpcClient, size: int = MSF_CONSOLE_POOL_SIZE,
+                 busy_timeout: float = MSF_CONSOLE_BUSY_TIMEOUT, drain_timeout: float = MSF_CONSOLE_DRAIN_TIMEOUT,
+                 max_leases: int = MSF_CONSOLE_MAX_LEASES):
+        """
+        Initialize the pool. No console is created until acquire() is called.
+
+        :param client: The client used to create consoles
+        :param size: The number of idle consoles kept alive
+        :param busy_timeout: Seconds a returned console may stay busy before it is replaced
+        :param drain_timeout: Seconds to wait for the prompt after creating or resetting a console
+        :param max_leases: The maximum number of consoles handed out at the same time
+        """
+        self._client = client
+        self._size = size
+        self._busy_timeout = busy_timeout
+        self._drain_timeout = drain_timeout
+        self._idle: Deque[Tuple[AsyncMsfConsole, float]] = deque()  # (console, time of return)
+        self._leases = asyncio.Semaphore(max(1, max_leases))
+
+    async def acquire(self) -> AsyncMsfConsole:
+        """
+        Hand out a healthy idle console or create a new one if none is available, waiting while max_leases consoles
+        are handed out. Every acquired console must be returned with release().
+
+        :return: A console positioned at the msfconsole prompt
+        """
+        await self._leases.acquire()
+        try:
+            return await self._acquire()
+        except BaseException:
+            self._leases.release()
+            raise
+
+    async def _acquire(self) -> AsyncMsfConsole:
+        for _ in range(len(self._idle)):
+            if not self._idle:
+                break
+            candidate, returned_at = self._idle.popleft()
+            state = await self._check_health(candidate, returned_at)
+            if state == 'ready':
+                return candidate
+            if state == 'busy':
+                # Still finishing the previous command, give it more time
+                self._idle.append((candidate, returned_at))
+            else:
+                await self._destroy(candidate)
+
+        console = await self._client.create_console()
+        # Read the banner, so it does not end up in the output of the first module run
+        await self._drain(console)
+        return console
+
+    async def release(self, console: AsyncMsfConsole, reusable: bool = True) -> None:
+        """
+        Return a console to the pool.
+
+        :param console: The console obtained from acquire()
+        :param reusable: False if the console must be destroyed (e.g. the module run timed out or failed)
+        """
+        try:
+            await self._release(console, reusable)
+        finally:
+            self._leases.release()
+
+    async def _release(self, console: AsyncMsfConsole, reusable: bool) -> None:
+        keep = False
+        if reusable and len(self._idle) < self._size:
+            try:
+                # Leave the module context, so the next lease starts at the main prompt
+                await console.write('back\n')
+                keep = await self._drain(console)
+            except Exception as e:
+                logger.warning(f'Console {console.cid} could not be reset: {e}')
+
+        if keep and len(self._idle) < self._size:
+            self._idle.append((console, time.monotonic()))
+        else:
+            await self._destroy(console)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[AsyncMsfConsole]:
+        """
+        Context manager around acquire()/release(). The console is destroyed if the block raises.
+        """
+        console = await self.acquire()
+        reusable = False
+        try:
+            yield console
+            reusable = True
+        finally:
+            await self.release(console, reusable=reusable)
+
+    async def close(self) -> None:
+        """
+        Destroy all idle consoles.
+        """
+        consoles = [console for console, _ in self._idle]
+        self._idle.clear()
+        await asyncio.gather(*(self._destroy(console) for console in consoles))
+
+    async def _check_health(self, console: AsyncMsfConsole, returned_at: float) -> str:
+        """
+        Classify an idle console as 'ready', 'busy' or 'dead'.
+        """
+        try:
+            response = await console.read()
+        except Exception:
+            return 'dead'
+        if 'busy' not in response:
+            # The console was destroyed on the server side
+            return 'dead'
+        if response['busy']:
+            return 'dead' if time.monotonic() - returned_at > self._busy_timeout else 'busy'
+        return 'ready'
+
+    async def _drain(self, console: AsyncMsfConsole) -> bool:
+        """
+        Read the console until it is idle and has no pending data.
+
+        :return: True if the console reached the prompt within drain_timeout
+        """
+        deadline = time.monotonic() + self._drain_timeout
+        interval = 0.05
+        while time.monotonic() < deadline:
+            response = await console.read()
+            if 'busy' not in response:
+                return False
+            if not response['busy'] and not response.get('data'):
+                return True
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, 0.5)
+        return False
+
+    async def _destroy(self, console: AsyncMsfConsole) -> None:
+        try:
+            await console.destroy()
+        except Exception as e:
+            logger.warning(f'Console {console.cid} could not be destroyed: {e}')
+
+
+def get_async_msf_client() -> AsyncMsfRpcClient:
+    """
+    Returns the client of the running event loop, creating it from the environment variables on the first call.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncMsfRpcClient.from_env()
+        _clients[loop] = client
+    return client
+
+
+async def close_async_msf_client() -> None:
+    """
+    Close the client of the running event loop, e.g. at the end of an asyncio.run() of a graph.
+    """
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
@@ -1,9 +1,17 @@
+import logging
 import os
 import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Tuple
 
-from pymetasploit3.msfrpc import MsfRpcClient
+from pymetasploit3.msfrpc import MsfRpcClient, MsfConsole
 
-from constants import PASSWORD, HOST, PORT, SSL, FALSE
+from constants import PASSWORD, HOST, PORT, SSL, FALSE, MSF_CONSOLE_POOL_SIZE, MSF_CONSOLE_BUSY_TIMEOUT, \
+    MSF_CONSOLE_DRAIN_TIMEOUT
+
+logger = logging.getLogger(__name__)
 
 
 class CustomMsfRpcClient:
@@ -36,28 +44,300 @@ class CustomMsfRpcClient:
         """
         return self.client
 
+    def create_client(self) -> MsfRpcClient:
+        """
+        Creates a new MsfRpcClient with the same connection settings, e.g. for a worker thread of its own.
+
+        :return: A new instance of MsfRpcClient
+        """
+        return MsfRpcClient(
+            password=self.password,
+            host=self.host,
+            port=self.port,
+            ssl=self.ssl
+        )
+
+    def get_console_pool(self) -> 'MsfConsolePool':
+        """
+        Returns the shared pool of pre-warmed consoles, creating it on the first call.
+
+        :return: An instance of MsfConsolePool bound to the initialized MsfRpcClient
+        """
+        with self._lock:
+            if getattr(self, 'console_pool', None) is None:
+                self.console_pool = MsfConsolePool(self.client)
+                self.console_pool.warm_up(background=True)
+        return self.console_pool
+
     def _get_env_vars(self):
         """
         Retrieves environment variables required for MsfRpcClient initialization.
         """
-        self.password = os.getenv(PASSWORD)
-        self.host = os.getenv(HOST)
-        port_str = os.getenv(PORT)
-        ssl_str = os.getenv(SSL, FALSE).lower()
+        self.password, self.host, self.port, self.ssl = get_msf_connection_settings()
+
+
+def get_msf_connection_settings() -> Tuple[str, str, int, bool]:
+    """
+    Reads the msfrpcd connection settings from the environment variables.
+
+    :return: The password, the host, the port and whether SSL is used
+    """
+    password = os.getenv(PASSWORD)
+    host = os.getenv(HOST)
+    port_str = os.getenv(PORT)
+    ssl_str = os.getenv(SSL, FALSE).lower()
+
+    if port_str is None:
+        raise ValueError("Environment variable 'PORT' is not set.")
+    try:
+        port = int(port_str)
+    except ValueError:
+        raise ValueError(f"Invalid PORT value: {port_str}")
+
+    if ssl_str not in ['true', 'false']:
+        raise ValueError(f"Invalid SSL value: {ssl_str}. Must be 'true' or 'false'.")
+
+    # Optional: Validate that required environment variables are set
+    if not all([password, host]):
+        missing = [var for var in [PASSWORD, HOST] if not os.getenv(var)]
+        raise ValueError(f"Missing environment variables: {', '.join(missing)}")
+    return password, host, port, ssl_str == 'true'
+
+
+class MsfConsolePool:
+    """
+    A pool of msfconsole sessions that are kept alive between module runs.
+
+    Creating a console over RPC is one of the slowest steps of a tool call, so consoles are created once, handed out
+    with acquire()/lease() and returned with release(). On return the module context is reset with 'back' and the
+    console is drained, so the next lease starts at a clean prompt. A console that is still busy longer than
+    busy_timeout after its return, or that does not answer a read, is destroyed and replaced.
+    """
+
+    def __init__(self, client: MsfRpcClient, size: int = MSF_CONSOLE_POOL_SIZE,
+                 busy_timeout: float = MSF_CONSOLE_BUSY_TIMEOUT, drain_timeout: float = MSF_CONSOLE_DRAIN_TIMEOUT):
+        """
+        Initialize the pool. No console is created until warm_up() or acquire() is called.
+
+        :param client: The MsfRpcClient used to create consoles
+        :param size: The number of idle consoles kept alive
+        :param busy_timeout: Seconds a returned console may stay busy before it is replaced
+        :param drain_timeout: Seconds to wait for the prompt after creating or resetting a console
+        """
+        self._client = client
+        self._size = size
+        self._busy_timeout = busy_timeout
+        self._drain_timeout = drain_timeout
+        self._idle: Deque[Tuple[MsfConsole, float]] = deque()  # (console, time of return)
+        self._lock = threading.Lock()
+
+        # metrics
+        self._leases = 0
+        self._hits = 0
+        self._misses = 0
+        self._replaced = 0
+        self._lease_latency_total = 0.0
+        self._lease_latency_max = 0.0
+        self._returns = 0
+        self._return_latency_total = 0.0
+        self._return_latency_max = 0.0
+
+    def warm_up(self, background: bool = False) -> None:
+        """
+        Fill the pool with idle consoles.
+
+        :param background: Create the consoles in a daemon thread instead of blocking the caller
+        """
+        if background:
+            threading.Thread(target=self.warm_up, name='msf-console-pool-warm-up', daemon=True).start()
+            return
+
+        while True:
+            with self._lock:
+                if len(self._idle) >= self._size:
+                    return
+            try:
+                console = self._create_console()
+            except Exception as e:
+                logger.error(f'Console pool warm-up failed: {e}')
+                return
+            with self._lock:
+                if len(self._idle) >= self._size:
+                    extra = console
+                else:
+                    self._idle.append((console, time.monotonic()))
+                    extra = None
+            if extra is not None:
+                self._destroy(extra)
+                return
+
+    def acquire(self) -> MsfConsole:
+        """
+        Hand out a healthy idle console or create a new one if none is available.
 
-        if port_str is None:
-            raise ValueError("Environment variable 'PORT' is not set.")
+        :return: A console positioned at the msfconsole prompt
+        """
+        start = time.perf_counter()
+        console = None
+        hit = False
+
+        with self._lock:
+            candidates = len(self._idle)
+        for _ in range(candidates):
+            with self._lock:
+                if not self._idle:
+                    break
+                candidate, returned_at = self._idle.popleft()
+            state = self._check_health(candidate, returned_at)
+            if state == 'ready':
+                console, hit = candidate, True
+                break
+            if state == 'busy':
+                # Still finishing the previous command, give it more time
+                with self._lock:
+                    self._idle.append((candidate, returned_at))
+            else:
+                self._destroy(candidate)
+                with self._lock:
+                    self._replaced += 1
+
+        if console is None:
+            console = self._create_console()
+
+        latency = time.perf_counter() - start
+        with self._lock:
+            self._leases += 1
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+            self._lease_latency_total += latency
+            self._lease_latency_max = max(self._lease_latency_max, latency)
+        return console
+
+    def release(self, console: MsfConsole, reusable: bool = True) -> None:
+        """
+        Return a console to the pool.
+
+        :param console: The console obtained from acquire()
+        :param reusable: False if the console must be destroyed (e.g. the module run timed out or failed)
+        """
+        start = time.perf_counter()
+        keep = False
+        pool_full = False
+        if reusable:
+            try:
+                # Leave the module context, so the next lease starts at the main prompt
+                console.write('back\n')
+                keep = self._drain(console)
+            except Exception as e:
+                logger.warning(f'Console {console.cid} could not be reset: {e}')
+
+        if keep:
+            with self._lock:
+                pool_full = len(self._idle) >= self._size
+                if not pool_full:
+                    self._idle.append((console, time.monotonic()))
+        if not keep or pool_full:
+            self._destroy(console)
+
+        latency = time.perf_counter() - start
+        with self._lock:
+            self._returns += 1
+            self._return_latency_total += latency
+            self._return_latency_max = max(self._return_latency_max, latency)
+            if not keep:
+                self._replaced += 1
+
+        if not keep:
+            # Replace the broken console, so the pool stays warm for the next lease
+            self.warm_up(background=True)
+
+    @contextmanager
+    def lease(self) -> Iterator[MsfConsole]:
+        """
+        Context manager around acquire()/release(). The console is destroyed if the block raises.
+        """
+        console = self.acquire()
+        reusable = False
         try:
-            self.port = int(port_str)
-        except ValueError:
-            raise ValueError(f"Invalid PORT value: {port_str}")
+            yield console
+            reusable = True
+        finally:
+            self.release(console, reusable=reusable)
 
-        if ssl_str not in ['true', 'false']:
-            raise ValueError(f"Invalid SSL value: {ssl_str}. Must be 'true' or 'false'.")
-        self.ssl = ssl_str == 'true'
+    def get_metrics(self) -> Dict[str, float]:
+        """
+        Return lease/return latency and hit rate statistics of the pool.
 
-        # Optional: Validate that required environment variables are set
-        if not all([self.password, self.host]):
-            missing = [var for var in [PASSWORD, HOST] if not os.getenv(var)]
-            raise ValueError(f"Missing environment variables: {', '.join(missing)}")
+        :return: Dictionary with counters and latencies in milliseconds
+        """
+        with self._lock:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'leases': self._leases,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / self._leases if self._leases else 0.0,
+                'replaced': self._replaced,
+                'avg_lease_latency_ms': 1000 * self._lease_latency_total / self._leases if self._leases else 0.0,
+                'max_lease_latency_ms': 1000 * self._lease_latency_max,
+                'avg_return_latency_ms': 1000 * self._return_latency_total / self._returns if self._returns else 0.0,
+                'max_return_latency_ms': 1000 * self._return_latency_max
+            }
+
+    def close(self) -> None:
+        """
+        Destroy all idle consoles.
+        """
+        with self._lock:
+            consoles = [console for console, _ in self._idle]
+            self._idle.clear()
+        for console in consoles:
+            self._destroy(console)
+
+    def _create_console(self) -> MsfConsole:
+        console = self._client.consoles.console()
+        # Read the banner, so it does not end up in the output of the first module run
+        self._drain(console)
+        return console
+
+    def _check_health(self, console: MsfConsole, returned_at: float) -> str:
+        """
+        Classify an idle console as 'ready', 'busy' or 'dead'.
+        """
+        try:
+            response = console.read()
+        except Exception:
+            return 'dead'
+        if 'busy' not in response:
+            # The console was destroyed on the server side
+            return 'dead'
+        if response['busy']:
+            return 'dead' if time.monotonic() - returned_at > self._busy_timeout else 'busy'
+        return 'ready'
+
+    def _drain(self, console: MsfConsole) -> bool:
+        """
+        Read the console until it is idle and has no pending data.
 
+        :return: True if the console reached the prompt within drain_timeout
+        """
+        deadline = time.monotonic() + self._drain_timeout
+        interval = 0.05
+        while time.monotonic() < deadline:
+            response = console.read()
+            if 'busy' not in response:
+                return False
+            if not response['busy'] and not response.get('data'):
+                return True
+            time.sleep(interval)
+            interval = min(interval * 2, 0.5)
+        return False
+
+    def _destroy(self, console: MsfConsole) -> None:
+        try:
+            console.destroy()
+        except Exception as e:
+            logger.warning(f'Console {console.cid} could not be destroyed: {e}')
@@ -0,0 +1,113 @@
+import time
+from typing import Callable, List, Optional
+
+from constants import EXECUTION_COMPLETION_PHRASES, CONSOLE_POLL_MIN_INTERVAL, CONSOLE_POLL_MAX_INTERVAL, \
+    CONSOLE_POLL_BACKOFF_FACTOR, CONSOLE_OUTPUT_MAX_CHARS
+
+TIMEOUT_MESSAGE = '[TIMEOUT] "Time limit exceeded, exiting the loop."'
+TRUNCATION_MESSAGE = '\n[TRUNCATED] {count} characters of the output were not kept.\n'
+
+
+class ConsoleOutputReader:
+    """
+    Accumulates msfconsole output and decides when the module run is finished.
+
+    The reader keeps the polling policy apart from the transport, so the same logic can drive any console object
+    that returns chunks of data. Polling is tight while data keeps arriving and backs off exponentially while the
+    console is idle. Completion phrases are searched only in the newly received chunk plus a small overlap window
+    taken from the end of the previous data, so the cost of every check does not grow with the output size.
+
+    Only the first max_output_chars characters of the output are kept, every chunk is still passed to on_chunk, so
+    a streaming compressor sees the whole output while the memory held by the reader stays bounded.
+    """
+
+    def __init__(self, timeout: float, completion_phrases: Optional[List[str]] = None,
+                 on_chunk: Optional[Callable[[str], None]] = None, max_output_chars: int = CONSOLE_OUTPUT_MAX_CHARS):
+        """
+        Initialize the reader.
+
+        :param timeout: The maximum number of seconds to wait for a completion phrase
+        :param completion_phrases: Phrases that mark the end of a module run
+        :param on_chunk: Called with every non-empty chunk, e.g. StreamingDataCompressor.feed
+        :param max_output_chars: The maximum number of characters of the output kept by the reader
+        """
+        self.timeout = timeout
+        self.on_chunk = on_chunk
+        self.completion_phrases = completion_phrases or EXECUTION_COMPLETION_PHRASES
+        self._overlap = max(len(phrase) for phrase in self.completion_phrases) - 1
+        self._chunks: List[str] = []
+        self._kept_chars = 0
+        self._dropped_chars = 0
+        self._timed_out = False
+        self.max_output_chars = max_output_chars
+        self._tail = ''
+        self._interval = CONSOLE_POLL_MIN_INTERVAL
+        self._start_time = time.monotonic()
+        self.completed = False
+
+    def feed(self, data: str) -> bool:
+        """
+        Add a chunk of console data and check it for a completion phrase.
+
+        :param data: The data returned by a single console read
+        :return: True if the module run has completed
+        """
+        if not data:
+            # The console is idle, slow the polling down
+            self._interval = min(self._interval * CONSOLE_POLL_BACKOFF_FACTOR, CONSOLE_POLL_MAX_INTERVAL)
+            return self.completed
+
+        self._keep(data)
+        self._interval = CONSOLE_POLL_MIN_INTERVAL
+        if self.on_chunk:
+            self.on_chunk(data)
+
+        # Only the new chunk and the end of the previous data can contain a phrase that was not seen yet
+        window = self._tail + data
+        if any(phrase in window for phrase in self.completion_phrases):
+            self.completed = True
+        self._tail = window[-self._overlap:] if self._overlap else ''
+        return self.completed
+
+    def timed_out(self) -> bool:
+        """
+        Check whether the time limit has been exceeded.
+        """
+        return time.monotonic() - self._start_time > self.timeout
+
+    def mark_timeout(self) -> None:
+        """
+        Append the timeout marker to the collected output.
+        """
+        self._chunks.append(TIMEOUT_MESSAGE)
+        self._timed_out = True
+        if self.on_chunk:
+            self.on_chunk(TIMEOUT_MESSAGE)
+
+    def next_interval(self) -> float:
+        """
+        Return the number of seconds to wait before the next console read.
+        """
+        return self._interval
+
+    def get_output(self) -> str:
+        """
+        Return the collected output as a single string, with a note of the dropped part if it was truncated.
+        """
+        if not self._dropped_chars:
+            return ''.join(self._chunks)
+        # The timeout marker stays at the end, the callers check for it
+        chunks = self._chunks[:-1] if self._timed_out else self._chunks
+        return ''.join([*chunks, TRUNCATION_MESSAGE.format(count=self._dropped_chars),
+                        *([TIMEOUT_MESSAGE] if self._timed_out else [])])
+
+    def _keep(self, data: str) -> None:
+        room = self.max_output_chars - self._kept_chars
+        if room <= 0:
+            self._dropped_chars += len(data)
+            return
+        if len(data) > room:
+            self._dropped_chars += len(data) - room
+            data = data[:room]
+        self._chunks.append(data)
+        self._kept_chars += len(data)
@@ -1,14 +1,30 @@
 import re
-from typing import List, Dict
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Tuple
 
 # Regular expression for splitting lines
 PATTERN_SPLIT_LINES = r'\n'
+# Regular expression for splitting a line into word and separator tokens
+PATTERN_TOKENS = re.compile(r'(\s+|\W+)')
+# Number of lines compressed at once by StreamingDataCompressor, small enough to be filled while a module is running
+STREAMING_BLOCK_LINES = 500
 
 
 class DataCompressor:
+    """
+    Compresses console output by grouping lines that share a common prefix.
+
+    Lines are processed in their original order. Every line that is not consumed yet becomes a leader: the remaining
+    lines that start with its first token are consumed and narrowed down token by token, and each prefix level is
+    written as 'prefix' + comma-separated suffixes of the lines that stop matching at that level.
+
+    Lines are kept in a sorted array, so the lines starting with a prefix form a contiguous range that is found with a
+    binary search, and consumed lines are skipped with a 'next alive' pointer array. The whole compression takes
+    O(n log n) time instead of rescanning the remaining lines for every prefix of every leader.
+    """
+
     def __init__(self):
         self.lines = None
-        self.result_dict: Dict[str, List[str]] = {}
         self.reserve_list: List[str] = []
 
     def start_compressing(self, text: str):
@@ -21,60 +37,179 @@ class DataCompressor:
     def _create_patterns(self, line: str) -> List[str]:
         if not line:
             raise ValueError('text is empty in DataCompressor')
-        return list(filter(None, re.split(r'(\s+|\W+)', line)))
+        return list(filter(None, PATTERN_TOKENS.split(line)))
 
     def _main_loop(self, lines: List[str]):
-        while lines:
-            current_line = lines.pop(0)
-            base_pattern = self._create_patterns(current_line)
-            self._recursive_extract(base_pattern, lines, 1, False)
-            self._cleanup_empty_entries()
-            self._process_result_dict()
-
-    def _cleanup_empty_entries(self):
-        # Remove key-value pairs with empty lists
-        keys_to_remove = [key for key, value in self.result_dict.items() if not value]
-        for key in keys_to_remove:
-            del self.result_dict[key]
-
-    def _process_result_dict(self):
-        if not self.result_dict:
-            return
-        processed_dict = {}
-        for base_pattern, values in self.result_dict.items():
-            value_suffixes = [value.removeprefix(base_pattern) for value in values]
-            processed_string = base_pattern + ', '.join(value_suffixes)
-            self.reserve_list.append(processed_string)
-        self.result_dict = {}
-
-    def _recursive_extract(self, pattern_parts: List[str], lines: List[str], i: int, added_to_reserve: bool):
-        if i > len(pattern_parts):
-            return
-
-        # Create the current pattern based on the first i parts
-        current_pattern = ''.join(pattern_parts[:i])
-        current_pattern_escaped = re.escape(current_pattern)
-
-        # Split lines into matching and non-matching with the current pattern
-        matched_lines = [line for line in lines if re.match(current_pattern_escaped, line)]
-
-        if matched_lines:
-            # Add matching lines to the result dictionary
-            self.result_dict[current_pattern] = matched_lines
-
-            # Remove matching lines from the overall list of lines
-            for line in matched_lines:
-                lines.remove(line)
-
-            # Recursively call the function with an increased number of parts
-            self._recursive_extract(pattern_parts, matched_lines, i + 1, added_to_reserve)
-        else:
-            # Add the entire pattern as a string to the reserve_list if this is the first miss
-            if not added_to_reserve:
-                self.reserve_list.append(''.join(pattern_parts))
-                added_to_reserve = True
-            # Continue recursively to explore further parts of the pattern
-            self._recursive_extract(pattern_parts, lines, i + 1, added_to_reserve)
+        # Positions of the lines in lexicographic order and the position of every line in that order
+        order = sorted(range(len(lines)), key=lines.__getitem__)
+        sorted_lines = [lines[index] for index in order]
+        rank = [0] * len(lines)
+        for position, index in enumerate(order):
+            rank[index] = position
+
+        # next_alive[position] points to the nearest position >= position whose line is not consumed yet
+        next_alive = list(range(len(lines) + 1))
+        consumed = [False] * len(lines)
+
+        for leader in range(len(lines)):
+            if consumed[leader]:
+                continue
+            consumed[leader] = True
+            next_alive[rank[leader]] = rank[leader] + 1
+
+            current_line = lines[leader]
+            pattern_parts = self._create_patterns(current_line)
+
+            # Consume all the remaining lines that start with the first token of the leader
+            low, high = self._prefix_range(sorted_lines, pattern_parts[0], 0, len(sorted_lines))
+            members: List[int] = []
+            position = self._find_alive(next_alive, low)
+            while position < high:
+                index = order[position]
+                consumed[index] = True
+                members.append(index)
+                next_alive[position] = position + 1
+                position = self._find_alive(next_alive, position + 1)
+
+            if not members:
+                self.reserve_list.append(current_line)
+                continue
+
+            self._extract_groups(pattern_parts, [lines[index] for index in members], members)
+
+    def _extract_groups(self, pattern_parts: List[str], member_lines: List[str], members: List[int]):
+        """
+        Narrow the consumed lines down prefix by prefix and write a group for every prefix level.
+
+        :param pattern_parts: Tokens of the leader line
+        :param member_lines: Consumed lines in lexicographic order
+        :param members: Original indexes of the consumed lines, in the same order as member_lines
+        """
+        # Every prefix level is a sub-range of the previous one in the sorted member lines
+        levels: List[Tuple[str, int, int]] = []
+        low, high = 0, len(member_lines)
+        current_pattern = ''
+        for part in pattern_parts:
+            current_pattern += part
+            low, high = self._prefix_range(member_lines, current_pattern, low, high)
+            if low == high:
+                break
+            levels.append((current_pattern, low, high))
+
+        if len(levels) < len(pattern_parts):
+            # The leader itself is kept as a separate line once its prefix stops matching
+            self.reserve_list.append(''.join(pattern_parts))
+
+        for level, (base_pattern, low, high) in enumerate(levels):
+            # A line belongs to the deepest level it matches
+            if level + 1 < len(levels):
+                _, inner_low, inner_high = levels[level + 1]
+                group = [*range(low, inner_low), *range(inner_high, high)]
+            else:
+                group = list(range(low, high))
+            if not group:
+                continue
+            group.sort(key=members.__getitem__)
+            value_suffixes = [member_lines[position].removeprefix(base_pattern) for position in group]
+            self.reserve_list.append(base_pattern + ', '.join(value_suffixes))
+
+    @staticmethod
+    def _prefix_range(sorted_lines: List[str], prefix: str, low: int, high: int) -> Tuple[int, int]:
+        """
+        Find the range of lines starting with the prefix between low and high of a sorted list.
+        """
+        length = len(prefix)
+        start = bisect_left(sorted_lines, prefix, low, high, key=lambda line: line[:length])
+        end = bisect_right(sorted_lines, prefix, start, high, key=lambda line: line[:length])
+        return start, end
+
+    @staticmethod
+    def _find_alive(next_alive: List[int], position: int) -> int:
+        root = position
+        while next_alive[root] != root:
+            root = next_alive[root]
+        # Path compression
+        while next_alive[position] != root:
+            next_alive[position], position = root, next_alive[position]
+        return root
 
     def get_compressed_output(self):
+        if not self.reserve_list:
+            return ''
         return ' ' + self.reserve_list[0] + '\n ' + '\n '.join(self.reserve_list[1:])
+
+
+class StreamingDataCompressor(DataCompressor):
+    """
+    Incremental variant of DataCompressor that is fed with console output while the module is still running.
+
+    Complete lines are collected into blocks of block_size lines, and every full block is compressed as soon as it
+    is filled, so compression overlaps with the module execution and the working set stays bounded by one block.
+    For outputs shorter than one block the result is identical to DataCompressor; longer outputs are grouped within
+    each block.
+
+    If skip_until is given, everything up to and including the first line that ends with it is discarded, e.g. the
+    banner of a new msfconsole, so the caller does not have to compress the output again without it.
+    """
+
+    def __init__(self, block_size: int = STREAMING_BLOCK_LINES, skip_until: Optional[str] = None):
+        """
+        :param block_size: The number of lines compressed at once
+        :param skip_until: The end of the line after which the output is compressed, e.g. the last banner line
+        """
+        super().__init__()
+        self.block_size = max(1, block_size)
+        self.skip_until = skip_until
+        self._pending_line = ''
+        self._block: List[str] = []
+        self._compressed_output: Optional[str] = None
+
+    def feed(self, chunk: str) -> None:
+        """
+        Add a chunk of console output.
+
+        :param chunk: Any part of the output, it does not have to end at a line boundary
+        """
+        if not chunk:
+            return
+        if self._compressed_output is not None:
+            raise ValueError('StreamingDataCompressor has already been finished')
+
+        lines = (self._pending_line + chunk).split('\n')
+        # The last part is not terminated yet and may continue in the next chunk
+        self._pending_line = lines.pop()
+        if self.skip_until is not None:
+            lines = self._skip_banner(lines)
+        self._block.extend(line for line in lines if line)
+        while len(self._block) >= self.block_size:
+            self._main_loop(self._block[:self.block_size])
+            del self._block[:self.block_size]
+
+    def finish(self) -> str:
+        """
+        Compress the remaining lines and return the compressed output.
+
+        :return: The compressed output in the same format as DataCompressor.get_compressed_output()
+        """
+        if self._compressed_output is None:
+            if self._pending_line:
+                self._block.append(self._pending_line)
+                self._pending_line = ''
+            self._flush_block()
+            self._compressed_output = self.get_compressed_output()
+        return self._compressed_output
+
+    def _skip_banner(self, lines: List[str]) -> List[str]:
+        for position, line in enumerate(lines):
+            if line.endswith(self.skip_until):
+                # The output received so far is the banner, start over after it
+                self.skip_until = None
+                self._block = []
+                self.reserve_list = []
+                return lines[position + 1:]
+        return lines
+
+    def _flush_block(self) -> None:
+        if self._block:
+            self._main_loop(self._block)
+            self._block = []
@@ -1,12 +1,22 @@
+import hashlib
+import json
 import logging
 import re
-from typing import List, Dict
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterable
 
 import constants
 
-from pymetasploit3.msfrpc import MsfRpcClient
+from pymetasploit3.msfrpc import MsfRpcClient, MsfRpcMethod
 
+from utils.dao.sqlalchemy.db_manager.alchemy_manager import ManagerAlchemyDB
 from utils.msf.classes import CustomMsfRpcClient
+from utils.msf.module_catalog import invalidate_module_catalog
+
+# Every worker thread of the importer keeps its own RPC client
+_thread_local = threading.local()
 
 
 def work_with_msf_console(console_commands: List[str]) -> str:
@@ -154,3 +164,126 @@ def get_required_options_msf_modules(module_category: str, module_name: str) ->
     # Filter strings that are fully uppercase
     main_options = [string for string in module.required if string.isupper()]
     return main_options
+
+
+def compute_module_hash(module: Dict[str, str]) -> str:
+    """
+    Computes the hash of the module metadata listed by 'show <category>'.
+
+    :param module: The module as returned by load_modules_list
+    :return: The sha256 hex digest of the module fields
+    """
+    payload = json.dumps(module, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def fetch_module_options(module_name: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Fetches the required options of a module with a single 'module.info' RPC call.
+
+    Only the fully uppercase required options are kept, as in get_required_options_msf_modules.
+
+    :param module_name: The full module path, e.g. 'auxiliary/scanner/http/http_version'
+    :return: A list of options in the format of ManagerAlchemyDB.insert_module_options, or None if the call failed
+    """
+    module_category, module_short_name = module_name.split('/', 1)
+    try:
+        info = _get_thread_client().call(MsfRpcMethod.ModuleInfo, [module_category, module_short_name])
+    except Exception as e:
+        logging.error(f'Error while fetching info of the module {module_name}: {str(e)}')
+        return None
+
+    options = []
+    for option_name, option in (info.get('options') or {}).items():
+        if not option.get('required') or not option_name.isupper():
+            continue
+        default = option.get('default')
+        options.append({
+            'option_name': option_name,
+            'required': True,
+            'default': None if default is None else str(default),
+            'description': option.get('desc')
+        })
+    return options
+
+
+def import_modules(db_url: str = constants.MSF_DB_URL, categories: Iterable[str] = ('auxiliary', 'exploit'),
+                   full_refresh: bool = False, max_workers: int = constants.IMPORT_MAX_WORKERS,
+                   batch_size: int = constants.IMPORT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Imports the Metasploit modules and their options into the database.
+
+    The module lists are loaded through the console, and every module whose metadata hash differs from the stored
+    one is fetched with 'module.info' over a bounded pool of RPC connections (one per worker thread). Modules are
+    written in transactions of batch_size modules, a module whose info could not be fetched is retried on the next
+    import. After the listing, the stored modules of the listed categories that msfrpcd no longer lists are deleted
+    with their options and hashes.
+
+    Run from the project root to import the modules, '--full' fetches all of them again:
+        python -m utils.msf.importing_msfinfo_database [--full]
+
+    :param db_url: SQLAlchemy database URL
+    :param categories: The module categories to import
+    :param full_refresh: Fetch all the modules, even those whose metadata did not change
+    :param max_workers: The number of concurrent RPC connections
+    :param batch_size: The number of modules written in one transaction
+    :return: The number of 'listed', 'changed', 'imported', 'failed' and 'deleted' modules
+    """
+    manager_db = ManagerAlchemyDB(db_url)
+    import_hashes = manager_db.get_module_import_hashes()
+    stored_hashes = {} if full_refresh else import_hashes
+
+    modules = []
+    removed_modules = []
+    for category in categories:
+        category_modules = load_modules_list(category)
+        modules.extend(category_modules)
+        # An empty listing is a failed one rather than a category without modules, its modules are kept
+        if category_modules:
+            listed_names = {module['name'] for module in category_modules}
+            stored_names = set(manager_db.get_modules_by_group(category))
+            stored_names.update(name for name in import_hashes if name.startswith(f'{category}/'))
+            removed_modules.extend(sorted(stored_names - listed_names))
+    metadata_hashes = {module['name']: compute_module_hash(module) for module in modules}
+    deleted = manager_db.delete_modules(removed_modules)
+    changed_modules = [
+        module for module in modules if stored_hashes.get(module['name']) != metadata_hashes[module['name']]
+    ]
+    logging.info(f'{len(changed_modules)} of {len(modules)} modules are new or changed')
+
+    imported = failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='msf-import') as executor:
+        for start in range(0, len(changed_modules), batch_size):
+            batch = changed_modules[start:start + batch_size]
+            fetched = dict(zip(
+                (module['name'] for module in batch),
+                executor.map(fetch_module_options, (module['name'] for module in batch))
+            ))
+            ready_modules = [module for module in batch if fetched[module['name']] is not None]
+            manager_db.upsert_modules(
+                ready_modules,
+                {name: options for name, options in fetched.items() if options is not None},
+                metadata_hashes
+            )
+            imported += len(ready_modules)
+            failed += len(batch) - len(ready_modules)
+
+    # The module lookup tools of this process read the changed modules from a new catalog
+    if imported or deleted:
+        invalidate_module_catalog(db_url)
+
+    return {'listed': len(modules), 'changed': len(changed_modules), 'imported': imported, 'failed': failed,
+            'deleted': deleted}
+
+
+def _get_thread_client() -> MsfRpcClient:
+    client = getattr(_thread_local, 'client', None)
+    if client is None:
+        client = CustomMsfRpcClient().create_client()
+        _thread_local.client = client
+    return client
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(import_modules(full_refresh='--full' in sys.argv[1:]))
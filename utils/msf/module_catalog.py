@@ -0,0 +1,210 @@
+import logging
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from constants import MSF_DB_URL, CATALOG_SEARCH_LIMIT, CATALOG_NAME_WEIGHT
+from utils.dao.sqlalchemy.db_manager.alchemy_manager import ManagerAlchemyDB
+
+logger = logging.getLogger(__name__)
+
+# Lowercase alphanumeric tokens of module paths, names and descriptions
+PATTERN_TOKENS = re.compile(r'[a-z0-9]+')
+# Words that do not help to tell one module from another
+STOP_WORDS = frozenset({'a', 'an', 'and', 'by', 'for', 'from', 'in', 'of', 'on', 'or', 'the', 'to', 'via', 'with'})
+
+# Catalogs shared by the whole process, keyed by db_url
+_catalogs: Dict[str, 'ModuleCatalog'] = {}
+_catalogs_lock = threading.Lock()
+
+
+class ModuleRecord(NamedTuple):
+    name: str
+    group: str
+    sub_group: str
+    rank: str
+    disclosure_date: Optional[str]
+    description: Optional[str]
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Split a text into lowercase search tokens without stop words.
+    """
+    if not text:
+        return []
+    return [token for token in PATTERN_TOKENS.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class ModuleCatalog:
+    """
+    In-memory catalog of the Metasploit modules and their options.
+
+    The catalog is loaded from the database once and answers all the lookups without SQLite:
+    - module paths are kept sorted, so a prefix lookup is a binary search;
+    - an inverted index maps every token of the module path and description to the modules containing it, and the
+      keyword search ranks the matching modules by the IDF of the matched tokens, tokens of the path weigh more.
+    """
+
+    def __init__(self, modules: List[tuple], module_options: Dict[str, List[str]]):
+        """
+        Build the catalog.
+
+        :param modules: Tuples (name, group, sub_group, rank, disclosure_date, description) in the database order
+        :param module_options: Dictionary of module names and their options
+        """
+        self._records: Dict[str, ModuleRecord] = {}
+        self._sub_groups: Dict[str, List[str]] = {}
+        for row in modules:
+            record = ModuleRecord(*row)
+            if record.name in self._records:
+                continue
+            self._records[record.name] = record
+            self._sub_groups.setdefault(f'{record.group}/{record.sub_group}', []).append(record.name)
+
+        self._options: Dict[str, Tuple[str, ...]] = {name: tuple(options) for name, options in module_options.items()}
+        self._sorted_names: List[str] = sorted(self._records)
+
+        # token -> {module name: weighted term frequency}
+        self._index: Dict[str, Dict[str, float]] = {}
+        for record in self._records.values():
+            weights = Counter()
+            for token in tokenize(record.name):
+                weights[token] += CATALOG_NAME_WEIGHT
+            for token in tokenize(record.description):
+                weights[token] += 1
+            for token, weight in weights.items():
+                self._index.setdefault(token, {})[record.name] = weight
+
+        modules_count = len(self._records)
+        self._idf: Dict[str, float] = {
+            token: math.log(1 + modules_count / len(postings)) for token, postings in self._index.items()
+        }
+
+    @classmethod
+    def load(cls, db_url: str = MSF_DB_URL) -> 'ModuleCatalog':
+        """
+        Load the catalog from the modules and module options tables.
+
+        :param db_url: SQLAlchemy database URL
+        :return: The loaded catalog
+        """
+        manager_db = ManagerAlchemyDB(db_url)
+        catalog = cls(manager_db.get_all_modules(), manager_db.get_all_module_options())
+        logger.info(f'The module catalog was loaded from {db_url}: {len(catalog)} modules')
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, name: str) -> Optional[ModuleRecord]:
+        """
+        Return the module by its full path, e.g. 'auxiliary/scanner/http/http_version'.
+        """
+        return self._records.get(name)
+
+    def get_options(self, name: str) -> Tuple[str, ...]:
+        """
+        Return the options of the module, or an empty tuple for an unknown module.
+        """
+        return self._options.get(name, ())
+
+    def get_sub_groups(self) -> List[str]:
+        """
+        Return the 'group/sub_group' names in the database order.
+        """
+        return list(self._sub_groups)
+
+    def get_modules_by_sub_group(self, complex_name: str) -> List[str]:
+        """
+        Return the module paths of a 'group/sub_group' in the database order.
+        """
+        return list(self._sub_groups.get(complex_name.strip().strip('/'), []))
+
+    def find_by_prefix(self, prefix: str, limit: Optional[int] = None, group: Optional[str] = None) -> List[str]:
+        """
+        Return the module paths starting with the prefix in lexicographic order.
+
+        :param prefix: The beginning of a module path, e.g. 'auxiliary/scanner/smb/'
+        :param limit: The maximum number of paths to return
+        :param group: Return only the modules of this group, e.g. 'auxiliary'
+        """
+        start = bisect_left(self._sorted_names, prefix)
+        result = []
+        for name in self._sorted_names[start:]:
+            if not name.startswith(prefix) or (limit is not None and len(result) >= limit):
+                break
+            if group and self._records[name].group != group:
+                continue
+            result.append(name)
+        return result
+
+    def search(self, query: str, limit: int = CATALOG_SEARCH_LIMIT, group: Optional[str] = None) -> List[ModuleRecord]:
+        """
+        Find the modules relevant to the keywords of the query.
+
+        Every module containing at least one query token is scored with the sum of tf * idf of the matched tokens,
+        so modules matching rare and several tokens come first; ties are broken by the module path.
+
+        :param query: Keywords, e.g. 'smb version scanner'
+        :param limit: The maximum number of modules to return
+        :param group: Return only the modules of this group, e.g. 'auxiliary'
+        :return: The matching modules, the most relevant first
+        """
+        scores: Dict[str, float] = {}
+        for token in set(tokenize(query)):
+            postings = self._index.get(token)
+            if not postings:
+                continue
+            idf = self._idf[token]
+            for name, weight in postings.items():
+                scores[name] = scores.get(name, 0.0) + weight * idf
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        result = []
+        for name, _ in ranked:
+            record = self._records[name]
+            if group and record.group != group:
+                continue
+            result.append(record)
+            if len(result) >= limit:
+                break
+        return result
+
+
+def get_module_catalog(db_url: str = MSF_DB_URL) -> ModuleCatalog:
+    """
+    Return the process-wide module catalog of the database, loading it on the first call.
+
+    :param db_url: SQLAlchemy database URL
+    :return: The shared catalog
+    """
+    catalog = _catalogs.get(db_url)
+    if catalog is not None:
+        return catalog
+
+    with _catalogs_lock:
+        catalog = _catalogs.get(db_url)
+        if catalog is None:
+            catalog = ModuleCatalog.load(db_url)
+            # An empty catalog means the database could not be read, it is loaded again on the next call
+            if len(catalog):
+                _catalogs[db_url] = catalog
+        return catalog
+
+
+def invalidate_module_catalog(db_url: Optional[str] = None) -> None:
+    """
+    Drop the shared catalog of the database, e.g. after an import changed its modules; it is loaded again on the
+    next call of get_module_catalog.
+
+    :param db_url: SQLAlchemy database URL, None drops the catalogs of all the databases
+    """
+    with _catalogs_lock:
+        if db_url is None:
+            _catalogs.clear()
+        else:
+            _catalogs.pop(db_url, None)
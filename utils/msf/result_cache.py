@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from constants import MSF_RESULT_CACHE_SIZE, MSF_RESULT_CACHE_DEFAULT_TTL, MSF_RESULT_CACHE_TTLS
+from dao.sqlite.msf_sqlite import create_connection, compute_args_hash, get_latest_result
+from utils.msf.console_reader import TIMEOUT_MESSAGE
+
+CacheKey = Tuple[str, str, str]  # (module, host, args_hash)
+
+
+def normalize_module_name(module_category: str, module_name: str) -> str:
+    """
+    Build the full module path from its category and name.
+
+    The LLM sometimes repeats the category in the module name ('auxiliary' + 'auxiliary/scanner/...'),
+    or adds slashes and spaces around it; all of these produce the same path.
+
+    :param module_category: The module category, e.g. 'auxiliary'
+    :param module_name: The module name, e.g. 'scanner/http/http_version'
+    :return: The normalized full module path, e.g. 'auxiliary/scanner/http/http_version'
+    """
+    category = module_category.strip().strip('/').lower()
+    name = module_name.strip().strip('/')
+    if name.lower().startswith(f'{category}/'):
+        name = name[len(category) + 1:]
+    return f'{category}/{name}'
+
+
+class ScanResultCache:
+    """
+    Memoization of Metasploit module runs keyed by the module, the host and the full set of module options.
+
+    An in-memory LRU tier is checked first; on a miss the SQLite results store is queried for a result of the same
+    call that is younger than the TTL of the module. TTLs are configured per module prefix, a TTL of 0 disables
+    caching (e.g. for exploits, which must never be skipped).
+    """
+
+    def __init__(self, max_entries: int = MSF_RESULT_CACHE_SIZE,
+                 default_ttl: float = MSF_RESULT_CACHE_DEFAULT_TTL,
+                 module_ttls: Optional[Dict[str, float]] = None,
+                 db_file: str = 'my_sqlite.db'):
+        """
+        Initialize the cache.
+
+        :param max_entries: The maximum number of entries kept in memory
+        :param default_ttl: The TTL in seconds for modules without a specific TTL
+        :param module_ttls: TTLs in seconds keyed by module path prefix
+        :param db_file: The SQLite database with the results store
+        """
+        self._max_entries = max_entries
+        self._default_ttl = default_ttl
+        self._module_ttls = MSF_RESULT_CACHE_TTLS if module_ttls is None else module_ttls
+        self._db_file = db_file
+        self._entries: OrderedDict[CacheKey, Tuple[str, float]] = OrderedDict()  # key -> (result, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, module: str) -> float:
+        """
+        Return the TTL of a module, the longest matching prefix in module_ttls wins.
+
+        :param module: The full module path
+        :return: The TTL in seconds
+        """
+        matches = [prefix for prefix in self._module_ttls if module == prefix or module.startswith(f'{prefix}/')]
+        if not matches:
+            return self._default_ttl
+        return self._module_ttls[max(matches, key=len)]
+
+    @staticmethod
+    def make_key(module: str, host: str, args: Optional[Dict[str, Any]]) -> CacheKey:
+        return module, host, compute_args_hash(args)
+
+    def get(self, module: str, host: str, args: Optional[Dict[str, Any]]) -> Optional[str]:
+        """
+        Return the cached result of the same module run, if it is still fresh.
+
+        :param module: The full module path
+        :param host: The target host
+        :param args: The module options
+        :return: The compressed output of the cached run or None
+        """
+        ttl = self.ttl_for(module)
+        if ttl <= 0:
+            return None
+
+        key = self.make_key(module, host, args)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+
+        # Fall back to the SQLite tier
+        db_connection = create_connection(self._db_file)
+        try:
+            record = get_latest_result(db_connection, *key, not_before=now - ttl)
+        finally:
+            db_connection.close()
+
+        # The result expires TTL seconds after it was written, not after it was promoted to the in-memory tier
+        expires_at = record[2] + ttl if record is not None else now
+        if record is None or not record[1] or TIMEOUT_MESSAGE in (record[0] or '') or expires_at <= now:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        self._store(key, record[1], expires_at)
+        with self._lock:
+            self.hits += 1
+        return record[1]
+
+    def put(self, module: str, host: str, args: Optional[Dict[str, Any]], result: str, output: str = '') -> None:
+        """
+        Put a result of a module run into the in-memory tier. The SQLite tier is written by the tool itself.
+
+        :param module: The full module path
+        :param host: The target host
+        :param args: The module options
+        :param result: The compressed output of the run
+        :param output: The raw output of the run, used to skip runs that timed out
+        """
+        ttl = self.ttl_for(module)
+        if ttl <= 0 or not result or TIMEOUT_MESSAGE in output:
+            return
+        self._store(self.make_key(module, host, args), result, time.time() + ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key: CacheKey, result: str, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (result, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+_scan_result_cache: Optional[ScanResultCache] = None
+_scan_result_cache_lock = threading.Lock()
+
+
+def get_scan_result_cache() -> ScanResultCache:
+    """
+    Return the process-wide ScanResultCache, creating it on the first call.
+    """
+    global _scan_result_cache
+    with _scan_result_cache_lock:
+        if _scan_result_cache is None:
+            _scan_result_cache = ScanResultCache()
+    return _scan_result_cache
@@ -1,13 +1,9 @@
-import constants
+from utils.prompt_registry import get_prompt_registry
 
 
 def create_message_from_file(file_name: str) -> str:
-    work_dir = constants.MESSAGE_FOLDER
-    file_path = f'{work_dir}/{file_name}'
+    # The files are read once by the prompt registry and again only after they are changed
     try:
-        with open(file_path, 'r') as file_reader:
-            lines = file_reader.readlines()
-            filtered_lines = [line.replace('\n', '') for line in lines]
-            return ' '.join(filtered_lines)
+        return get_prompt_registry().get_message(file_name)
     except FileNotFoundError:
         print(f"A file was not found according to this file name: {file_name}.")
@@ -0,0 +1,184 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from constants import MESSAGE_FOLDER, PROMPT_TOKEN_BUDGET, PROMPT_TEMPLATE_CACHE_SIZE
+from utils.token_utils import count_tokens
+
+logger = logging.getLogger(__name__)
+
+PROMPT_FILE_EXTENSION = '.txt'
+
+
+@dataclass(frozen=True)
+class PromptEntry:
+    """
+    A message file loaded by the PromptRegistry.
+    """
+    text: str
+    mtime: float
+    tokens: int
+
+
+class PromptRegistry:
+    """
+    An in-process cache of the message files and of the agent prompt templates built from them.
+
+    All the message files of the folder are read on the first use. An entry is keyed by the path of its file and the
+    modification time: every lookup compares the modification time with the one of the entry, so an edited file is
+    read again and the templates built from it are rebuilt, while an unchanged file costs a stat() call.
+
+    The tokens of every file are counted when it is loaded, and the tokens of every system prompt when its template
+    is built; a system prompt above token_budget is logged as a warning.
+
+    The templates of a file are dropped when the file is read again, and at most template_cache_size templates are
+    kept, the least recently used are dropped first.
+    """
+
+    def __init__(self, folder: str = MESSAGE_FOLDER, token_budget: Optional[int] = PROMPT_TOKEN_BUDGET,
+                 template_cache_size: int = PROMPT_TEMPLATE_CACHE_SIZE):
+        """
+        Initialize the registry. No file is read until the first lookup.
+
+        :param folder: The folder of the message files
+        :param token_budget: The maximum number of tokens of a system prompt, None for no limit
+        :param template_cache_size: The maximum number of prompt templates kept in memory
+        """
+        self._folder = folder
+        self._token_budget = token_budget
+        self._template_cache_size = template_cache_size
+        self._entries: Dict[str, PromptEntry] = {}
+        # (file name, partial variables) -> (modification time of the file, template)
+        self._templates: OrderedDict[Tuple[str, Hashable], Tuple[float, ChatPromptTemplate]] = OrderedDict()
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def load(self) -> Dict[str, int]:
+        """
+        Read all the message files of the folder.
+
+        :return: The number of tokens of every file keyed by its name relative to the folder
+        """
+        with self._lock:
+            for directory, _, file_names in os.walk(self._folder):
+                for file_name in file_names:
+                    if file_name.endswith(PROMPT_FILE_EXTENSION):
+                        name = os.path.relpath(os.path.join(directory, file_name), self._folder).replace(os.sep, '/')
+                        self._load_entry(name, os.path.getmtime(os.path.join(directory, file_name)))
+            self._loaded = True
+            logger.info(f'{len(self._entries)} message files were loaded from {self._folder}: '
+                        f'{sum(entry.tokens for entry in self._entries.values())} tokens')
+            return self.token_counts()
+
+    def get_message(self, file_name: str) -> str:
+        """
+        Return the text of a message file, its lines joined with spaces.
+
+        :param file_name: The name of the file relative to the folder, e.g. 'host_team/host#1.txt'
+        :return: The text of the file
+        :raises FileNotFoundError: If the file does not exist
+        """
+        return self._get_entry(file_name).text
+
+    def get_prompt_template(self, file_name: str, **partial_variables: Any) -> ChatPromptTemplate:
+        """
+        Return the agent prompt: the message file as the system message followed by the messages of the state, with
+        the variables of the system message filled in.
+
+        Templates are shared by all the agents built with the same file and variables, which is safe since a
+        ChatPromptTemplate is not changed by formatting it.
+
+        :param file_name: The name of the template file relative to the folder, e.g. 'default_with_tool.txt'
+        :param partial_variables: The values of the variables of the template, e.g. system_message
+        :return: The partially formatted prompt template
+        :raises FileNotFoundError: If the file does not exist
+        """
+        with self._lock:
+            entry = self._get_entry(file_name)
+            key = (file_name, _variables_key(partial_variables))
+            cached = self._templates.get(key)
+            if cached is not None and cached[0] == entry.mtime:
+                self._templates.move_to_end(key)
+                return cached[1]
+
+            prompt = ChatPromptTemplate.from_messages(
+                [
+                    ("system", entry.text),
+                    (MessagesPlaceholder(variable_name="messages"))
+                ]
+            ).partial(**partial_variables)
+            self._check_budget(file_name, entry.text, partial_variables)
+            self._templates[key] = (entry.mtime, prompt)
+            self._templates.move_to_end(key)
+            while len(self._templates) > self._template_cache_size:
+                self._templates.popitem(last=False)
+            return prompt
+
+    def token_counts(self) -> Dict[str, int]:
+        """
+        Return the number of tokens of every loaded file keyed by its name relative to the folder.
+        """
+        with self._lock:
+            return {name: entry.tokens for name, entry in sorted(self._entries.items())}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._templates.clear()
+            self._loaded = False
+
+    def _get_entry(self, file_name: str) -> PromptEntry:
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            mtime = os.path.getmtime(os.path.join(self._folder, file_name))
+            entry = self._entries.get(file_name)
+            if entry is None or entry.mtime != mtime:
+                entry = self._load_entry(file_name, mtime)
+            return entry
+
+    def _load_entry(self, file_name: str, mtime: float) -> PromptEntry:
+        with open(os.path.join(self._folder, file_name), 'r') as file_reader:
+            text = ' '.join(line.replace('\n', '') for line in file_reader.readlines())
+        entry = PromptEntry(text=text, mtime=mtime, tokens=count_tokens(text))
+        if file_name in self._entries:
+            logger.info(f'The message file {file_name} was changed and loaded again: {entry.tokens} tokens')
+            # The templates built from the previous text are never returned again
+            for key in [key for key in self._templates if key[0] == file_name]:
+                del self._templates[key]
+        self._entries[file_name] = entry
+        return entry
+
+    def _check_budget(self, file_name: str, text: str, partial_variables: Dict[str, Any]) -> None:
+        """
+        Count the tokens of the system prompt and warn if it exceeds the token budget.
+        """
+        try:
+            system_prompt = text.format(**partial_variables)
+        except (KeyError, IndexError, ValueError):
+            # Some variables are filled in by the agent invocation, count the template with the given values added
+            system_prompt = ' '.join([text, *map(str, partial_variables.values())])
+        tokens = count_tokens(system_prompt)
+        logger.debug(f'The system prompt of {file_name} has {tokens} tokens')
+        if self._token_budget is not None and tokens > self._token_budget:
+            logger.warning(f'The system prompt of {file_name} has {tokens} tokens, '
+                           f'above the budget of {self._token_budget} tokens')
+
+
+def _variables_key(partial_variables: Dict[str, Any]) -> Hashable:
+    return tuple(
+        (name, tuple(value) if isinstance(value, list) else value) for name, value in sorted(partial_variables.items())
+    )
+
+
+# Registry shared by the whole process
+_prompt_registry = PromptRegistry()
+
+
+def get_prompt_registry() -> PromptRegistry:
+    return _prompt_registry
@@ -0,0 +1,85 @@
+import functools
+import json
+import logging
+import threading
+from typing import Iterable, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from constants import TOKEN_ENCODING, TOKEN_COUNT_CACHE_SIZE, CHARS_PER_TOKEN, MESSAGE_TOKEN_OVERHEAD
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional, token counts are estimated from the text length without it
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """
+    Return the tiktoken encoding, or None if tiktoken is not installed or its encoding cannot be loaded.
+
+    The encoding is downloaded on the first use, so offline it is not available; the failure is remembered and the
+    estimate is used for the rest of the process.
+    """
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    with _encoding_lock:
+        if not _encoding_loaded:
+            if tiktoken is not None:
+                try:
+                    _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception as e:
+                    logger.warning(f'The {TOKEN_ENCODING} encoding could not be loaded, token counts are estimated: {e}')
+            _encoding_loaded = True
+    return _encoding
+
+
+@functools.lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with tiktoken, or estimate them as one token per CHARS_PER_TOKEN characters.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    """
+    Count the tokens of a message: its content, the arguments of its tool calls and a fixed per-message overhead.
+    """
+    content = message.content
+    if isinstance(content, str):
+        tokens = count_tokens(content)
+    else:
+        tokens = sum(count_tokens(item if isinstance(item, str) else item.get('text') or json.dumps(item))
+                     for item in content)
+    if isinstance(message, AIMessage):
+        tokens += sum(count_tokens(json.dumps(tool_call['args'])) for tool_call in message.tool_calls)
+    return tokens + MESSAGE_TOKEN_OVERHEAD
+
+
+def count_messages_tokens(messages: Iterable[BaseMessage], limit: Optional[int] = None) -> int:
+    """
+    Count the tokens of messages.
+
+    :param messages: The messages to count
+    :param limit: Stop counting once the total exceeds the limit
+    :return: The total number of tokens
+    """
+    total = 0
+    for message in messages:
+        total += count_message_tokens(message)
+        if limit is not None and total > limit:
+            break
+    return total
@@ -5,13 +5,18 @@ from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 from langchain.agents import create_structured_chat_agent
 
-import utils
-
 from utils import orm_util as orm
+from utils.prompt_registry import get_prompt_registry
+from utils.langraph.llm_cache import with_llm_cache
 from workflows.graph_entities.statets import TeamState
 
 
-def assistant_agent_with_tools(model_llm: ChatOpenAI | ChatAnthropic, tools, system_message: str):
+def assistant_agent_with_tools(
+        model_llm: ChatOpenAI | ChatAnthropic,
+        tools,
+        system_message: str,
+        use_llm_cache: bool = False
+):
     """
     Create an agent with specified tools and a system message.
 
@@ -19,6 +24,7 @@ def assistant_agent_with_tools(model_llm: ChatOpenAI | ChatAnthropic, tools, sys
         model_llm: The agent model to bind tools with.
         tools: A list of tools to integrate into the agent.
         system_message: A specialized system message to customize the agent's behavior.
+        use_llm_cache: Reuse the cached responses to the same requests, only for a model with temperature 0.
 
     Returns:
         A configured prompt bound with the model and tools.
@@ -27,34 +33,26 @@ def assistant_agent_with_tools(model_llm: ChatOpenAI | ChatAnthropic, tools, sys
     if not tools or not isinstance(tools, list):
         raise ValueError("Invalid tools input. Must be a non-empty list of tools.")
 
-    # Load the default template message for the system
-    default_with_tool = utils.orm_util.create_message_from_file('default_with_tool.txt')
-
-    # Define the prompt template using the system message and placeholder for dynamic messages
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", default_with_tool),
-            (MessagesPlaceholder(variable_name="messages"))
-        ]
-    )
-
-    # Partially specialize the prompt with the provided system message
-    prompt = prompt.partial(system_message=system_message)
-
     # Add tool names to the prompt by joining their names into a string
     tool_names = ", ".join(tool.name for tool in tools)
     if not tool_names:
         raise ValueError("Tool names are missing or empty.")
 
-    prompt = prompt.partial(tool_names=tool_names)
+    # The default template with the system message and the tool names, cached by the prompt registry
+    prompt = get_prompt_registry().get_prompt_template(
+        'default_with_tool.txt',
+        system_message=system_message,
+        tool_names=tool_names
+    )
 
     # Bind the tools to the model and return the configured prompt
-    return prompt | model_llm.bind_tools(tools)
+    return prompt | with_llm_cache(model_llm, use_llm_cache).bind_tools(tools)
 
 
 def assistant_agent_without_tools(
         model_llm: ChatOpenAI | ChatAnthropic,
-        system_message: str
+        system_message: str,
+        use_llm_cache: bool = False
 ):
     """
     Create an agent without tools, customized with a system message.
@@ -63,37 +61,28 @@ def assistant_agent_without_tools(
         model_llm: The agent model to configure.
         system_message: A system message that adds specific instructions or context to the agent.
         teams: An optional list of team names that will be passed to the agent.
+        use_llm_cache: Reuse the cached responses to the same requests, only for a model with temperature 0.
 
     Returns:
         A prompt configured with the model and system message.
     """
-    # Load the default template message for agents without tools
-    default_without_tools = orm.create_message_from_file('default_without_tools.txt')
-
     # Validate system_message input
     if not system_message or not isinstance(system_message, str):
         raise ValueError("Invalid system message. It must be a non-empty string.")
 
-    # Define the prompt template with system message and placeholder for dynamic messages
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", default_without_tools),
-            (MessagesPlaceholder(variable_name="messages"))
-        ]
-    )
-
-    # Add specialization to the current agent using the system message and teams (if provided)
-    prompt = prompt.partial(system_message=system_message)
+    # The default template specialized with the system message, cached by the prompt registry
+    prompt = get_prompt_registry().get_prompt_template('default_without_tools.txt', system_message=system_message)
 
     # Bind the prompt to the model and return it
-    return prompt | model_llm
+    return prompt | with_llm_cache(model_llm, use_llm_cache)
 
 
 def assistant_agent_with_constructed_output(
         model_llm: ChatOpenAI | ChatAnthropic,
         system_message: str,
         oai_schema,
-        teams: Optional[List[str]] = None
+        teams: Optional[List[str]] = None,
+        use_llm_cache: bool = False
 ):
     """
     Create an agent with a specified system message and return the prompt bound with the model,
@@ -104,31 +93,25 @@ def assistant_agent_with_constructed_output(
         system_message: A specialized system message to customize the agent's behavior.
         teams: An optional list of team names that will be passed to the agent.
         oai_schema: ddd
+        use_llm_cache: Reuse the cached responses to the same requests, only for a model with temperature 0.
     Returns:
         A configured prompt bound with the model and structured output (TeamState).
 
     """
 
-    # Load the default template message for agents without tools
-    default_without_tools = orm.create_message_from_file('default_without_tools.txt')
-
     # Validate system_message input
     if not system_message or not isinstance(system_message, str):
         raise ValueError("Invalid system message. It must be a non-empty string.")
 
-    # Define the prompt template using the system message and placeholder for dynamic messages
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", default_without_tools),
-            (MessagesPlaceholder(variable_name="messages"))
-        ]
+    # The default template specialized with the system message and teams, cached by the prompt registry
+    prompt = get_prompt_registry().get_prompt_template(
+        'default_without_tools.txt',
+        system_message=system_message,
+        teams=teams
     )
 
-    # Add specialization to the current agent using the system message and teams (if provided)
-    prompt = prompt.partial(system_message=system_message, teams=teams)
-
     # Bind the structured output (TeamState) and return the configured prompt
-    return prompt | model_llm.with_structured_output(
+    return prompt | with_llm_cache(model_llm, use_llm_cache).with_structured_output(
         schema=oai_schema,
         method="json_schema"
     )
@@ -1,44 +1,187 @@
-from typing import Sequence, Union, Callable, Any, Dict, List
+import asyncio
+import contextvars
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Sequence, Union, Callable, Any, Dict, List, Optional, Tuple
 
 from langchain.schema import HumanMessage, AIMessage
 from langchain_core.messages import ToolMessage, BaseMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_core.tools import BaseTool
-from langgraph.prebuilt import ToolInvocation, ToolExecutor
 
 from constants import *
+from utils.instrumentation import instrument_node
+from utils.langraph.checkpointer import derive_thread_id
+from utils.langraph.context_compactor import ContextCompactor
+from utils.langraph.tool_dispatcher import ToolDispatcher, as_tool_dispatcher
 from workflows.graph_entities.statets import TeamState, PlanningTeamState
-from workflows.team_pentest.graph_handlers.graph_executor import launch_as_subgraph
+from workflows.team_pentest.graph_handlers.graph_executor import launch_as_subgraph, alaunch_as_subgraph
 
+# The per-tool limits are shared by all the tool nodes, so concurrent investigations of many targets together stay
+# within TOOL_CONCURRENCY_LIMITS. Keyed by (tool name, limit); an asyncio.Semaphore belongs to one event loop.
+_tool_semaphores: Dict[Tuple[str, int], threading.BoundedSemaphore] = {}
+_async_tool_semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, int], Any]]' = \
+    weakref.WeakKeyDictionary()
+_tool_semaphores_lock = threading.Lock()
 
-def create_tool_node(state, tools: Sequence[Union[BaseTool, Callable]]) -> Dict[str, List[ToolMessage]]:
+
+def create_dual_node(func: Callable, afunc: Callable, **kwargs) -> RunnableLambda:
+    """
+    Creates a node with a sync and an async implementation bound to the same keyword arguments.
+
+    LangGraph calls the sync one when the graph is executed with invoke/stream and awaits the async one with
+    ainvoke/astream.
+
+    Args:
+        func: The sync node function, e.g. create_tool_node.
+        afunc: The async node function, e.g. acreate_tool_node.
+        **kwargs: The keyword arguments bound to both functions.
+
+    Returns:
+        The node to be added to the graph.
+    """
+    return RunnableLambda(functools.partial(func, **kwargs), afunc=functools.partial(afunc, **kwargs))
+
+
+@instrument_node
+def create_tool_node(
+        state,
+        tools: Union[ToolDispatcher, Sequence[Union[BaseTool, Callable]]],
+        max_workers: int = TOOL_NODE_MAX_WORKERS,
+        concurrency_limits: Optional[Dict[str, int]] = None
+) -> Dict[str, List[ToolMessage]]:
+    """
+    Executes all tool calls of the last AI message in parallel and returns their results.
+
+    Independent tool calls are submitted to a bounded worker pool, so several Metasploit modules requested in one
+    turn run at the same time (each of them opens its own console). The number of simultaneous calls of a single
+    tool is limited separately by `concurrency_limits`, across all the tool nodes of the process. A failed call is
+    returned as an error ToolMessage and does not affect the other calls.
+
+    Args:
+        state: The current state, the last message of which contains the tool calls.
+        tools: The ToolDispatcher built with the graph. A sequence of tools is indexed again on every execution.
+        max_workers: The maximum number of tool calls executed at the same time.
+        concurrency_limits: Per-tool limits of simultaneous calls keyed by the tool name.
+                            Defaults to TOOL_CONCURRENCY_LIMITS.
+
+    Returns:
+        A dictionary with the ToolMessages in the same order as the tool calls of the last message.
+    """
     messages = state.messages
 
     # Based on the continue condition
     # we know the last message involves a function call
     last_message = messages[-1]
-    # We construct an ToolInvocation from the function_call
     tool_calls = last_message.tool_calls
-    tool_messages = []
-    for tool_call in tool_calls:
-        action = ToolInvocation(
-            tool=tool_call["name"],
-            tool_input=tool_call["args"]
-        )
-        tool_executor = ToolExecutor(tools)
-        # We call the tool_executor and get back a response
-        response = tool_executor.invoke(action)
-        # We use the response to create a ToolMessage
-        tool_message = ToolMessage(
-            content=str(response),
-            name=action.tool,
-            tool_call_id=tool_call["id"]
-        )
-        tool_messages.append(tool_message)
+    dispatcher = as_tool_dispatcher(tools)
+
+    limits = TOOL_CONCURRENCY_LIMITS if concurrency_limits is None else concurrency_limits
+
+    def invoke_tool(tool_call: Dict[str, Any]) -> ToolMessage:
+        semaphore = _get_tool_semaphore(tool_call["name"], limits)
+        if semaphore:
+            with semaphore:
+                return dispatcher.invoke(tool_call)
+        return dispatcher.invoke(tool_call)
+
+    if len(tool_calls) == 1:
+        # Nothing to parallelize, avoid the overhead of the pool
+        return {MESSAGES_FIELD: [invoke_tool(tool_calls[0])]}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tool_calls)))) as pool:
+        # The calls run in the context of the node, so they are recorded in the metrics of its run
+        futures = [pool.submit(contextvars.copy_context().run, invoke_tool, tool_call) for tool_call in tool_calls]
+        # Collect the results in the original tool call order
+        tool_messages = [future.result() for future in futures]
+
     # We return a list, because this will get added to the existing list
     return {MESSAGES_FIELD: tool_messages}
 
 
-def create_ordinary_node(state: TeamState | PlanningTeamState, agent, name: str):
+@instrument_node
+async def acreate_tool_node(
+        state,
+        tools: Union[ToolDispatcher, Sequence[Union[BaseTool, Callable]]],
+        max_concurrency: int = TOOL_NODE_MAX_WORKERS,
+        concurrency_limits: Optional[Dict[str, int]] = None
+) -> Dict[str, List[ToolMessage]]:
+    """
+    Async variant of create_tool_node: all tool calls of the last AI message are awaited concurrently on the event
+    loop.
+
+    Tools with a coroutine (e.g. msf_console_scan_tool_dynamic) do not occupy a thread while they wait for
+    Metasploit, the other tools are run in the default executor by LangChain. The per-tool limits are shared by all
+    the tool nodes running on the event loop, e.g. by the investigations of alaunch_graph_as_host_for_targets.
+
+    Args:
+        state: The current state, the last message of which contains the tool calls.
+        tools: The ToolDispatcher built with the graph. A sequence of tools is indexed again on every execution.
+        max_concurrency: The maximum number of tool calls executed at the same time.
+        concurrency_limits: Per-tool limits of simultaneous calls keyed by the tool name.
+                            Defaults to TOOL_CONCURRENCY_LIMITS.
+
+    Returns:
+        A dictionary with the ToolMessages in the same order as the tool calls of the last message.
+    """
+    tool_calls = state.messages[-1].tool_calls
+    dispatcher = as_tool_dispatcher(tools)
+
+    limits = TOOL_CONCURRENCY_LIMITS if concurrency_limits is None else concurrency_limits
+    node_semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def invoke_tool(tool_call: Dict[str, Any]) -> ToolMessage:
+        async with node_semaphore:
+            semaphore = _aget_tool_semaphore(tool_call["name"], limits)
+            if semaphore:
+                async with semaphore:
+                    return await dispatcher.ainvoke(tool_call)
+            return await dispatcher.ainvoke(tool_call)
+
+    # gather keeps the original tool call order
+    tool_messages = await asyncio.gather(*(invoke_tool(tool_call) for tool_call in tool_calls))
+    return {MESSAGES_FIELD: list(tool_messages)}
+
+
+def _get_tool_semaphore(tool_name: str, limits: Dict[str, int]) -> Optional[threading.BoundedSemaphore]:
+    """
+    Return the semaphore of the process limiting the simultaneous calls of a tool, or None if it is not limited.
+    """
+    limit = limits.get(tool_name, 0)
+    if limit <= 0:
+        return None
+    with _tool_semaphores_lock:
+        semaphore = _tool_semaphores.get((tool_name, limit))
+        if semaphore is None:
+            semaphore = _tool_semaphores[(tool_name, limit)] = threading.BoundedSemaphore(limit)
+        return semaphore
+
+
+def _aget_tool_semaphore(tool_name: str, limits: Dict[str, int]) -> Optional[asyncio.Semaphore]:
+    """
+    Return the semaphore of the running event loop limiting the simultaneous calls of a tool, or None if it is not
+    limited.
+    """
+    limit = limits.get(tool_name, 0)
+    if limit <= 0:
+        return None
+    # Only the coroutines of the loop use its semaphores, so no lock is needed
+    semaphores = _async_tool_semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = semaphores.get((tool_name, limit))
+    if semaphore is None:
+        semaphore = semaphores[(tool_name, limit)] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+@instrument_node
+def create_ordinary_node(
+        state: TeamState | PlanningTeamState,
+        agent,
+        name: str,
+        compactor: Optional[ContextCompactor] = None
+):
     """
     Creates a standard node by invoking an agent with the current state and returning the updated state.
 
@@ -46,10 +189,57 @@ def create_ordinary_node(state: TeamState | PlanningTeamState, agent, name: str)
         state: The current state (PlanningState or UnifiedState), containing messages and sender information.
         agent: The agent to invoke using the messages from the state.
         name: The name of the node or agent invoking the operation.
+        compactor: Compacts the message history before the agent is invoked. If None, the whole history is passed.
+
+    Returns:
+        A dictionary containing the updated messages and sender after invoking the agent.
+    """
+    messages = _prepare_agent_messages(state, name, compactor)
+
+    # Invoke the agent with the current state
+    response = agent.invoke(messages)
+
+    # Return the updated state, which includes the new message and sender's name
+    return {
+        MESSAGES_FIELD: [response],  # Add the new message to the list of messages
+        SENDER_FIELD: [name]  # Set the sender to the current agent's name
+    }
+
+
+@instrument_node
+async def acreate_ordinary_node(
+        state: TeamState | PlanningTeamState,
+        agent,
+        name: str,
+        compactor: Optional[ContextCompactor] = None
+):
+    """
+    Async variant of create_ordinary_node, the agent is called with ainvoke.
+
+    Args:
+        state: The current state (PlanningState or UnifiedState), containing messages and sender information.
+        agent: The agent to invoke using the messages from the state.
+        name: The name of the node or agent invoking the operation.
+        compactor: Compacts the message history before the agent is invoked. If None, the whole history is passed.
 
     Returns:
         A dictionary containing the updated messages and sender after invoking the agent.
     """
+    response = await agent.ainvoke(_prepare_agent_messages(state, name, compactor))
+    return {
+        MESSAGES_FIELD: [response],
+        SENDER_FIELD: [name]
+    }
+
+
+def _prepare_agent_messages(
+        state: TeamState | PlanningTeamState,
+        name: str,
+        compactor: Optional[ContextCompactor]
+) -> List[BaseMessage]:
+    """
+    Select the messages the agent of the node is invoked with.
+    """
     messages: List[BaseMessage] = state.messages
     last_senders  = state.sender[-1]
     task_message = messages[0]
@@ -71,35 +261,81 @@ def create_ordinary_node(state: TeamState | PlanningTeamState, agent, name: str)
                         f"Focus on identifying any gaps or inefficiencies and suggest improvements for automated "
                         f"testing."
 )]
-    # Invoke the agent with the current state
-    response = agent.invoke(messages)
+    # Keep the prompt within the token budget of the agent
+    if compactor is not None:
+        messages = compactor.compact(messages)
+    return messages
+
+
+@instrument_node
+def node_connector_to_other_team(
+        state,
+        compiled_graph,
+        node_name: str,
+        thread_id: Optional[Any] = None,
+        config: Optional[RunnableConfig] = None
+):
+    """
+    Connects the current team lead node to another team's graph and forwards the message.
 
-    # Return the updated state, which includes the new message and sender's name
-    return {
-        MESSAGES_FIELD: [response],  # Add the new message to the list of messages
-        SENDER_FIELD: [name]  # Set the sender to the current agent's name
-    }
+    Args:
+        state: The current state, containing messages and sender information.
+        compiled_graph: The compiled graph of the other team (e.g., the planning team).
+        node_name: The name of the node to which the message should be forwarded.
+        thread_id: The thread identifier of the subgraph, used only if the config of the parent graph has none.
+        config: The config of the parent graph passed by LangGraph, the thread of the subgraph is derived from it.
+
+    Returns:
+        A dictionary representing the updated state with the response from the node of the other team.
+    """
+    # Launch the subgraph of the other team (e.g., planning team) using the forwarded message
+    state_executed_graph: TeamState = launch_as_subgraph(
+        compiled_graph=compiled_graph,
+        inputs=_build_team_input(state, node_name),
+        thread_id=derive_thread_id(config, node_name, default=thread_id)
+    )
+    return _build_team_output(state_executed_graph, node_name)
 
 
-def node_connector_to_other_team(state, compiled_graph, node_name: str, thread_id: int):
+@instrument_node
+async def anode_connector_to_other_team(
+        state,
+        compiled_graph,
+        node_name: str,
+        thread_id: Optional[Any] = None,
+        config: Optional[RunnableConfig] = None
+):
     """
-    Connects the current team lead node to another team's graph and forwards the message.
+    Async variant of node_connector_to_other_team, the graph of the other team is executed with astream.
 
     Args:
         state: The current state, containing messages and sender information.
         compiled_graph: The compiled graph of the other team (e.g., the planning team).
         node_name: The name of the node to which the message should be forwarded.
-        thread_id: The thread identifier used for the execution configuration.
+        thread_id: The thread identifier of the subgraph, used only if the config of the parent graph has none.
+        config: The config of the parent graph passed by LangGraph, the thread of the subgraph is derived from it.
 
     Returns:
         A dictionary representing the updated state with the response from the node of the other team.
     """
+    state_executed_graph: TeamState = await alaunch_as_subgraph(
+        compiled_graph=compiled_graph,
+        inputs=_build_team_input(state, node_name),
+        thread_id=derive_thread_id(config, node_name, default=thread_id)
+    )
+    return _build_team_output(state_executed_graph, node_name)
+
+
+def _build_team_input(state, node_name: str) -> Dict[str, Any]:
+    """
+    Build the input of the graph of the other team from the last message of the team lead.
+    """
     message_from_host = state.messages[-1].content
     if node_name is TESTING_NODE:
         message_from_host += f"\n{state.plan}"
 
     # Prepare input from the team lead to be forwarded to the other team (e.g., planning team)
-    input_from_team_lead: Dict[str, Any] = {
+    return {
         MESSAGES_FIELD: [
             HumanMessage(content=message_from_host)  # Forward the last message content
         ],
@@ -107,13 +343,11 @@ def node_connector_to_other_team(state, compiled_graph, node_name: str, thread_i
         PLAN_FIELD: state.plan
     }
 
-    # Launch the subgraph of the other team (e.g., planning team) using the forwarded message
-    state_executed_graph: TeamState = launch_as_subgraph(
-        compiled_graph=compiled_graph,
-        inputs=input_from_team_lead,
-        thread_id=thread_id
-    )
 
+def _build_team_output(state_executed_graph: TeamState, node_name: str) -> Dict[str, Any]:
+    """
+    Build the update of the team lead state from the final state of the graph of the other team.
+    """
     # Get the content from the last message of the executed graph
     content = state_executed_graph['messages'][-1].content
 
@@ -202,6 +436,7 @@ def create_extraction_script_node(state: PlanningTeamState, name: str):
     }
 
 
+@instrument_node
 def create_module_extraction_node(state: TeamState, agent, name: str):
     """
     Creates a module extraction node based on the last message sender in the team's state.
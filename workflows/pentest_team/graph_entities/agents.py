@@ -1,10 +1,6 @@
 from typing import List, Optional
 
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-
-import utils
-
-from utils import orm_util as orm
+from utils.prompt_registry import get_prompt_registry
 from workflows.pentest_team.graph_entities.statets import SubgraphState
 
 
@@ -24,26 +20,17 @@ def assistant_agent_with_tools(model_llm, tools, system_message: str):
     if not tools or not isinstance(tools, list):
         raise ValueError("Invalid tools input. Must be a non-empty list of tools.")
 
-    # Load the default template message for the system
-    default_with_tool = utils.orm_util.create_message_from_file('default_with_tool.txt')
-
-    # Define the prompt template using the system message and placeholder for dynamic messages
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", default_with_tool),
-            (MessagesPlaceholder(variable_name="messages"))
-        ]
-    )
-
-    # Partially specialize the prompt with the provided system message
-    prompt = prompt.partial(system_message=system_message)
-
     # Add tool names to the prompt by joining their names into a string
     tool_names = ", ".join(tool.name for tool in tools)
     if not tool_names:
         raise ValueError("Tool names are missing or empty.")
 
-    prompt = prompt.partial(tool_names=tool_names)
+    # The default template with the system message and the tool names, cached by the prompt registry
+    prompt = get_prompt_registry().get_prompt_template(
+        'default_with_tool.txt',
+        system_message=system_message,
+        tool_names=tool_names
+    )
 
     # Bind the tools to the model and return the configured prompt
     return prompt | model_llm.bind_tools(tools)
@@ -61,9 +48,6 @@ def host_agent_without_tools(model_llm, system_message: str, teams: Optional[Lis
     Returns:
         A prompt configured with the model and system message.
     """
-    # Load the default template message for agents without tools
-    default_without_tools = orm.create_message_from_file('default_without_tools.txt')
-
     # Validate system_message input
     if not system_message or not isinstance(system_message, str):
         raise ValueError("Invalid system message. It must be a non-empty string.")
@@ -72,19 +56,16 @@ def host_agent_without_tools(model_llm, system_message: str, teams: Optional[Lis
     if teams is not None and (not isinstance(teams, list) or not all(isinstance(team, str) for team in teams)):
         raise ValueError("Invalid teams list. It must be a list of strings.")
 
-    # Define the prompt template with system message and placeholder for dynamic messages
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", default_without_tools),
-            (MessagesPlaceholder(variable_name="messages"))
-        ]
-    )
-
-    # Add specialization to the current agent using the system message and teams (if provided)
+    # Add specialization to the current agent using the system message and teams (if provided), the templates are
+    # cached by the prompt registry
     if teams:
-        prompt = prompt.partial(system_message=system_message, teams=teams)
+        prompt = get_prompt_registry().get_prompt_template(
+            'default_without_tools.txt',
+            system_message=system_message,
+            teams=teams
+        )
     else:
-        prompt = prompt.partial(system_message=system_message)
+        prompt = get_prompt_registry().get_prompt_template('default_without_tools.txt', system_message=system_message)
 
     # Bind the prompt to the model and return it
     return prompt | model_llm
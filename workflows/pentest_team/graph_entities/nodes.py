@@ -1,42 +1,37 @@
-from typing import Sequence, Union, Callable, Any, Dict
+from typing import Sequence, Union, Callable, Any, Dict, Optional
 
-from langchain_core.messages import ToolMessage, HumanMessage
+from langchain_core.messages import HumanMessage
 from langchain_core.tools import BaseTool
-from langgraph.prebuilt import ToolInvocation, ToolExecutor
 
+from utils.instrumentation import instrument_node
+from utils.langraph.context_compactor import ContextCompactor
+from utils.langraph.tool_dispatcher import ToolDispatcher, as_tool_dispatcher
 from workflows.pentest_team.graph_entities.statets import SubgraphState, UnifiedState
 from workflows.pentest_team.graph_handlers.graph_executor import launch_as_subgraph
 
 
-def create_tool_node(state, tools: Sequence[Union[BaseTool, Callable]]):
+@instrument_node
+def create_tool_node(state, tools: Union[ToolDispatcher, Sequence[Union[BaseTool, Callable]]]):
     messages = state.messages
 
     # Based on the continue condition
     # we know the last message involves a function call
     last_message = messages[-1]
-    # We construct an ToolInvocation from the function_call
     tool_calls = last_message.tool_calls
-    tool_messages = []
-    for tool_call in tool_calls:
-        action = ToolInvocation(
-            tool=tool_call["name"],
-            tool_input=tool_call["args"]
-        )
-        tool_executor = ToolExecutor(tools)
-        # We call the tool_executor and get back a response
-        response = tool_executor.invoke(action)
-        # We use the response to create a ToolMessage
-        tool_message = ToolMessage(
-            content=str(response),
-            name=action.tool,
-            tool_call_id=tool_call["id"]
-        )
-        tool_messages.append(tool_message)
+    # The dispatcher is built with the graph, it times the calls and returns a failed call as an error ToolMessage
+    dispatcher = as_tool_dispatcher(tools)
+    tool_messages = [dispatcher.invoke(tool_call) for tool_call in tool_calls]
     # We return a list, because this will get added to the existing list
     return {"messages": tool_messages}
 
 
-def create_ordinary_node(state: SubgraphState | UnifiedState, agent, name: str):
+@instrument_node
+def create_ordinary_node(
+        state: SubgraphState | UnifiedState,
+        agent,
+        name: str,
+        compactor: Optional[ContextCompactor] = None
+):
     """
     Creates a standard node by invoking an agent with the current state and returning the updated state.
 
@@ -44,12 +39,16 @@ def create_ordinary_node(state: SubgraphState | UnifiedState, agent, name: str):
         state: The current state (PlanningState or UnifiedState), containing messages and sender information.
         agent: The agent to invoke using the messages from the state.
         name: The name of the node or agent invoking the operation.
+        compactor: Compacts the message history before the agent is invoked. If None, the whole history is passed.
 
     Returns:
         A dictionary containing the updated messages and sender after invoking the agent.
     """
+    # Keep the prompt within the token budget of the agent
+    messages = state.messages if compactor is None else compactor.compact(state.messages)
+
     # Invoke the agent with the current state
-    response = agent.invoke(state.messages)
+    response = agent.invoke(messages)
 
     # Return the updated state, which includes the new message and sender's name
     return {
@@ -58,6 +57,7 @@ def create_ordinary_node(state: SubgraphState | UnifiedState, agent, name: str):
     }
 
 
+@instrument_node
 def node_connector_to_other_team(state, compiled_graph, node_name: str, thread_id: int):
     """
     Connects the current team lead node to another team's graph and forwards the message.
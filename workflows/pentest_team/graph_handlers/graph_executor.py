@@ -1,20 +1,26 @@
 from langchain_core.messages import HumanMessage
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
-from utils.common_utils import save_and_open_graph, generate_unique_id
+from constants import RENDER_GRAPH
+from utils.common_utils import save_and_open_graph
+from utils.instrumentation import finish_run, start_run
 from utils.langraph import mapper
+from utils.langraph.checkpointer import create_checkpointer, generate_thread_id
+from utils.langraph.event_sinks import EventSink, stream_graph
+from utils.langraph.graph_factory import with_checkpointer
 from utils.langraph.mapper import save_snapshot_in_json
 
 from typing import Dict, Any, Optional
 
 
-def launch_as_subgraph(compiled_graph, inputs: Dict[str, Any], thread_id: int) -> Any:
+def launch_as_subgraph(compiled_graph, inputs: Dict[str, Any], thread_id: int, sink: Optional[EventSink] = None) -> Any:
     """
     Launch a subgraph using the provided compiled graph and inputs.
 
     Args: compiled_graph: The compiled workflow to be executed as a subgraph. inputs (Dict[str, Any]): A dictionary
     containing the input data (e.g., messages, sender) for the subgraph execution. thread_id (int): The thread
-    identifier used for configuring the execution.
+    identifier used for configuring the execution. sink (Optional[EventSink]): Receives the new messages of the
+    execution, they are printed to the console if None.
 
     Returns:
         Any: The last event from the execution if successful, or an error message if an error occurs during execution.
@@ -30,27 +36,8 @@ def launch_as_subgraph(compiled_graph, inputs: Dict[str, Any], thread_id: int) -
     event: Optional[Dict[str, Any]] = None
 
     try:
-        # Set to store the IDs of already processed messages
-        processed_message_ids = set()
-
-        # Stream results from the graph execution and print the output
-        for event in compiled_graph.stream(inputs, config, stream_mode='values'):
-            # Loop through all the messages in the event
-            for message in event['messages']:
-                # Try to get the message ID
-                message_id = getattr(message, 'id', None)
-
-                # If there's no ID, generate a unique one
-                if message_id is None:
-                    message_id = generate_unique_id(message.content)
-                    message.id = message_id
-
-                # Check if the message has already been processed
-                if message_id not in processed_message_ids:
-                    # Print the message
-                    message.pretty_print()
-                    # Add the message ID to the set of processed ones
-                    processed_message_ids.add(message_id)
+        # Stream results from the graph execution, only the new messages of every step are passed to the sink
+        event = stream_graph(compiled_graph, inputs, config, sink)
 
     except Exception as e:
         # Return an error message in case of an exception
@@ -60,7 +47,15 @@ def launch_as_subgraph(compiled_graph, inputs: Dict[str, Any], thread_id: int) -
     return event if event is not None else "Error: No data processed from the workflow."
 
 
-def launch_as_standalone_agent(graph, input_message: str, team_name: str):
+def launch_as_standalone_agent(
+        graph,
+        input_message: str,
+        team_name: str,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        thread_id: Optional[str] = None,
+        sink: Optional[EventSink] = None,
+        render_graph: bool = RENDER_GRAPH
+):
     """
     Launch a standalone agent by compiling the provided graph and executing the workflow.
 
@@ -69,27 +64,37 @@ def launch_as_standalone_agent(graph, input_message: str, team_name: str):
     It also saves the state snapshots for potential future recovery or analysis.
 
     Args:
-        graph: The graph (workflow) to be compiled and executed as a standalone agent.
+        graph: The graph (workflow) to be compiled and executed as a standalone agent, or the graph already compiled
+               without a checkpointer (e.g. by the graph factory).
         input_message (str): The initial input message provided by the human, which is used to
                              generate a pentest plan or execute other tasks.
         team_name (str): The name of the team or agent, used for saving state snapshots.
+        checkpointer (Optional[BaseCheckpointSaver]): The checkpointer of the run. If None, the one configured by
+                                                      CHECKPOINT_PERSISTENT is created.
+        thread_id (Optional[str]): The thread of the run. If None, a new thread is started; if it is the thread of
+                                   an interrupted run stored by a persistent checkpointer, that run is resumed.
+        sink (Optional[EventSink]): Receives the new messages of the run, they are printed to the console if None.
+        render_graph (bool): Whether to save the graph as a PNG and open it before the run.
 
     The function performs the following steps:
-    - Compiles the provided graph with a memory-based checkpoint for recovery.
+    - Compiles the provided graph with a checkpointer for recovery.
     - Supplies the initial inputs (a human message) to the graph.
     - Streams and prints the output messages generated by the agent during execution.
     - Saves the state snapshots to a JSON file for future use.
     """
-    memory = MemorySaver()
+    checkpointer = create_checkpointer() if checkpointer is None else checkpointer
 
-    # Compile the graph with a memory-based checkpoint
-    compiled_graph = graph.compile(checkpointer=memory)
+    # Attach the checkpointer, every checkpoint is saved as soon as it is produced. A graph compiled by the graph
+    # factory is copied instead of being compiled again
+    compiled_graph = with_checkpointer(graph, checkpointer)
 
     # Save and optionally open the compiled graph for further inspection
-    save_and_open_graph(compiled_graph)
+    if render_graph:
+        save_and_open_graph(compiled_graph)
 
     # Execution configuration for the graph
-    config = {"configurable": {"thread_id": 2}}
+    config = {"configurable": {"thread_id": thread_id or generate_thread_id(team_name)}}
+    print(f'Thread ID of the run: {config["configurable"]["thread_id"]}')
 
     # Initial input containing a human message (task description)
     inputs = {
@@ -101,32 +106,22 @@ def launch_as_standalone_agent(graph, input_message: str, team_name: str):
         'sender': 'human'
     }
 
-    # Set to store the IDs of already processed messages
-    processed_message_ids = set()
-
-    # Stream results from the graph execution and print the output
-    for event in compiled_graph.stream(inputs, config, stream_mode='values'):
-        # Loop through all the messages in the event
-        for message in event['messages']:
-            # Try to get the message ID
-            message_id = getattr(message, 'id', None)
-
-            # If there's no ID, generate a unique one
-            if message_id is None:
-                message_id = generate_unique_id(message.content)
-                message.id = message_id
-
-            # Check if the message has already been processed
-            if message_id not in processed_message_ids:
-                # Print the message
-                message.pretty_print()
-                # Add the message ID to the set of processed ones
-                processed_message_ids.add(message_id)
-
-    # Save the states in a file
-    states_list = list(compiled_graph.get_state_history(config=config))
+    # Resume an interrupted run of the same thread instead of starting it again
+    if thread_id is not None and compiled_graph.get_state(config).next:
+        inputs = None
+
+    # Collect the metrics of the run, the nodes of the subgraphs it launches are recorded in the same run
+    metrics = start_run(config["configurable"]["thread_id"])
+
+    # Stream results from the graph execution, only the new messages of every step are passed to the sink
+    try:
+        stream_graph(compiled_graph, inputs, config, sink)
+    finally:
+        finish_run(metrics)
+
+    # Save the states in a file, the history is read from the checkpointer one snapshot at a time
     save_snapshot_in_json(
-        states_list,
+        compiled_graph.get_state_history(config=config),
         team_name=team_name
     )
 
@@ -136,7 +131,11 @@ def launch_graph_as_host(
         graph,
         task_message: Optional[str] = None,
         live_mode: bool = False,
-        file_path: Optional[str] = None
+        file_path: Optional[str] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        thread_id: Optional[str] = None,
+        sink: Optional[EventSink] = None,
+        render_graph: bool = RENDER_GRAPH
 ):
     """
     Launch the compiled workflow graph as a host investigation agent, either in live mode
@@ -147,30 +146,40 @@ def launch_graph_as_host(
     the agent processes a real-time task or investigation based on the provided task message.
 
     Args:
-        graph: The workflow to be compiled and executed as a host investigation agent.
+        graph: The workflow to be compiled and executed as a host investigation agent, or the workflow already
+               compiled without a checkpointer (e.g. by the graph factory).
         task_message (Optional[str]): A string containing the task description or specific instructions
                                       for the agent. Used in live mode.
         live_mode (bool): Indicates whether to run the workflow in live mode (real-time task
                           execution) or resume from a saved state.
         file_path (Optional[str]): The path to the saved state JSON file, used when resuming execution.
+        checkpointer (Optional[BaseCheckpointSaver]): The checkpointer of the run. If None, the one configured by
+                                                      CHECKPOINT_PERSISTENT is created.
+        thread_id (Optional[str]): The thread of the live run. If None, a new thread is started; if it is the thread
+                                   of an interrupted run stored by a persistent checkpointer, that run is resumed.
+        sink (Optional[EventSink]): Receives the new messages of the run, they are printed to the console if None.
+        render_graph (bool): Whether to save the graph as a PNG and open it before the run.
 
     The function will:
-    - Compile the workflow graph using a memory-based checkpoint system.
+    - Compile the workflow graph using a checkpointer.
     - Optionally run a real-time task with the `task_message` if `live_mode` is True.
     - If `live_mode` is False, load a previously saved state from `file_path` and continue execution from that point.
     - Stream and print the output messages from the graph's execution.
     """
-    memory = MemorySaver()
+    checkpointer = create_checkpointer() if checkpointer is None else checkpointer
 
-    # Compile the graph with a memory-based checkpoint
-    compiled_graph = graph.compile(checkpointer=memory)
+    # Attach the checkpointer, every checkpoint is saved as soon as it is produced. A graph compiled by the graph
+    # factory is copied instead of being compiled again
+    compiled_graph = with_checkpointer(graph, checkpointer)
 
     # Save and optionally open the compiled graph for further processing or inspection
-    save_and_open_graph(compiled_graph)
+    if render_graph:
+        save_and_open_graph(compiled_graph)
 
     if live_mode and task_message:
         # Configuration for the execution of the graph in live mode
-        config = {"configurable": {"thread_id": 1}}
+        config = {"configurable": {"thread_id": thread_id or generate_thread_id('host')}}
+        print(f'Thread ID of the run: {config["configurable"]["thread_id"]}')
 
         # Initial input containing a human message with task or investigation instructions
         inputs = {
@@ -182,20 +191,20 @@ def launch_graph_as_host(
             'sender': 'human'
         }
 
+        # Resume an interrupted run of the same thread instead of starting it again
+        if thread_id is not None and compiled_graph.get_state(config).next:
+            inputs = None
+
+        # Collect the metrics of the run, the nodes of the subgraphs it launches are recorded in the same run
+        metrics = start_run(config["configurable"]["thread_id"])
+
         # Stream results in real-time based on the input task message
         try:
-            processed_message_ids = set()
-            for event in compiled_graph.stream(inputs, config, stream_mode='values'):
-                for message in event['messages']:
-                    message_id = getattr(message, 'id', None)
-                    if message_id is None:
-                        message_id = generate_unique_id(message.content)
-                        message.id = message_id
-                    if message_id not in processed_message_ids:
-                        message.pretty_print()
-                        processed_message_ids.add(message_id)
+            stream_graph(compiled_graph, inputs, config, sink)
         except Exception as e:
             print(f"Execution error: {str(e)}")
+        finally:
+            finish_run(metrics)
 
     elif not live_mode and file_path:
         # Load a previously saved state snapshot from the provided file path
@@ -204,20 +213,15 @@ def launch_graph_as_host(
         # Update the graph's state with the loaded snapshot
         updating_config = compiled_graph.update_state(state_snapshot.config, state_snapshot.values)
 
+        metrics = start_run(updating_config["configurable"]["thread_id"])
+
         # Stream and print the output messages from the graph execution, resuming from the saved state
         try:
-            processed_message_ids = set()
-            for event in compiled_graph.stream(None, updating_config, stream_mode='values'):
-                for message in event['messages']:
-                    message_id = getattr(message, 'id', None)
-                    if message_id is None:
-                        message_id = generate_unique_id(message.content)
-                        message.id = message_id
-                    if message_id not in processed_message_ids:
-                        message.pretty_print()
-                        processed_message_ids.add(message_id)
+            stream_graph(compiled_graph, None, updating_config, sink)
         except Exception as e:
             print(f"Execution error: {str(e)}")
+        finally:
+            finish_run(metrics)
 
     else:
         raise ValueError("Either 'live_mode' must be True with a 'task_message', or 'file_path' must be provided for "
@@ -7,6 +7,7 @@ import forge
 from tools.msf_tools import msf_console_scan_tool_dynamic, get_msf_module_options, get_msf_sub_groups_list, \
     get_msf_exact_sub_group_modules_list
 from utils import orm_util as orm
+from utils.langraph.graph_factory import get_compiled_graph
 from workflows.pentest_team.graph_entities.agents import host_agent_without_tools
 from workflows.pentest_team.graph_entities.nodes import create_ordinary_node, node_connector_to_other_team
 from workflows.pentest_team.graph_entities.statets import UnifiedState
@@ -97,12 +98,14 @@ def create_team_lead_graph(
         name=TEAM_LEAD_TEAM
     )
 
-    # Creating the planning team node
-    compiled_graph_planning_team = create_graph_planning_team(
+    # Creating the planning team node, the compiled subgraphs are reused by every team lead graph of the same
+    # models and prompts
+    compiled_graph_planning_team = get_compiled_graph(
+        create_graph_planning_team,
         model_llm=claude,
         system_message_path=planning_system_message,
         tools=planning_tools
-    ).compile()
+    )
 
     node_planning_team = functools.partial(
         node_connector_to_other_team,
@@ -112,11 +115,12 @@ def create_team_lead_graph(
     )
 
     # Creating the testing team node
-    compiled_graph_testing_team = create_graph_testing_team(
+    compiled_graph_testing_team = get_compiled_graph(
+        create_graph_testing_team,
         model_llm=gpt,
         system_message_path=testing_system_message,
         tools=testing_tools
-    ).compile()
+    )
 
     node_testing_team = functools.partial(
         node_connector_to_other_team,
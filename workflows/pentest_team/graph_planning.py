@@ -4,7 +4,8 @@ from langgraph.constants import START, END
 from langgraph.graph import StateGraph
 
 from utils import orm_util as orm
-from tools.msf_tools import get_msf_sub_groups_list, get_msf_exact_sub_group_modules_list
+from tools.msf_tools import get_msf_sub_groups_list, get_msf_exact_sub_group_modules_list, search_msf_modules
+from utils.langraph.tool_dispatcher import ToolDispatcher
 from workflows.pentest_team.graph_entities.agents import assistant_agent_with_tools
 from workflows.pentest_team.graph_entities.nodes import create_tool_node, create_ordinary_node
 from workflows.pentest_team.graph_entities.statets import SubgraphState
@@ -14,7 +15,11 @@ from workflows.pentest_team.graph_entities.statets import SubgraphState
 PLANNING_NODE_NAME = "Operation Planner"  # Name of the main node for operation planning
 PLANNING_SYSTEM_MESSAGE = 'strategy#2.txt'  # File containing the system message for the Operation Planner
 TOOL_NODE_NAME = "call_tool"  # Name of the node responsible for handling tool execution
-PLANNING_TOOLS = [get_msf_sub_groups_list, get_msf_exact_sub_group_modules_list]  # List of tools used by the Operation Planner
+PLANNING_TOOLS = [
+    search_msf_modules,
+    get_msf_sub_groups_list,
+    get_msf_exact_sub_group_modules_list
+]  # List of tools used by the Operation Planner
 
 HUMAN_QUESTION = (
     "If you have completed all the necessary steps for the current task, output the result and add "
@@ -65,7 +70,7 @@ def create_graph_planning_team(
     # Define the tool node responsible for executing tools within the graph
     tool_node = functools.partial(
         create_tool_node,
-        tools=tools
+        tools=ToolDispatcher(tools)
     )
 
     # Initialize the state graph with SubgraphState
@@ -6,8 +6,11 @@ from langgraph.graph import StateGraph
 from langgraph.prebuilt import ToolNode
 
 import forge
+from constants import COMPACTION_ENABLED
 from utils import orm_util as orm
-from tools.msf_tools import get_msf_module_options, msf_console_scan_tool_dynamic
+from utils.langraph.context_compactor import ContextCompactor
+from tools.msf_tools import get_msf_module_options, msf_console_scan_tool_dynamic, get_msf_modules_options_batch, \
+    get_stored_scan_result
 from utils.langraph.mapper import load_snapshot_from_json
 from workflows.pentest_team.graph_entities.agents import assistant_agent_with_tools
 from workflows.pentest_team.graph_entities.nodes import create_ordinary_node, create_tool_node
@@ -18,13 +21,19 @@ from workflows.pentest_team.graph_handlers.graph_executor import launch_as_stand
 TESTING_NODE_NAME = "Attack Coordinator"
 TESTING_SYSTEM_MESSAGE = 'pentest_msf#1.txt'  # File containing the system message for the Attack Coordinator
 TOOL_NODE_NAME = "call_tool"  # Name of the node responsible for handling tool execution
-TESTING_TOOLS = [msf_console_scan_tool_dynamic, get_msf_module_options]  # List of tools used by the Attack Coordinator
+TESTING_TOOLS = [
+    msf_console_scan_tool_dynamic,
+    get_msf_modules_options_batch,
+    get_msf_module_options,
+    get_stored_scan_result
+]  # List of tools used by the Attack Coordinator
 
 
 def create_graph_testing_team(
     model_llm,
     system_message_path: Optional[str] = None,
-    tools: Optional[List[Any]] = None
+    tools: Optional[List[Any]] = None,
+    compactor: Optional[ContextCompactor] = None
 ) -> StateGraph:
     """
     Create and configure the testing graph for the Attack Coordinator node.
@@ -38,6 +47,8 @@ def create_graph_testing_team(
                                              If None, uses the default message.
         tools (Optional[List[Any]]): A list of tools to be used by the Attack Coordinator agent.
                                      If None, a default set of tools will be used.
+        compactor (Optional[ContextCompactor]): Compacts the history of the Attack Coordinator before every turn.
+                                                If None, a default one is used when COMPACTION_ENABLED is set.
 
     Returns:
         StateGraph: A configured StateGraph representing the testing workflow.
@@ -46,6 +57,10 @@ def create_graph_testing_team(
     # Define the tools to be used by the Attack Coordinator agent
     tools = TESTING_TOOLS if tools is None else tools
 
+    # The history of the Attack Coordinator grows with every tool call, it is compacted before each turn
+    if compactor is None and COMPACTION_ENABLED:
+        compactor = ContextCompactor()
+
     # Load the system message from the provided file or use the default one
     system_message_path = TESTING_SYSTEM_MESSAGE if system_message_path is None else system_message_path
     system_message = orm.create_message_from_file(system_message_path)
@@ -61,7 +76,8 @@ def create_graph_testing_team(
     node_attack_coordinator = functools.partial(
         create_ordinary_node,
         agent=attack_coordinator_agent,
-        name=TESTING_NODE_NAME
+        name=TESTING_NODE_NAME,
+        compactor=compactor
     )
 
     # Define the Tool Node which handles the execution of the testing tools
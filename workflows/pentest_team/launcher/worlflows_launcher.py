@@ -1,6 +1,7 @@
 from typing import List, Any, Optional
 
 import forge
+from utils.langraph.graph_factory import get_compiled_graph
 from workflows.pentest_team.graph_handlers.graph_executor import launch_as_standalone_agent, launch_graph_as_host
 from workflows.pentest_team.graph_host import TEAM_LEAD_TEAM, PLANNING_TEAM, TESTING_TEAM, create_team_lead_graph
 from workflows.pentest_team.graph_planning import create_graph_planning_team, PLANNING_NODE_NAME, PLANNING_TOOLS
@@ -62,7 +63,8 @@ def start_investigation_team_workflow(task_message: Optional[str] = None):
 
     # Launch the workflow as a host investigation agent with the provided task message
     launch_graph_as_host(
-        graph=create_team_lead_graph(
+        graph=get_compiled_graph(
+            create_team_lead_graph,
             model_llm_dict=model_llm_dict,
             system_messages=system_messages,
             teams_tools=teams_tools
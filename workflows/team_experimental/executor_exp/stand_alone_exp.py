@@ -1,8 +1,13 @@
-from langchain_core.messages import HumanMessage, AIMessage
-from langgraph.checkpoint.memory import MemorySaver
+from typing import Optional
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph.state import CompiledStateGraph, StateGraph
 
 from utils.common_utils import save_and_open_graph
+from utils.instrumentation import finish_run, start_run
+from utils.langraph.checkpointer import create_checkpointer, generate_thread_id
+from utils.langraph.event_sinks import EventSink, stream_graph
 from utils.langraph.mapper import load_snapshot_from_json
 from utils.langraph.mapper import save_snapshot_in_json
 
@@ -13,18 +18,22 @@ def stand_alone_executor_experimental(
         graph: StateGraph,
         input_message: str,
         team_name: str,
-        live_mode: bool
+        live_mode: bool,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        sink: Optional[EventSink] = None,
+        render_graph: bool = RENDER_GRAPH
 ):
-    memory = MemorySaver()
+    memory = create_checkpointer() if checkpointer is None else checkpointer
     if live_mode:
-        # Compile the graph with a memory-based checkpoint
+        # Compile the graph with a checkpointer
         compiled_graph: CompiledStateGraph = graph.compile(checkpointer=memory)
 
         # Save and optionally open the compiled graph for further inspection
-        save_and_open_graph(compiled_graph)
+        if render_graph:
+            save_and_open_graph(compiled_graph)
 
         # Execution configuration for the graph
-        config = {"configurable": {"thread_id": 666}}
+        config = {"configurable": {"thread_id": generate_thread_id(team_name)}}
 
         # Initial input containing a human message (task description)
         inputs = {
@@ -36,29 +45,25 @@ def stand_alone_executor_experimental(
             SENDER_FIELD: ['human']
         }
 
-        # Stream results from the graph execution and print the output
-        for event in compiled_graph.stream(inputs, config, stream_mode='values'):
-            message: AIMessage | HumanMessage = event['messages'][-1]
-
-            # sender = event['sender']
-            # name = names_mutation_dict.get(sender)
-            # message.name = name if name else sender
-
-            # Print the message
-            message.pretty_print()
+        # Collect the metrics of the run
+        metrics = start_run(config["configurable"]["thread_id"])
 
+        # Stream results from the graph execution, only the new messages of every step are passed to the sink
+        try:
+            stream_graph(compiled_graph, inputs, config, sink)
+        finally:
+            finish_run(metrics)
 
-        # Save the states in a file
-        states_list = list(compiled_graph.get_state_history(config=config))
+        # Save the states in a file, the history is read from the checkpointer one snapshot at a time
         save_snapshot_in_json(
-            states_list,
+            compiled_graph.get_state_history(config=config),
             team_name=team_name
         )
 
     elif not live_mode:
-        # Compile the graph with a memory-based checkpoint
+        # Compile the graph with a checkpointer
         graph.set_entry_point(PLAN_VALIDATOR_NODE)
-        # Compile the graph with a memory-based checkpoint
+        # Compile the graph with a checkpointer
         compiled_graph: CompiledStateGraph = graph.compile(checkpointer=memory)
         # Load a previously saved state snapshot from the provided file path
         state_snapshot = load_snapshot_from_json(
@@ -69,6 +74,4 @@ def stand_alone_executor_experimental(
         updating_config = compiled_graph.update_state(state_snapshot.config, state_snapshot.values)
 
         # Stream the graph's execution from the specified node and print messages
-        for event in compiled_graph.stream(None, updating_config, stream_mode='values'):
-            message: AIMessage | HumanMessage = event['messages'][-1]
-            message.pretty_print()
+        stream_graph(compiled_graph, None, updating_config, sink)
@@ -6,6 +6,7 @@ from langgraph.constants import START, END
 from langgraph.graph import StateGraph
 from tools.msf_tools import get_msf_sub_groups_list, get_msf_exact_sub_group_modules_list
 from utils import create_message_from_file
+from utils.langraph.tool_dispatcher import ToolDispatcher
 from workflows.graph_entities.agents import assistant_agent_with_tools, assistant_agent_without_tools, \
     assistant_agent_with_constructed_output
 from workflows.graph_entities.nodes import *
@@ -33,7 +34,8 @@ def initialize_distributed_planning_graph(
     module_group_selection_agent = assistant_agent_with_tools(
         system_message=module_group_selection_sys_msg,
         model_llm=model_llm,
-        tools=MODULE_GROUP_SELECTION_TOOLS
+        tools=MODULE_GROUP_SELECTION_TOOLS,
+        use_llm_cache=PLANNING_LLM_CACHE
     )
 
     module_selection_agent = assistant_agent_with_tools(
@@ -45,7 +47,8 @@ def initialize_distributed_planning_graph(
     module_extraction_agent = assistant_agent_with_constructed_output(
         system_message=extraction_sys_msg,
         model_llm=model_llm,
-        oai_schema=module_extraction_scheme
+        oai_schema=module_extraction_scheme,
+        use_llm_cache=PLANNING_LLM_CACHE
     )
 
     plan_validator_agent = assistant_agent_without_tools(
@@ -61,13 +64,15 @@ def initialize_distributed_planning_graph(
     plan_extraction_agent = assistant_agent_with_constructed_output(
         system_message=extraction_sys_msg,
         model_llm=model_llm,
-        oai_schema=plan_extraction_scheme
+        oai_schema=plan_extraction_scheme,
+        use_llm_cache=PLANNING_LLM_CACHE
     )
 
     validator_extraction_agent = assistant_agent_with_constructed_output(
         system_message=extraction_sys_msg,
         model_llm=model_llm,
-        oai_schema=validator_feedback_scheme
+        oai_schema=validator_feedback_scheme,
+        use_llm_cache=PLANNING_LLM_CACHE
     )
 
     # CREATE THE NODES AND EDGES
@@ -104,7 +109,7 @@ def initialize_distributed_planning_graph(
     combined_tools = [*MODULE_GROUP_SELECTION_TOOLS, *MODULE_SELECTION_TOOLS]
     task_execution_node = functools.partial(
         create_tool_node,
-        tools=combined_tools
+        tools=ToolDispatcher(combined_tools)
     )
 
     plan_extraction_node = functools.partial(
@@ -1,20 +1,36 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+
 from langchain_core.messages import HumanMessage
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
-from utils.common_utils import save_and_open_graph, generate_unique_id
+from constants import LAUNCH_MAX_CONCURRENCY, LAUNCH_RESULTS_DIR, MESSAGES_FIELD, PLAN_FIELD, RENDER_GRAPH
+from utils.common_utils import save_and_open_graph
+from utils.instrumentation import finish_run, start_run
 from utils.langraph import mapper
+from utils.langraph.checkpointer import create_checkpointer, generate_thread_id
+from utils.langraph.event_sinks import EventSink, JsonlFileSink, astream_graph, stream_graph
+from utils.langraph.graph_factory import with_checkpointer
 from utils.langraph.mapper import save_snapshot_in_json
+from utils.msf.async_client import close_async_msf_client
+
+from typing import Dict, Any, List, Optional, Sequence
 
-from typing import Dict, Any, Optional
+logger = logging.getLogger(__name__)
 
 
-def launch_as_subgraph(compiled_graph, inputs: Dict[str, Any], thread_id: int) -> Any:
+def launch_as_subgraph(compiled_graph, inputs: Dict[str, Any], thread_id: int, sink: Optional[EventSink] = None) -> Any:
     """
     Launch a subgraph using the provided compiled graph and inputs.
 
     Args: compiled_graph: The compiled workflow to be executed as a subgraph. inputs (Dict[str, Any]): A dictionary
     containing the input data (e.g., messages, sender) for the subgraph execution. thread_id (int): The thread
-    identifier used for configuring the execution.
+    identifier used for configuring the execution. sink (Optional[EventSink]): Receives the new messages of the
+    execution, they are printed to the console if None.
 
     Returns:
         Any: The last event from the execution if successful, or an error message if an error occurs during execution.
@@ -30,27 +46,8 @@ def launch_as_subgraph(compiled_graph, inputs: Dict[str, Any], thread_id: int) -
     event: Optional[Dict[str, Any]] = None
 
     try:
-        # Set to store the IDs of already processed messages
-        processed_message_ids = set()
-
-        # Stream results from the graph execution and print the output
-        for event in compiled_graph.stream(inputs, config, stream_mode='values'):
-            # Loop through all the messages in the event
-            for message in event['messages']:
-                # Try to get the message ID
-                message_id = getattr(message, 'id', None)
-
-                # If there's no ID, generate a unique one
-                if message_id is None:
-                    message_id = generate_unique_id(message.content)
-                    message.id = message_id
-
-                # Check if the message has already been processed
-                if message_id not in processed_message_ids:
-                    # Print the message
-                    message.pretty_print()
-                    # Add the message ID to the set of processed ones
-                    processed_message_ids.add(message_id)
+        # Stream results from the graph execution, only the new messages of every step are passed to the sink
+        event = stream_graph(compiled_graph, inputs, config, sink)
 
     except Exception as e:
         # Return an error message in case of an exception
@@ -60,7 +57,42 @@ def launch_as_subgraph(compiled_graph, inputs: Dict[str, Any], thread_id: int) -
     return event if event is not None else "Error: No data processed from the workflow."
 
 
-def launch_as_standalone_agent(graph, input_message: str, team_name: str):
+async def alaunch_as_subgraph(compiled_graph, inputs: Dict[str, Any], thread_id: Any,
+                              sink: Optional[EventSink] = None) -> Any:
+    """
+    Async variant of launch_as_subgraph, the subgraph is executed with astream.
+
+    Args:
+        compiled_graph: The compiled workflow to be executed as a subgraph.
+        inputs (Dict[str, Any]): The input data (e.g., messages, sender) for the subgraph execution.
+        thread_id (Any): The thread identifier used for configuring the execution.
+        sink (Optional[EventSink]): Receives the new messages of the execution, they are printed to the console if
+                                    None.
+
+    Returns:
+        Any: The last event from the execution if successful, or an error message if an error occurs during execution.
+    """
+    if inputs is None:
+        return "Error: No input provided. Please supply valid inputs to execute the graph."
+
+    config = {"configurable": {"thread_id": thread_id}}
+    try:
+        event = await astream_graph(compiled_graph, inputs, config, sink)
+    except Exception as e:
+        return f"Execution error: {str(e)}"
+
+    return event if event is not None else "Error: No data processed from the workflow."
+
+
+def launch_as_standalone_agent(
+        graph,
+        input_message: str,
+        team_name: str,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        thread_id: Optional[str] = None,
+        sink: Optional[EventSink] = None,
+        render_graph: bool = RENDER_GRAPH
+):
     """
     Launch a standalone agent by compiling the provided graph and executing the workflow.
 
@@ -69,27 +101,37 @@ def launch_as_standalone_agent(graph, input_message: str, team_name: str):
     It also saves the state snapshots for potential future recovery or analysis.
 
     Args:
-        graph: The graph (workflow) to be compiled and executed as a standalone agent.
+        graph: The graph (workflow) to be compiled and executed as a standalone agent, or the graph already compiled
+               without a checkpointer (e.g. by the graph factory).
         input_message (str): The initial input message provided by the human, which is used to
                              generate a pentest plan or execute other tasks.
         team_name (str): The name of the team or agent, used for saving state snapshots.
+        checkpointer (Optional[BaseCheckpointSaver]): The checkpointer of the run. If None, the one configured by
+                                                      CHECKPOINT_PERSISTENT is created.
+        thread_id (Optional[str]): The thread of the run. If None, a new thread is started; if it is the thread of
+                                   an interrupted run stored by a persistent checkpointer, that run is resumed.
+        sink (Optional[EventSink]): Receives the new messages of the run, they are printed to the console if None.
+        render_graph (bool): Whether to save the graph as a PNG and open it before the run.
 
     The function performs the following steps:
-    - Compiles the provided graph with a memory-based checkpoint for recovery.
+    - Compiles the provided graph with a checkpointer for recovery.
     - Supplies the initial inputs (a human message) to the graph.
     - Streams and prints the output messages generated by the agent during execution.
     - Saves the state snapshots to a JSON file for future use.
     """
-    memory = MemorySaver()
+    checkpointer = create_checkpointer() if checkpointer is None else checkpointer
 
-    # Compile the graph with a memory-based checkpoint
-    compiled_graph = graph.compile(checkpointer=memory)
+    # Attach the checkpointer, every checkpoint is saved as soon as it is produced. A graph compiled by the graph
+    # factory is copied instead of being compiled again
+    compiled_graph = with_checkpointer(graph, checkpointer)
 
     # Save and optionally open the compiled graph for further inspection
-    save_and_open_graph(compiled_graph)
+    if render_graph:
+        save_and_open_graph(compiled_graph)
 
     # Execution configuration for the graph
-    config = {"configurable": {"thread_id": 2}}
+    config = {"configurable": {"thread_id": thread_id or generate_thread_id(team_name)}}
+    print(f'Thread ID of the run: {config["configurable"]["thread_id"]}')
 
     # Initial input containing a human message (task description)
     inputs = {
@@ -101,34 +143,22 @@ def launch_as_standalone_agent(graph, input_message: str, team_name: str):
         'sender': 'human'
     }
 
-    # Set to store the IDs of already processed messages
-    processed_message_ids = set()
-
-    # Stream results from the graph execution and print the output
-    for event in compiled_graph.stream(inputs, config, stream_mode='values'):
-        # print(f'PLAN IS: <<{event['plan'] if 'plan' in event.keys() else 'None'}>>')
-        # Loop through all the messages in the event
-        for message in event['messages']:
-            # Try to get the message ID
-            message_id = getattr(message, 'id', None)
-
-            # If there's no ID, generate a unique one
-            if message_id is None:
-                message_id = generate_unique_id(message.content)
-                message.id = message_id
+    # Resume an interrupted run of the same thread instead of starting it again
+    if thread_id is not None and compiled_graph.get_state(config).next:
+        inputs = None
 
-            # Check if the message has already been processed
-            if message_id not in processed_message_ids:
-                # Print the message
-                message.pretty_print()
-                # Add the message ID to the set of processed ones
-                processed_message_ids.add(message_id)
+    # Collect the metrics of the run, the nodes of the subgraphs it launches are recorded in the same run
+    metrics = start_run(config["configurable"]["thread_id"])
 
+    # Stream results from the graph execution, only the new messages of every step are passed to the sink
+    try:
+        stream_graph(compiled_graph, inputs, config, sink)
+    finally:
+        finish_run(metrics)
 
-    # Save the states in a file
-    states_list = list(compiled_graph.get_state_history(config=config))
+    # Save the states in a file, the history is read from the checkpointer one snapshot at a time
     save_snapshot_in_json(
-        states_list,
+        compiled_graph.get_state_history(config=config),
         team_name=team_name
     )
 
@@ -138,7 +168,11 @@ def launch_graph_as_host(
         graph,
         task_message: Optional[str] = None,
         live_mode: bool = False,
-        file_path: Optional[str] = None
+        file_path: Optional[str] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        thread_id: Optional[str] = None,
+        sink: Optional[EventSink] = None,
+        render_graph: bool = RENDER_GRAPH
 ):
     """
     Launch the compiled workflow graph as a host investigation agent, either in live mode
@@ -149,30 +183,40 @@ def launch_graph_as_host(
     the agent processes a real-time task or investigation based on the provided task message.
 
     Args:
-        graph: The workflow to be compiled and executed as a host investigation agent.
+        graph: The workflow to be compiled and executed as a host investigation agent, or the workflow already
+               compiled without a checkpointer (e.g. by the graph factory).
         task_message (Optional[str]): A string containing the task description or specific instructions
                                       for the agent. Used in live mode.
         live_mode (bool): Indicates whether to run the workflow in live mode (real-time task
                           execution) or resume from a saved state.
         file_path (Optional[str]): The path to the saved state JSON file, used when resuming execution.
+        checkpointer (Optional[BaseCheckpointSaver]): The checkpointer of the run. If None, the one configured by
+                                                      CHECKPOINT_PERSISTENT is created.
+        thread_id (Optional[str]): The thread of the live run. If None, a new thread is started; if it is the thread
+                                   of an interrupted run stored by a persistent checkpointer, that run is resumed.
+        sink (Optional[EventSink]): Receives the new messages of the run, they are printed to the console if None.
+        render_graph (bool): Whether to save the graph as a PNG and open it before the run.
 
     The function will:
-    - Compile the workflow graph using a memory-based checkpoint system.
+    - Compile the workflow graph using a checkpointer.
     - Optionally run a real-time task with the `task_message` if `live_mode` is True.
     - If `live_mode` is False, load a previously saved state from `file_path` and continue execution from that point.
     - Stream and print the output messages from the graph's execution.
     """
-    memory = MemorySaver()
+    checkpointer = create_checkpointer() if checkpointer is None else checkpointer
 
-    # Compile the graph with a memory-based checkpoint
-    compiled_graph = graph.compile(checkpointer=memory)
+    # Attach the checkpointer, every checkpoint is saved as soon as it is produced. A graph compiled by the graph
+    # factory is copied instead of being compiled again
+    compiled_graph = with_checkpointer(graph, checkpointer)
 
     # Save and optionally open the compiled graph for further processing or inspection
-    save_and_open_graph(compiled_graph)
+    if render_graph:
+        save_and_open_graph(compiled_graph)
 
     if live_mode and task_message:
         # Configuration for the execution of the graph in live mode
-        config = {"configurable": {"thread_id": 1}}
+        config = {"configurable": {"thread_id": thread_id or generate_thread_id('host')}}
+        print(f'Thread ID of the run: {config["configurable"]["thread_id"]}')
 
         # Initial input containing a human message with task or investigation instructions
         inputs = {
@@ -184,20 +228,20 @@ def launch_graph_as_host(
             'sender': 'human'
         }
 
+        # Resume an interrupted run of the same thread instead of starting it again
+        if thread_id is not None and compiled_graph.get_state(config).next:
+            inputs = None
+
+        # Collect the metrics of the run, the nodes of the subgraphs it launches are recorded in the same run
+        metrics = start_run(config["configurable"]["thread_id"])
+
         # Stream results in real-time based on the input task message
         try:
-            processed_message_ids = set()
-            for event in compiled_graph.stream(inputs, config, stream_mode='values'):
-                for message in event['messages']:
-                    message_id = getattr(message, 'id', None)
-                    if message_id is None:
-                        message_id = generate_unique_id(message.content)
-                        message.id = message_id
-                    if message_id not in processed_message_ids:
-                        message.pretty_print()
-                        processed_message_ids.add(message_id)
+            stream_graph(compiled_graph, inputs, config, sink)
         except Exception as e:
             print(f"Execution error: {str(e)}")
+        finally:
+            finish_run(metrics)
 
     elif not live_mode and file_path:
         # Load a previously saved state snapshot from the provided file path
@@ -206,21 +250,114 @@ def launch_graph_as_host(
         # Update the graph's state with the loaded snapshot
         updating_config = compiled_graph.update_state(state_snapshot.config, state_snapshot.values)
 
+        metrics = start_run(updating_config["configurable"]["thread_id"])
+
         # Stream and print the output messages from the graph execution, resuming from the saved state
         try:
-            processed_message_ids = set()
-            for event in compiled_graph.stream(None, updating_config, stream_mode='values'):
-                for message in event['messages']:
-                    message_id = getattr(message, 'id', None)
-                    if message_id is None:
-                        message_id = generate_unique_id(message.content)
-                        message.id = message_id
-                    if message_id not in processed_message_ids:
-                        message.pretty_print()
-                        processed_message_ids.add(message_id)
+            stream_graph(compiled_graph, None, updating_config, sink)
         except Exception as e:
             print(f"Execution error: {str(e)}")
+        finally:
+            finish_run(metrics)
 
     else:
         raise ValueError("Either 'live_mode' must be True with a 'task_message', or 'file_path' must be provided for "
                          "resuming.")
+
+
+async def alaunch_graph_as_host_for_targets(
+        graph,
+        task_messages: Sequence[str],
+        labels: Optional[Sequence[str]] = None,
+        max_concurrency: int = LAUNCH_MAX_CONCURRENCY,
+        results_dir: str = LAUNCH_RESULTS_DIR,
+        checkpointer: Optional[BaseCheckpointSaver] = None
+) -> List[Dict[str, Any]]:
+    """
+    Run one investigation of the host graph per task message, all of them concurrently on the running event loop.
+
+    The graph is compiled once and every investigation gets a thread of its own, so their checkpoints, the threads of
+    the team subgraphs derived from it and their metrics never mix. At most max_concurrency investigations run at the
+    same time. The messages of every investigation are written to '<results_dir>/<thread_id>.jsonl' and its outcome
+    to '<results_dir>/<thread_id>.json'; a failed investigation does not stop the others.
+
+    Args:
+        graph: The workflow to be compiled and executed as a host investigation agent, or the workflow already
+               compiled without a checkpointer (e.g. by the graph factory).
+        task_messages (Sequence[str]): The task of every investigation.
+        labels (Optional[Sequence[str]]): A name of every investigation used in its thread id and result, e.g. the
+                                          target host. Defaults to 'task_<number>'.
+        max_concurrency (int): The maximum number of investigations running at the same time.
+        results_dir (str): The directory of the result files, created if it does not exist.
+        checkpointer (Optional[BaseCheckpointSaver]): The checkpointer shared by the runs. If None, the one configured
+                                                      by CHECKPOINT_PERSISTENT is created.
+
+    Returns:
+        List[Dict[str, Any]]: The results of the investigations in the order of the task messages.
+    """
+    labels = [f'task_{number}' for number in range(1, len(task_messages) + 1)] if labels is None else list(labels)
+    if len(labels) != len(task_messages):
+        raise ValueError('Every task message needs exactly one label.')
+
+    checkpointer = create_checkpointer() if checkpointer is None else checkpointer
+    compiled_graph = with_checkpointer(graph, checkpointer)
+    os.makedirs(results_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(label: str, task_message: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await _alaunch_investigation(compiled_graph, label, task_message, results_dir)
+
+    try:
+        results = await asyncio.gather(*(run(label, task) for label, task in zip(labels, task_messages)))
+    finally:
+        # The consoles of msfrpcd leased by the runs on this event loop
+        await close_async_msf_client()
+
+    completed = sum(result['status'] == 'completed' for result in results)
+    print(f'{completed} of {len(results)} investigations completed, the results are in {results_dir}')
+    return list(results)
+
+
+async def _alaunch_investigation(compiled_graph, label: str, task_message: str, results_dir: str) -> Dict[str, Any]:
+    """
+    Run a single investigation of alaunch_graph_as_host_for_targets and write its result file.
+    """
+    thread_id = generate_thread_id(f'host_{_to_file_name(label)}')
+    config = {"configurable": {"thread_id": thread_id}}
+    inputs = {
+        "messages": [
+            HumanMessage(
+                content=task_message
+            )
+        ],
+        'sender': 'human'
+    }
+    result: Dict[str, Any] = {'target': label, 'thread_id': thread_id, 'task': task_message}
+
+    # This coroutine runs in a task of its own, so the run is recorded only by the nodes of this investigation
+    metrics = start_run(thread_id)
+    start = time.perf_counter()
+    try:
+        with JsonlFileSink(os.path.join(results_dir, f'{thread_id}.jsonl')) as sink:
+            values = await astream_graph(compiled_graph, inputs, config, sink)
+        messages = (values or {}).get(MESSAGES_FIELD) or []
+        result.update(
+            status='completed',
+            final_message=messages[-1].content if messages else None,
+            plan=(values or {}).get(PLAN_FIELD)
+        )
+    except Exception as e:
+        logger.error(f'The investigation of {label} ({thread_id}) failed', exc_info=True)
+        result.update(status='failed', error=f'{type(e).__name__}: {e}')
+    finally:
+        result['duration_seconds'] = round(time.perf_counter() - start, 3)
+        result['metrics'] = finish_run(metrics)
+
+    with open(os.path.join(results_dir, f'{thread_id}.json'), 'w') as file:
+        json.dump(result, file, indent=2, default=str)
+    return result
+
+
+def _to_file_name(label: str) -> str:
+    return re.sub(r'[^\w.-]+', '_', label).strip('_')[:40] or 'target'
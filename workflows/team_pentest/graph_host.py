@@ -1,4 +1,3 @@
-import functools
 import re
 from typing import List, Any, Dict
 from langgraph.constants import START, END
@@ -6,13 +5,16 @@ from langgraph.graph import StateGraph
 
 from constants import PLANNER_NODE, TESTING_NODE
 from utils import orm_util as orm
+from utils.langraph.graph_factory import get_compiled_graph
 from workflows.graph_entities.agents import assistant_agent_without_tools
-from workflows.graph_entities.nodes import create_ordinary_node, node_connector_to_other_team
+from workflows.graph_entities.nodes import create_ordinary_node, acreate_ordinary_node, create_dual_node, \
+    node_connector_to_other_team, anode_connector_to_other_team
 from workflows.graph_entities.statets import TeamState
 from workflows.team_pentest.graph_planning_1 import create_graph_planning_team
 from workflows.team_pentest.graph_testing import create_graph_testing_team
 
 TEAM_LEAD_TEAM = 'team_lead_team'
+# Threads of the team subgraphs used only outside of a graph run, within a run they are derived from its thread
 THREAD_PLANNER_NODE_NAME = 2
 THREAD_TESTING_TEAM = 3
 
@@ -56,35 +58,43 @@ def create_team_lead_graph(
         system_message=system_message,
         teams=TEAMS
     )
-    node_team_lead = functools.partial(
+    # The async implementations of the nodes are used by ainvoke/astream, so concurrent investigations on one event
+    # loop do not hold a thread while they wait for the teams
+    node_team_lead = create_dual_node(
         create_ordinary_node,
+        acreate_ordinary_node,
         agent=agent_team_lead,
         name=TEAM_LEAD_TEAM
     )
 
-    # Creating the planning team node
-    compiled_graph_planning_team = create_graph_planning_team(
+    # Creating the planning team node, the compiled subgraphs are reused by every team lead graph of the same
+    # models and prompts
+    compiled_graph_planning_team = get_compiled_graph(
+        create_graph_planning_team,
         model_llm=gpt,
         all_sys_messages_paths=planning_system_message,
         tools=planning_tools
-    ).compile()
+    )
 
-    node_planning_team = functools.partial(
+    node_planning_team = create_dual_node(
         node_connector_to_other_team,
+        anode_connector_to_other_team,
         compiled_graph=compiled_graph_planning_team,
         node_name=PLANNER_NODE,
         thread_id=THREAD_PLANNER_NODE_NAME
     )
 
     # Creating the testing team node
-    compiled_graph_testing_team = create_graph_testing_team(
+    compiled_graph_testing_team = get_compiled_graph(
+        create_graph_testing_team,
         model_llm=gpt,
         system_message_path=testing_system_message,
         tools=testing_tools
-    ).compile()
+    )
 
-    node_testing_team = functools.partial(
+    node_testing_team = create_dual_node(
         node_connector_to_other_team,
+        anode_connector_to_other_team,
         compiled_graph=compiled_graph_testing_team,
         node_name=TESTING_NODE,
         thread_id=THREAD_TESTING_TEAM
@@ -5,6 +5,7 @@ from langgraph.graph import StateGraph
 
 from utils import orm_util as orm
 from tools.msf_tools import get_msf_sub_groups_list, get_msf_exact_sub_group_modules_list
+from utils.langraph.tool_dispatcher import ToolDispatcher
 from workflows.graph_entities.agents import assistant_agent_with_tools
 from workflows.graph_entities.nodes import create_ordinary_node, create_tool_node, create_quasi_human_node
 from workflows.graph_entities.statets import TeamState
@@ -65,7 +66,7 @@ def create_graph_planning_team(
     # Define the tool node responsible for executing tools within the graph
     tool_node = functools.partial(
         create_tool_node,
-        tools=tools
+        tools=ToolDispatcher(tools)
     )
 
     # Define the Quasi Human node
@@ -6,8 +6,9 @@ from langgraph.graph import StateGraph
 
 from constants import PLANNER_NODE, HELPER_TOOLS_NODE, QUASI_HUMAN_NODE
 from utils import orm_util as orm
-from tools.msf_tools import get_msf_sub_groups_list, get_msf_exact_sub_group_modules_list
+from tools.msf_tools import get_msf_sub_groups_list, get_msf_exact_sub_group_modules_list, search_msf_modules
 from utils.common_utils import compare_messages_by_groups
+from utils.langraph.tool_dispatcher import ToolDispatcher
 from workflows.graph_entities.agents import assistant_agent_with_tools, assistant_agent_with_constructed_output
 from workflows.graph_entities.nodes import create_tool_node, create_ordinary_node, \
     create_node_with_construct_output, create_quasi_human_node
@@ -19,6 +20,7 @@ TOOL_NODE_NAME = "call_tool"  # Name of the node responsible for handling tool e
 pattern_helper = re.compile(f'{HELPER_TOOLS_NODE}')
 pattern_final_answer = re.compile(f"FINAL ANSWER")
 PLANNING_TOOLS = [
+    search_msf_modules,
     get_msf_sub_groups_list,
     get_msf_exact_sub_group_modules_list
 ]  # List of tools used by the Operation Planner
@@ -79,7 +81,7 @@ def create_graph_planning_team(
     # Define the tool node responsible for executing tools within the graph
     tool_node = functools.partial(
         create_tool_node,
-        tools=tools
+        tools=ToolDispatcher(tools)
     )
 
     # Define thw Quasi Human node
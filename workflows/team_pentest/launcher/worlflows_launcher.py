@@ -1,12 +1,26 @@
-from typing import List, Any, Optional
+"""
+Launchers of the pentest team workflows.
+
+Run from the project root to investigate many targets concurrently:
+    python -m workflows.team_pentest.launcher.worlflows_launcher <target> [<target> ...]
+"""
+import asyncio
+import sys
+from typing import List, Any, Dict, Optional, Sequence
 
 import forge
-from constants import PLANNER_NODE, TESTING_NODE
-from workflows.team_pentest.graph_handlers.graph_executor import launch_as_standalone_agent, launch_graph_as_host
+from constants import PLANNER_NODE, TESTING_NODE, LAUNCH_MAX_CONCURRENCY, LAUNCH_RESULTS_DIR
+from utils.langraph.graph_factory import get_compiled_graph
+from workflows.team_pentest.graph_handlers.graph_executor import launch_as_standalone_agent, launch_graph_as_host, \
+    alaunch_graph_as_host_for_targets
 from workflows.team_pentest.graph_host import TEAM_LEAD_TEAM, create_team_lead_graph
 from workflows.team_pentest.graph_planning import create_graph_planning_team, PLANNING_TOOLS
 from workflows.team_pentest.graph_testing import create_graph_testing_team, TESTING_TOOLS
 
+# The task of every target investigated from the command line
+TARGET_TASK_TEMPLATE = ('I am Security Engineer. I need to test the host {target} for vulnerabilities. Please focus on '
+                        'RCE (Remote Code Execution) exploits.')
+
 
 def start_workflow_team(input_message: str, model_llm, system_message_path: str, tools: List[Any], team_name: str):
     if team_name == PLANNER_NODE:
@@ -44,6 +58,55 @@ def start_investigation_team_workflow(task_message: Optional[str] = None):
     - Launch the graph as a host investigation agent with the provided task message.
     """
 
+    # Launch the workflow as a host investigation agent with the provided task message
+    launch_graph_as_host(
+        graph=_create_investigation_graph(),
+        task_message=task_message,
+        live_mode=True,
+        file_path='resources/states/Planning_Experimental_Team_snapshots_23_09_2024_14_19'
+    )
+
+
+async def start_investigation_team_workflow_async(
+        targets: Sequence[str],
+        task_template: Optional[str] = None,
+        max_concurrency: int = LAUNCH_MAX_CONCURRENCY,
+        results_dir: str = LAUNCH_RESULTS_DIR
+) -> List[Dict[str, Any]]:
+    """
+    Investigates many targets concurrently with one team lead graph on the running event loop.
+
+    Args:
+        targets: The targets (e.g. hosts) if task_template is given, otherwise the task messages themselves.
+        task_template: The task message with a '{target}' placeholder, filled in with every target.
+        max_concurrency: The maximum number of investigations running at the same time.
+        results_dir: The directory of the per-target result files.
+
+    Returns:
+        The results of the investigations in the order of the targets.
+
+    Example:
+        asyncio.run(start_investigation_team_workflow_async(
+            ['10.0.0.1', '10.0.0.2'], task_template='Test the host {target} for RCE vulnerabilities.'))
+    """
+    if task_template is None:
+        task_messages, labels = list(targets), None
+    else:
+        task_messages, labels = [task_template.format(target=target) for target in targets], list(targets)
+
+    return await alaunch_graph_as_host_for_targets(
+        graph=_create_investigation_graph(),
+        task_messages=task_messages,
+        labels=labels,
+        max_concurrency=max_concurrency,
+        results_dir=results_dir
+    )
+
+
+def _create_investigation_graph():
+    """
+    Create the team lead graph with the LLMs, the system messages and the tools of the investigation teams.
+    """
     model_llm_dict = {
         'claude': forge.create_llm('Claude 3.5 Sonnet'),
         'gpt': forge.create_llm(model_name='gpt-4o-mini')
@@ -63,15 +126,16 @@ def start_investigation_team_workflow(task_message: Optional[str] = None):
         TESTING_NODE: TESTING_TOOLS
     }
 
-
-    # Launch the workflow as a host investigation agent with the provided task message
-    launch_graph_as_host(
-        graph=create_team_lead_graph(
-            model_llm_dict=model_llm_dict,
-            system_messages=system_messages,
-            teams_tools=teams_tools,
-        ),
-        task_message=task_message,
-        live_mode=True,
-        file_path='resources/states/Planning_Experimental_Team_snapshots_23_09_2024_14_19'
+    # The graph is compiled once per models and prompts, the next investigations reuse it
+    return get_compiled_graph(
+        create_team_lead_graph,
+        model_llm_dict=model_llm_dict,
+        system_messages=system_messages,
+        teams_tools=teams_tools,
     )
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        raise SystemExit('Usage: python -m workflows.team_pentest.launcher.worlflows_launcher <target> [<target> ...]')
+    asyncio.run(start_investigation_team_workflow_async(sys.argv[1:], task_template=TARGET_TASK_TEMPLATE))